@@ -0,0 +1,134 @@
+# access.py
+"""Проверка доступа к проектам с кешем в памяти процесса.
+
+Роль пользователя в проекте ('owner', 'admin', 'member' или отсутствие доступа)
+кешируется по паре (user_id, project_id) и сбрасывается при изменении состава
+проекта. Задачи, вехи и связи приводятся к своему проекту через кеш
+task_id -> project_id, поэтому проверка доступа почти никогда не ходит в базу.
+Декораторы *_access закрывают маршруты, где в URL есть id задачи, вехи или связи.
+"""
+import os
+from functools import wraps
+
+from flask import g, jsonify
+from flask_login import current_user
+
+from cache import LRUCache
+from database import get_db_connection
+
+ACCESS_CACHE_SIZE = int(os.environ.get('ACCESS_CACHE_SIZE', 4096))
+
+# (user_id, project_id) -> роль; '' - доступа нет (тоже кешируется)
+role_cache = LRUCache(max_size=ACCESS_CACHE_SIZE)
+# task_id / milestone_id -> project_id (сущности не переходят между проектами)
+task_project_cache = LRUCache(max_size=ACCESS_CACHE_SIZE * 4)
+milestone_project_cache = LRUCache(max_size=ACCESS_CACHE_SIZE)
+
+_MISSING = object()
+
+
+def project_role(project_id, user_id):
+    """Роль пользователя в проекте или None, если доступа нет"""
+    key = (int(user_id), int(project_id))
+    role = role_cache.get(key, _MISSING)
+    if role is _MISSING:
+        conn = get_db_connection()
+        row = conn.execute('''
+            SELECT CASE WHEN p.user_id = ? THEN 'owner' ELSE pm.role END AS role
+            FROM projects p
+            LEFT JOIN project_members pm ON pm.project_id = p.id AND pm.user_id = ?
+            WHERE p.id = ? AND (p.user_id = ? OR pm.user_id IS NOT NULL)
+        ''', (user_id, user_id, project_id, user_id)).fetchone()
+        conn.close()
+        role = (row['role'] or 'member') if row else ''
+        role_cache.set(key, role)
+    return role or None
+
+
+def has_project_access(project_id, user_id):
+    return project_role(project_id, user_id) is not None
+
+
+def check_project_access(project_id, user_id):
+    """Проверяет доступ пользователя к проекту (владелец или участник), возвращает строку проекта"""
+    if not has_project_access(project_id, user_id):
+        return None
+    conn = get_db_connection()
+    project = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+    conn.close()
+    return project
+
+
+def _cached_project_id(cache, entity_id, sql):
+    project_id = cache.get(entity_id)
+    if project_id is None:
+        conn = get_db_connection()
+        row = conn.execute(sql, (entity_id,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        project_id = row[0]
+        cache.set(entity_id, project_id)
+    return project_id
+
+
+def task_project_id(task_id):
+    """Проект задачи (None, если задачи нет)"""
+    return _cached_project_id(task_project_cache, task_id,
+                              'SELECT project_id FROM tasks WHERE id = ?')
+
+
+def milestone_project_id(milestone_id):
+    return _cached_project_id(milestone_project_cache, milestone_id,
+                              'SELECT project_id FROM milestones WHERE id = ?')
+
+
+def dependency_project_id(dependency_id):
+    """Проект связи - проект ее задачи-последователя"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT task_id FROM task_dependencies WHERE id = ?', (dependency_id,)).fetchone()
+    conn.close()
+    return task_project_id(row[0]) if row else None
+
+
+def forget_membership(project_id, user_id):
+    """Сбрасывает кеш после изменения роли или состава проекта"""
+    role_cache.invalidate((int(user_id), int(project_id)))
+
+
+def forget_tasks(task_ids):
+    for task_id in task_ids:
+        task_project_cache.invalidate(int(task_id))
+
+
+def forget_milestone(milestone_id):
+    milestone_project_cache.invalidate(int(milestone_id))
+
+
+def _guard(resolve, kwarg, not_found):
+    """Декоратор: id из URL -> проект -> проверка роли текущего пользователя"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            project_id = resolve(kwargs[kwarg])
+            if project_id is None or not has_project_access(project_id, current_user.id):
+                # Чужие и несуществующие объекты неразличимы для клиента
+                return jsonify({'error': not_found}), 404
+            g.access_project_id = project_id
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+project_access = _guard(lambda project_id: project_id, 'project_id', 'Project not found')
+task_access = _guard(task_project_id, 'task_id', 'Task not found')
+milestone_access = _guard(milestone_project_id, 'milestone_id', 'Milestone not found')
+dependency_access = _guard(dependency_project_id, 'dependency_id', 'Dependency not found')
+
+
+def stats():
+    return {
+        'roles': role_cache.stats(),
+        'tasks': task_project_cache.stats(),
+        'milestones': milestone_project_cache.stats(),
+    }
@@ -0,0 +1,344 @@
+# analytics.py
+"""Агрегаты для аналитики проекта, вычисляемые в SQL.
+
+Загрузка участников считается одним GROUP BY по task_assignees вместо
+перебора всех задач для каждого участника. Горизонт загрузки - число рабочих
+дней (пн-пт) в реальном интервале дат задач проекта или в окне from/to.
+С окном длительность задачи учитывается пропорционально ее пересечению с окном.
+
+Портфель проектов читается из project_summary (ее поддерживают триггеры,
+см. migrations.py) одним запросом по всем проектам пользователя.
+
+Дневная гистограмма загрузки строится разностным массивом: задача добавляет
+свою дневную нагрузку в две ячейки (первый день и день после последнего), а
+нагрузка по дням получается одной накопленной суммой на пользователя.
+"""
+import json
+import os
+import re
+from datetime import date, timedelta
+from itertools import accumulate, groupby
+
+# Множители сложности по приоритету задачи
+PRIORITY_MULTIPLIERS = {
+    'low': 1.0,
+    'medium': 1.5,
+    'high': 2.0,
+    'critical': 3.0,
+}
+# Сколько задач участника отдавать в списке (сортировка по сложности)
+ANALYTICS_TASKS_PER_USER = int(os.environ.get('ANALYTICS_TASKS_PER_USER', 50))
+# Верхняя граница процента загрузки на графике
+WORKLOAD_PERCENT_CAP = 200
+# Самое длинное окно гистограммы загрузки, дней
+HISTOGRAM_MAX_DAYS = int(os.environ.get('HISTOGRAM_MAX_DAYS', 1100))
+
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# CASE по приоритету; значения - константы модуля, не пользовательский ввод
+_MULTIPLIER_SQL = 'CASE t.priority ' + ' '.join(
+    f"WHEN '{name}' THEN {value}" for name, value in PRIORITY_MULTIPLIERS.items()
+) + ' ELSE 1.0 END'
+
+
+def priority_multiplier(priority):
+    return PRIORITY_MULTIPLIERS.get(priority, 1.0)
+
+
+def parse_window(args):
+    """Окно дат из ?from=&to= (оба необязательны); ValueError при неверном формате"""
+    window = {}
+    for name in ('from', 'to'):
+        value = args.get(name)
+        if value:
+            if not _DATE_RE.match(value):
+                raise ValueError(f'Invalid {name} date, expected YYYY-MM-DD')
+            try:
+                window[name] = date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f'Invalid {name} date, expected YYYY-MM-DD')
+    if 'from' in window and 'to' in window and window['from'] > window['to']:
+        raise ValueError('from must not be after to')
+    return window
+
+
+def working_days(start, end):
+    """Число рабочих дней (пн-пт) в [start, end] без перебора по дням"""
+    if end < start:
+        return 0
+    days = (end - start).days + 1
+    weeks, rest = divmod(days, 7)
+    count = weeks * 5
+    first = start.weekday()
+    count += sum(1 for offset in range(rest) if (first + offset) % 7 < 5)
+    return count
+
+
+def project_horizon(conn, project_id, window):
+    """(начало, конец, рабочие дни) горизонта загрузки.
+
+    Границы, не заданные окном, берутся из крайних дат задач проекта.
+    """
+    start, end = window.get('from'), window.get('to')
+    if start is None or end is None:
+        # Один проход по задачам проекта через idx_tasks_project_start
+        row = conn.execute('''
+            SELECT MIN(start_date) AS first_day, MAX(COALESCE(end_date, start_date)) AS last_day
+            FROM tasks WHERE project_id = ?
+        ''', (project_id,)).fetchone()
+        try:
+            if start is None and row['first_day']:
+                start = date.fromisoformat(row['first_day'][:10])
+            if end is None and row['last_day']:
+                end = date.fromisoformat(row['last_day'][:10])
+        except ValueError:
+            pass
+    if start is None or end is None or end < start:
+        return start, end, 0
+    return start, end, working_days(start, end)
+
+
+def _window_clauses(window):
+    """Условие пересечения задачи с окном и доля ее длительности внутри окна.
+
+    Возвращает (условия, их параметры, выражение доли, его параметры).
+    """
+    clauses, params = [], []
+    if not window:
+        return clauses, params, 't.duration', []
+    start = window.get('from', date.min).isoformat()
+    end = window.get('to', date.max).isoformat()
+    if 'from' in window:
+        clauses.append('COALESCE(t.end_date, t.start_date) >= ?')
+        params.append(start)
+    if 'to' in window:
+        clauses.append('t.start_date <= ?')
+        params.append(end)
+    # Длительность * (дни пересечения с окном / календарная длина задачи)
+    share = '''t.duration * MAX(0.0,
+            julianday(MIN(COALESCE(t.end_date, t.start_date), ?))
+            - julianday(MAX(t.start_date, ?)) + 1)
+        / MAX(1.0, julianday(COALESCE(t.end_date, t.start_date)) - julianday(t.start_date) + 1)'''
+    return clauses, params, share, [end, start]
+
+
+def workload(conn, project_id, window=None):
+    """Загрузка участников проекта: {'workload_data', 'total_work_days', 'horizon'}"""
+    window = window or {}
+    start, end, total_work_days = project_horizon(conn, project_id, window)
+
+    members = conn.execute('''
+        SELECT pm.user_id, u.username, u.email, pm.role
+        FROM project_members pm
+        JOIN users u ON pm.user_id = u.id
+        WHERE pm.project_id = ?
+        UNION
+        SELECT p.user_id AS user_id, u.username, u.email, 'owner' AS role
+        FROM projects p
+        JOIN users u ON p.user_id = u.id
+        WHERE p.id = ?
+    ''', (project_id, project_id)).fetchall()
+
+    clauses, window_params, duration_sql, duration_params = _window_clauses(window)
+    where = ' AND '.join(['t.project_id = ?'] + clauses)
+    params = [project_id] + window_params
+
+    # duration_sql входит в запрос дважды: в SUM длительности и в сложность
+    totals = {row['user_id']: row for row in conn.execute(f'''
+        SELECT ta.user_id,
+               COUNT(*) AS task_count,
+               SUM({duration_sql}) AS total_duration,
+               SUM(({duration_sql}) * {_MULTIPLIER_SQL}) AS complexity_score
+        FROM tasks t
+        JOIN task_assignees ta ON ta.task_id = t.id
+        WHERE {where}
+        GROUP BY ta.user_id
+    ''', duration_params * 2 + params).fetchall()}
+
+    # Самые сложные задачи каждого участника, не больше ANALYTICS_TASKS_PER_USER.
+    # Ранжирование идет по узким строкам покрывающего индекса, а заголовки
+    # читаются только для отобранных задач
+    tasks_by_user = {}
+    for row in conn.execute(f'''
+        SELECT r.user_id, t.id, t.title, t.duration, t.priority, t.status, r.multiplier
+        FROM (
+            SELECT ta.user_id, t.id, {_MULTIPLIER_SQL} AS multiplier,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY ta.user_id
+                       ORDER BY t.duration * {_MULTIPLIER_SQL} DESC, t.id
+                   ) AS rank
+            FROM tasks t
+            JOIN task_assignees ta ON ta.task_id = t.id
+            WHERE {where}
+        ) r
+        JOIN tasks t ON t.id = r.id
+        WHERE r.rank <= ?
+        ORDER BY r.user_id, r.rank
+    ''', params + [ANALYTICS_TASKS_PER_USER]).fetchall():
+        tasks_by_user.setdefault(row['user_id'], []).append({
+            'id': row['id'],
+            'title': row['title'],
+            'duration': row['duration'],
+            'priority': row['priority'],
+            'status': row['status'],
+            'priority_multiplier': row['multiplier'],
+        })
+
+    workload_data = []
+    for member in members:
+        user_id = member['user_id']
+        total = totals.get(user_id)
+        total_duration = (total['total_duration'] or 0) if total else 0
+        if total_work_days:
+            percentage = min(total_duration / total_work_days * 100, WORKLOAD_PERCENT_CAP)
+        else:
+            percentage = 0
+        workload_data.append({
+            'user_id': user_id,
+            'username': member['username'],
+            'email': member['email'],
+            'role': member['role'],
+            'task_count': total['task_count'] if total else 0,
+            'total_duration': round(total_duration, 2),
+            'workload_percentage': round(percentage, 2),
+            'complexity_score': round(total['complexity_score'] or 0, 2) if total else 0,
+            'tasks': tasks_by_user.get(user_id, []),
+        })
+
+    return {
+        'workload_data': workload_data,
+        'total_work_days': total_work_days,
+        'horizon': {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+        },
+    }
+
+
+def _overallocated_spans(load, start, capacity):
+    """Непрерывные отрезки дней, где нагрузка выше capacity"""
+    spans = []
+    day = 0
+    for over, run in groupby(load, key=lambda value: value > capacity):
+        run = list(run)
+        if over:
+            spans.append({
+                'start': (start + timedelta(days=day)).isoformat(),
+                'end': (start + timedelta(days=day + len(run) - 1)).isoformat(),
+                'days': len(run),
+                'peak': max(run),
+            })
+        day += len(run)
+    return spans
+
+
+def load_histogram(conn, project_id, window=None, capacity=1.0):
+    """Дневная загрузка исполнителей проекта по календарю.
+
+    Длительность задачи распределяется равномерно по дням start_date..end_date
+    каждого исполнителя. Возвращает массив load (по дню на элемент, начиная с
+    horizon.start) и отрезки перегрузки для каждого пользователя с задачами.
+    ValueError, если горизонт длиннее HISTOGRAM_MAX_DAYS.
+    """
+    window = window or {}
+    start, end, _ = project_horizon(conn, project_id, window)
+    result = {
+        'horizon': {'start': None, 'end': None, 'days': 0},
+        'capacity': capacity,
+        'users': [],
+    }
+    if start is None or end is None or end < start:
+        return result
+    days = (end - start).days + 1
+    if days > HISTOGRAM_MAX_DAYS:
+        raise ValueError(f'Date range is longer than {HISTOGRAM_MAX_DAYS} days, narrow it with from/to')
+
+    # Смещения дней считает SQLite; строки читаются из idx_tasks_project_workload
+    rows = conn.execute('''
+        SELECT ta.user_id,
+               CAST(julianday(t.start_date) - julianday(?) AS INTEGER) AS first_day,
+               CAST(julianday(COALESCE(t.end_date, t.start_date)) - julianday(?) AS INTEGER) AS last_day,
+               t.duration
+        FROM tasks t
+        JOIN task_assignees ta ON ta.task_id = t.id
+        WHERE t.project_id = ? AND t.start_date IS NOT NULL
+          AND COALESCE(t.end_date, t.start_date) >= ? AND t.start_date <= ?
+    ''', (start.isoformat(), start.isoformat(), project_id,
+          start.isoformat(), end.isoformat())).fetchall()
+
+    diffs = {}
+    for user_id, first_day, last_day, duration in rows:
+        if first_day is None or last_day is None:
+            continue
+        last_day = max(first_day, last_day)
+        # Нагрузка в день считается по всей длине задачи, затем обрезается окном
+        rate = (duration or 0) / (last_day - first_day + 1)
+        diff = diffs.get(user_id)
+        if diff is None:
+            diff = diffs[user_id] = [0.0] * (days + 1)
+        diff[max(first_day, 0)] += rate
+        diff[min(last_day, days - 1) + 1] -= rate
+
+    usernames = {}
+    if diffs:
+        usernames = {row['id']: row['username'] for row in conn.execute(
+            'SELECT id, username FROM users WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(list(diffs)),)
+        ).fetchall()}
+
+    for user_id, diff in sorted(diffs.items()):
+        # + 0.0 убирает -0.0 от погрешности вычитания дробных нагрузок
+        load = [round(value, 2) + 0.0 for value in accumulate(diff[:days])]
+        result['users'].append({
+            'user_id': user_id,
+            'username': usernames.get(user_id),
+            'load': load,
+            'peak': max(load),
+            'overallocated': _overallocated_spans(load, start, capacity),
+        })
+
+    result['horizon'] = {'start': start.isoformat(), 'end': end.isoformat(), 'days': days}
+    return result
+
+
+def portfolio(conn, user_id, today=None):
+    """Сводка по всем проектам пользователя (владелец или участник).
+
+    Счетчики берутся из project_summary, а просрочка зависит от даты и
+    считается при чтении по idx_tasks_project_end - запрос ничего не пишет.
+    """
+    today = (today or date.today()).isoformat()
+    rows = conn.execute('''
+        SELECT p.id, p.name, p.description, p.user_id AS owner_id,
+               s.planned, s.in_progress, s.completed, s.task_count, s.total_duration,
+               s.min_start, s.max_end, s.revision,
+               (SELECT COUNT(*) FROM tasks t
+                WHERE t.project_id = p.id AND t.end_date < ? AND t.status != 'completed') AS overdue
+        FROM projects p
+        JOIN project_summary s ON s.project_id = p.id
+        WHERE p.user_id = ? OR p.id IN (SELECT project_id FROM project_members WHERE user_id = ?)
+        ORDER BY p.name
+    ''', (today, user_id, user_id)).fetchall()
+
+    projects = []
+    for row in rows:
+        total = row['task_count']
+        projects.append({
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'is_owner': row['owner_id'] == user_id,
+            'task_count': total,
+            'status_counts': {
+                'planned': row['planned'],
+                'in_progress': row['in_progress'],
+                'completed': row['completed'],
+            },
+            'progress': round(row['completed'] / total * 100, 1) if total else 0,
+            'total_duration': row['total_duration'],
+            'project_start': row['min_start'],
+            'project_end': row['max_end'],
+            'overdue': row['overdue'],
+            'revision': row['revision'],
+        })
+    return projects
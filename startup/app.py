@@ -1,28 +1,99 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response, g, flash
 from flask_login import LoginManager, current_user, login_required
 import sqlite3
 import os
-from datetime import datetime, timedelta
-from database import update_user_profile, update_user_password, verify_current_password, update_user_menu_position
-from flask import flash
+import json
+import logging
+from datetime import date, datetime, timedelta
+from functools import wraps
+from database import (
+    update_user_profile, update_user_password, verify_current_password, update_user_menu_position,
+    get_db_connection, init_app as init_db_app, bump_project_revision, bump_task_project_revision,
+    get_project_revision, bump_milestone_project_revision, close_db, pool as db_pool, user_cache,
+)
+from scheduler import (
+    cascade_reschedule, load_project_graph, critical_path, propagate_status, propagate_statuses,
+    parse_legacy_dependencies, set_task_predecessors, sync_legacy_dependencies, level_project,
+)
+from cache import LRUCache, TTLCache
+from ordering import POSITION_GAP, column_end_position, move_item
+from task_queries import PRIORITIES, parse_listing, fetch_page, load_assignees
+from events import bus as event_bus, stream as event_stream
+from recurrence import occurrences, parse_rule, recurrence_columns
+from logging_setup import configure_logging, logging_stats
+import metrics
+import hashing
+from hashing import HashingBusy
+import analytics
+from analytics import parse_window
+import access
+from access import (
+    check_project_access, has_project_access, project_access, task_access, task_project_id, milestone_access,
+    dependency_access, forget_membership, forget_tasks, forget_milestone,
+)
 
 # Импортируем из auth.py
 from auth import auth_bp, login_manager
 
 app = Flask(__name__)
-import os
+# Логи JSON через очередь, request_id в каждой записи и в заголовке X-Request-ID
+configure_logging(app)
+# Задержки маршрутов и SQL по запросам для /metrics
+metrics.init_app(app)
+logger = logging.getLogger(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or os.urandom(24).hex()  # Замените на случайный ключ!
 
-def check_project_access(project_id, user_id):
-    """Проверяет доступ пользователя к проекту (владелец или участник)"""
+def project_etag(view):
+    """Сильный ETag "p<id>-r<ревизия>" для GET API проекта.
+
+    Ревизия читается из projects до запросов самого обработчика: если версия у клиента
+    актуальна (If-None-Match), сразу отвечаем 304, не обращаясь к таблице задач.
+    """
+    @wraps(view)
+    def wrapper(project_id, *args, **kwargs):
+        # Без доступа обработчик сам вернет ошибку, кешировать ее не нужно
+        if not current_user.is_authenticated or not has_project_access(project_id, current_user.id):
+            return view(project_id, *args, **kwargs)
+        
+        conn = get_db_connection()
+        revision = get_project_revision(conn, project_id)
+        conn.close()
+        
+        etag = f'p{project_id}-r{revision}'
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(project_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Vary'] = 'Cookie'
+        return response
+    return wrapper
+
+def publish_project_event(project_id, event, data):
+    """Рассылает изменение подписчикам SSE проекта (вызывать после commit)"""
+    conn = get_db_connection()
+    revision = get_project_revision(conn, project_id)
+    conn.close()
+    
+    event_bus.publish(project_id, event, dict(
+        data,
+        project_id=project_id,
+        revision=revision,
+        user_id=current_user.id if current_user.is_authenticated else None
+    ))
+
+def publish_task_event(task_id, event, data):
+    """То же для изменения задачи: проект определяется по задаче"""
     conn = get_db_connection()
-    project = conn.execute('''
-        SELECT p.* FROM projects p 
-        LEFT JOIN project_members pm ON p.id = pm.project_id AND pm.user_id = ?
-        WHERE p.id = ? AND (p.user_id = ? OR pm.user_id = ?)
-    ''', (user_id, project_id, user_id, user_id)).fetchone()
+    task = conn.execute('SELECT project_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
     conn.close()
-    return project
+    
+    if task:
+        publish_project_event(task['project_id'], event, dict(data, task_id=task_id))
 
 # Инициализация LoginManager
 login_manager.init_app(app)
@@ -31,19 +102,19 @@ login_manager.login_view = 'auth.login'
 # Регистрируем blueprint аутентификации
 app.register_blueprint(auth_bp)
 
-# Настройки базы данных
-DATABASE = 'instance/app.db'
-
-def get_db_connection():
-    os.makedirs('instance', exist_ok=True)
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Соединения с базой данных берутся из пула (одно на запрос), см. database.py
+init_db_app(app)
 
 # ОСТАВЛЯЕМ оригинальную функцию init_db, но упрощаем её
 def init_db():
     from database import init_db as db_init
+    from migrations import run_migrations
     db_init()
+    # Доводим схему до актуальной версии (замена ручного update_database.py)
+    conn = get_db_connection()
+    applied = run_migrations(conn)
+    if applied:
+        logger.info("Применены миграции схемы: %s", applied)
 
 # Инициализация БД при старте
 # Инициализация БД при старте (только если не существует)
@@ -51,7 +122,7 @@ with app.app_context():
     try:
         init_db()
     except Exception as e:
-        print(f"Ошибка инициализации БД: {e}")
+        logger.exception("Ошибка инициализации БД")
         # Можно продолжить работу, если БД уже существует
 
 # ДОБАВЛЯЕМ ЭТУ ФУНКЦИЮ В app.py
@@ -67,23 +138,22 @@ def check_task_dependencies(task_id):
         if not task:
             return True
         
-        # Проверяем СТАРЫЕ зависимости (FS)
-        if task['dependencies']:
-            dependencies = task['dependencies'].split(',')
-            for dep_id in dependencies:
-                if dep_id.strip():
-                    dep_task = conn.execute('SELECT status FROM tasks WHERE id = ?', (int(dep_id),)).fetchone()
-                    if dep_task and dep_task['status'] != 'completed':
-                        return False
-        
-        # Проверяем НОВЫЕ зависимости из task_dependencies
+        # Зависимости из task_dependencies (старое поле dependencies перенесено туда миграцией)
         dependencies = conn.execute('''
-            SELECT td.dependency_type, t.status as predecessor_status 
+            SELECT td.predecessor_id, td.dependency_type, t.status as predecessor_status 
             FROM task_dependencies td 
             JOIN tasks t ON td.predecessor_id = t.id 
             WHERE td.task_id = ?
         ''', (task_id,)).fetchall()
         
+        # Совместимость: ID из старого поля, которых еще нет в таблице связей, считаем FS
+        known = {dep['predecessor_id'] for dep in dependencies}
+        for dep_id in parse_legacy_dependencies(task['dependencies']):
+            if dep_id not in known:
+                dep_task = conn.execute('SELECT status FROM tasks WHERE id = ?', (dep_id,)).fetchone()
+                if dep_task and dep_task['status'] != 'completed':
+                    return False
+        
         for dep in dependencies:
             dependency_type = dep['dependency_type']
             predecessor_status = dep['predecessor_status']
@@ -102,7 +172,7 @@ def check_task_dependencies(task_id):
         return True
         
     except Exception as e:
-        print(f"Ошибка при проверке зависимостей: {e}")
+        logger.exception("Ошибка при проверке зависимостей задачи %s", task_id)
         return True
     finally:
         conn.close()
@@ -215,7 +285,10 @@ def api_add_project_member(project_id):
         ''', (project_id, user_id, role))
         
         member_id = cursor.lastrowid
+        bump_project_revision(conn, project_id)
         conn.commit()
+        forget_membership(project_id, user_id)
+        invalidate_team_overview(conn, project_id)
         conn.close()
         
         return jsonify({'success': True, 'member_id': member_id})
@@ -245,7 +318,11 @@ def api_remove_project_member(project_id, user_id):
             'DELETE FROM project_members WHERE project_id = ? AND user_id = ?', 
             (project_id, user_id)
         )
+        bump_project_revision(conn, project_id)
         conn.commit()
+        forget_membership(project_id, user_id)
+        # Удаленный участник уже не найдется среди участников - сбрасываем его явно
+        invalidate_team_overview(conn, project_id, user_id)
         conn.close()
         
         return jsonify({'success': True})
@@ -281,7 +358,10 @@ def api_update_member_role(project_id, user_id):
             'UPDATE project_members SET role = ? WHERE project_id = ? AND user_id = ?', 
             (new_role, project_id, user_id)
         )
+        bump_project_revision(conn, project_id)
         conn.commit()
+        forget_membership(project_id, user_id)
+        invalidate_team_overview(conn, project_id)
         conn.close()
         
         return jsonify({'success': True})
@@ -348,9 +428,11 @@ def api_create_personal_task():
             end_date = (datetime.now().date() + timedelta(days=duration-1)).isoformat()
         
         cursor.execute('''
-            INSERT INTO personal_tasks (title, description, duration, start_date, end_date, user_id, priority)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, description, duration, start_date, end_date, current_user.id, priority))  # ← И ЭТУ
+            INSERT INTO personal_tasks (title, description, duration, start_date, end_date, user_id, priority,
+                                        position)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (title, description, duration, start_date, end_date, current_user.id, priority,
+              column_end_position(conn, 'personal_tasks', current_user.id, 'planned')))  # ← И ЭТУ
         
         task_id = cursor.lastrowid
         conn.commit()
@@ -366,13 +448,20 @@ def api_create_personal_task():
 @login_required
 def api_update_personal_task_status(task_id):
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         new_status = data.get('status')
-        new_position = data.get('position', 0)
+        
+        if new_status not in TASK_STATUSES:
+            return jsonify({'error': 'Valid status is required'}), 400
         
         conn = get_db_connection()
-        conn.execute('UPDATE personal_tasks SET status = ?, position = ? WHERE id = ?',
-                    (new_status, new_position, task_id))
+        task = conn.execute(
+            'SELECT status FROM personal_tasks WHERE id = ? AND user_id = ?',
+            (task_id, current_user.id)
+        ).fetchone()
+        # При смене колонки карточка встает в ее конец (см. ordering.py)
+        if task and task['status'] != new_status:
+            move_item(conn, 'personal_tasks', current_user.id, task_id, new_status)
         conn.commit()
         conn.close()
         
@@ -381,6 +470,42 @@ def api_update_personal_task_status(task_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# API: Переместить персональную задачу (перед before_id, после after_id или в конец колонки)
+@app.route('/api/personal/task/<int:task_id>/move', methods=['POST'])
+@login_required
+def api_move_personal_task(task_id):
+    try:
+        data = request.get_json() or {}
+        new_status = data.get('status')
+        
+        if new_status not in TASK_STATUSES:
+            return jsonify({'error': 'Valid status is required'}), 400
+        
+        conn = get_db_connection()
+        task = conn.execute(
+            'SELECT id FROM personal_tasks WHERE id = ? AND user_id = ?',
+            (task_id, current_user.id)
+        ).fetchone()
+        if not task:
+            conn.close()
+            return jsonify({'error': 'Task not found'}), 404
+        
+        try:
+            new_position = move_item(conn, 'personal_tasks', current_user.id, task_id, new_status,
+                                     before_id=data.get('before_id'), after_id=data.get('after_id'))
+        except LookupError as e:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+        
+        conn.commit()
+        conn.close()
+        
+        return jsonify({'success': True, 'position': new_position})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # API: Обновить персональную задачу
 @app.route('/api/personal/task/<int:task_id>', methods=['PUT'])
 @login_required
@@ -394,8 +519,8 @@ def api_update_personal_task(task_id):
             return jsonify({'error': 'Title is required'}), 400
         
         conn = get_db_connection()
-        conn.execute('UPDATE personal_tasks SET title = ?, description = ? WHERE id = ?',
-                    (title, description, task_id))
+        conn.execute('UPDATE personal_tasks SET title = ?, description = ? WHERE id = ? AND user_id = ?',
+                    (title, description, task_id, current_user.id))
         conn.commit()
         conn.close()
         
@@ -420,18 +545,18 @@ def api_update_personal_task_dates(task_id):
             start_dt = datetime.strptime(start_date, '%Y-%m-%d')
             end_dt = datetime.strptime(end_date, '%Y-%m-%d')
             new_duration = (end_dt - start_dt).days + 1
-            conn.execute('UPDATE personal_tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ?',
-                        (start_date, end_date, new_duration, task_id))
+            conn.execute('UPDATE personal_tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ? AND user_id = ?',
+                        (start_date, end_date, new_duration, task_id, current_user.id))
         elif start_date and duration:
             start_dt = datetime.strptime(start_date, '%Y-%m-%d')
             new_end_date = (start_dt + timedelta(days=int(duration)-1)).strftime('%Y-%m-%d')
-            conn.execute('UPDATE personal_tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ?',
-                        (start_date, new_end_date, duration, task_id))
+            conn.execute('UPDATE personal_tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ? AND user_id = ?',
+                        (start_date, new_end_date, duration, task_id, current_user.id))
         elif end_date and duration:
             end_dt = datetime.strptime(end_date, '%Y-%m-%d')
             new_start_date = (end_dt - timedelta(days=int(duration)-1)).strftime('%Y-%m-%d')
-            conn.execute('UPDATE personal_tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ?',
-                        (new_start_date, end_date, duration, task_id))
+            conn.execute('UPDATE personal_tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ? AND user_id = ?',
+                        (new_start_date, end_date, duration, task_id, current_user.id))
         
         conn.commit()
         conn.close()
@@ -447,7 +572,7 @@ def api_update_personal_task_dates(task_id):
 def api_delete_personal_task(task_id):
     try:
         conn = get_db_connection()
-        conn.execute('DELETE FROM personal_tasks WHERE id = ?', (task_id,))
+        conn.execute('DELETE FROM personal_tasks WHERE id = ? AND user_id = ?', (task_id, current_user.id))
         conn.commit()
         conn.close()
         
@@ -478,44 +603,70 @@ def my_tasks():
 
 # app.py - ОБНОВЛЯЕМ СУЩЕСТВУЮЩИЙ МАРШРУТ /team
 
-# Команда (все проекты пользователя)
-@app.route('/team')
-@login_required
-def team():
-    conn = get_db_connection()
+# Обзор команд пользователя: короткий кеш, сбрасывается при изменении состава проекта
+TEAM_CACHE_TTL = float(os.environ.get('TEAM_CACHE_TTL', 30))
+team_overview_cache = TTLCache(max_size=256, ttl=TEAM_CACHE_TTL)
+
+
+def load_team_overview(conn, user_id):
+    """Проекты пользователя с участниками: два запроса вместо одного на проект"""
+    cached = team_overview_cache.get(user_id)
+    if cached is not None:
+        return cached
     
     # Получаем проекты где пользователь является владельцем или участником
-    projects_with_teams = conn.execute('''
+    projects = conn.execute('''
         SELECT p.*, pm.role 
         FROM projects p 
         LEFT JOIN project_members pm ON p.id = pm.project_id AND pm.user_id = ?
         WHERE p.user_id = ? OR pm.user_id = ?
         GROUP BY p.id
         ORDER BY p.name
-    ''', (current_user.id, current_user.id, current_user.id)).fetchall()
+    ''', (user_id, user_id, user_id)).fetchall()
     
-    # Для каждого проекта получаем участников
-    projects_data = []
-    for project in projects_with_teams:
-        members = conn.execute('''
-            SELECT pm.*, u.username, u.email 
-            FROM project_members pm 
-            JOIN users u ON pm.user_id = u.id 
-            WHERE pm.project_id = ?
-            ORDER BY 
-                CASE pm.role 
-                    WHEN 'owner' THEN 1
-                    WHEN 'admin' THEN 2
-                    WHEN 'member' THEN 3
-                END,
-                u.username
-        ''', (project['id'],)).fetchall()
-        
-        projects_data.append({
-            'project': project,
-            'members': members
-        })
+    # Участники всех этих проектов одним запросом, группировка - в Python
+    members_by_project = {project['id']: [] for project in projects}
+    members = conn.execute('''
+        SELECT pm.*, u.username, u.email 
+        FROM project_members pm 
+        JOIN users u ON pm.user_id = u.id 
+        WHERE pm.project_id IN (SELECT value FROM json_each(?))
+        ORDER BY 
+            pm.project_id,
+            CASE pm.role 
+                WHEN 'owner' THEN 1
+                WHEN 'admin' THEN 2
+                WHEN 'member' THEN 3
+            END,
+            u.username
+    ''', (json.dumps(list(members_by_project)),)).fetchall()
+    for member in members:
+        members_by_project[member['project_id']].append(dict(member))
     
+    projects_data = [
+        {'project': dict(project), 'members': members_by_project[project['id']]}
+        for project in projects
+    ]
+    team_overview_cache.set(user_id, projects_data)
+    return projects_data
+
+
+def invalidate_team_overview(conn, project_id, *user_ids):
+    """Сбрасывает кеш обзора команд у владельца и участников проекта (и у user_ids)"""
+    rows = conn.execute('''
+        SELECT user_id FROM projects WHERE id = ?
+        UNION
+        SELECT user_id FROM project_members WHERE project_id = ?
+    ''', (project_id, project_id)).fetchall()
+    team_overview_cache.invalidate_many([row[0] for row in rows] + [int(user_id) for user_id in user_ids])
+
+
+# Команда (все проекты пользователя)
+@app.route('/team')
+@login_required
+def team():
+    conn = get_db_connection()
+    projects_data = load_team_overview(conn, current_user.id)
     conn.close()
     
     return render_template('team.html', 
@@ -528,6 +679,7 @@ def team():
 # API: Получить исполнителей задачи
 @app.route('/api/task/<int:task_id>/assignees', methods=['GET'])
 @login_required
+@task_access
 def api_get_task_assignees(task_id):
     conn = get_db_connection()
     
@@ -554,6 +706,7 @@ def api_get_task_assignees(task_id):
 # API: Добавить исполнителя к задаче
 @app.route('/api/task/<int:task_id>/assignees', methods=['POST'])
 @login_required
+@task_access
 def api_add_task_assignee(task_id):
     try:
         data = request.get_json()
@@ -592,10 +745,15 @@ def api_add_task_assignee(task_id):
             'INSERT INTO task_assignees (task_id, user_id) VALUES (?, ?)',
             (task_id, user_id)
         )
+        bump_task_project_revision(conn, task_id)
         
         conn.commit()
         conn.close()
         
+        publish_task_event(task_id, 'assignee_added', {
+            'assignee': {'id': user['id'], 'username': user['username']}
+        })
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -604,6 +762,7 @@ def api_add_task_assignee(task_id):
 # API: Удалить исполнителя из задачи
 @app.route('/api/task/<int:task_id>/assignees/<int:user_id>', methods=['DELETE'])
 @login_required
+@task_access
 def api_remove_task_assignee(task_id, user_id):
     try:
         conn = get_db_connection()
@@ -613,10 +772,13 @@ def api_remove_task_assignee(task_id, user_id):
             'DELETE FROM task_assignees WHERE task_id = ? AND user_id = ?',
             (task_id, user_id)
         )
+        bump_task_project_revision(conn, task_id)
         
         conn.commit()
         conn.close()
         
+        publish_task_event(task_id, 'assignee_removed', {'assignee_id': user_id})
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -625,6 +787,7 @@ def api_remove_task_assignee(task_id, user_id):
 # API: Получить доступных пользователей для назначения (участники проекта)
 @app.route('/api/project/<int:project_id>/available_assignees', methods=['GET'])
 @login_required
+@project_access
 def api_get_available_assignees(project_id):
     conn = get_db_connection()
     
@@ -691,11 +854,15 @@ def settings():
                 flash('Новые пароли не совпадают', 'error')
             elif len(new_password) < 6:
                 flash('Пароль должен содержать минимум 6 символов', 'error')
-            elif not verify_current_password(current_user.id, current_password):
-                flash('Текущий пароль неверен', 'error')
             else:
-                update_user_password(current_user.id, new_password)
-                flash('Пароль успешно изменен', 'success')
+                try:
+                    if not verify_current_password(current_user.id, current_password):
+                        flash('Текущий пароль неверен', 'error')
+                    else:
+                        update_user_password(current_user.id, new_password)
+                        flash('Пароль успешно изменен', 'success')
+                except HashingBusy:
+                    flash('Сервер перегружен, попробуйте еще раз через несколько секунд', 'error')
         
         # ДОБАВЛЯЕМ ОБРАБОТКУ НАСТРОЙКИ МЕНЮ
         elif operation == 'update_menu_position':
@@ -736,6 +903,8 @@ def create_project():
         )
         project_id = cursor.lastrowid
         conn.commit()
+        team_overview_cache.invalidate(current_user.id)
+        forget_membership(project_id, current_user.id)
         conn.close()
         
         return redirect(f'/project/{project_id}/kanban')
@@ -782,12 +951,13 @@ def network_graph(project_id):
         return render_template('network.html', project=dict(project), tasks=tasks_list, active_tab='network', current_user=current_user)
         
     except Exception as e:
-        print(f"Ошибка в network_graph: {str(e)}")
+        logger.exception("Ошибка в network_graph")
         return f"Внутренняя ошибка сервера: {str(e)}", 500
 
 # API: Получить все проекты
 @app.route('/api/project/<int:project_id>/tasks', methods=['GET'])
 @login_required
+@project_etag
 def api_get_tasks(project_id):
     """Получить задачи проекта (для канбан-доски)"""
     conn = get_db_connection()
@@ -797,6 +967,19 @@ def api_get_tasks(project_id):
     if not project:
         return jsonify({'error': 'Project not found'}), 404
     
+    # Постраничный режим с фильтрами (?limit=&cursor=&status=...), см. task_queries.py
+    try:
+        listing = parse_listing(request.args, default_sort='position')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if listing:
+        page = fetch_page(conn, listing, 'FROM tasks t', 't.project_id = ?', [project_id],
+                          't.*', current_user.id)
+        result = paged_tasks_response(conn, page, TASK_FIELDS)
+        conn.close()
+        return jsonify(result)
+    
     # Получаем задачи проекта
     tasks = conn.execute('''
         SELECT t.*, 
@@ -812,37 +995,63 @@ def api_get_tasks(project_id):
     
     conn.close()
     
-    tasks_list = []
-    for task in tasks:
-        assignees = []
-        if task['assignee_ids']:
-            assignee_ids = task['assignee_ids'].split(',')
-            assignee_names = task['assignee_names'].split(',')
-            for i, user_id in enumerate(assignee_ids):
-                if user_id and i < len(assignee_names):
-                    assignees.append({
-                        'id': int(user_id),
-                        'username': assignee_names[i]
-                    })
-        
-        tasks_list.append({
-            'id': task['id'],
-            'title': task['title'],
-            'description': task['description'],
-            'status': task['status'],
-            'duration': task['duration'],
-            'start_date': task['start_date'],
-            'end_date': task['end_date'],
-            'dependencies': task['dependencies'],
-            'assignees': assignees
-        })
+    return jsonify([serialize_task(task) for task in tasks])
+
+# Поля задачи в ответах API канбана
+TASK_FIELDS = ('id', 'title', 'description', 'status', 'position', 'priority',
+               'duration', 'start_date', 'end_date', 'dependencies')
+
+def paged_tasks_response(conn, page, fields):
+    """Ответ постраничного API: задачи страницы с исполнителями, курсор и подсказка о количестве"""
+    assignees = load_assignees(conn, [row['id'] for row in page['rows']])
     
-    return jsonify(tasks_list)
+    tasks_list = []
+    for row in page['rows']:
+        task = {field: row[field] for field in fields}
+        task['assignees'] = assignees.get(row['id'], [])
+        tasks_list.append(task)
+    
+    return {
+        'success': True,
+        'tasks': tasks_list,
+        'next_cursor': page['next_cursor'],
+        'total': page['total'],
+        'total_is_estimate': page['total_is_estimate']
+    }
+
+def serialize_task(task):
+    """Задача в формате API канбана (строка запроса с assignee_ids/assignee_names)"""
+    assignees = []
+    if task['assignee_ids']:
+        assignee_ids = task['assignee_ids'].split(',')
+        assignee_names = task['assignee_names'].split(',')
+        for i, user_id in enumerate(assignee_ids):
+            if user_id and i < len(assignee_names):
+                assignees.append({
+                    'id': int(user_id),
+                    'username': assignee_names[i]
+                })
+    
+    return {
+        'id': task['id'],
+        'title': task['title'],
+        'description': task['description'],
+        'status': task['status'],
+        'position': task['position'],
+        'priority': task['priority'],
+        'duration': task['duration'],
+        'start_date': task['start_date'],
+        'end_date': task['end_date'],
+        'dependencies': task['dependencies'],
+        'assignees': assignees
+    }
 
 # API: Создать задачу
 # ОБНОВЛЯЕМ ENDPOINT СОЗДАНИЯ ЗАДАЧИ
 # В API создания задачи
 @app.route('/api/project/<int:project_id>/task', methods=['POST'])
+@login_required
+@project_access
 def api_create_task(project_id):
     try:
         data = request.get_json()
@@ -865,14 +1074,19 @@ def api_create_task(project_id):
             end_date = (datetime.now().date() + timedelta(days=duration-1)).isoformat()
         
         cursor.execute('''
-            INSERT INTO tasks (project_id, title, description, status, duration, start_date, end_date, priority)
-            VALUES (?, ?, ?, 'planned', ?, ?, ?, ?)
-        ''', (project_id, title, description, duration, start_date, end_date, priority))  # ← И ЭТУ
+            INSERT INTO tasks (project_id, title, description, status, duration, start_date, end_date, priority,
+                               position)
+            VALUES (?, ?, ?, 'planned', ?, ?, ?, ?, ?)
+        ''', (project_id, title, description, duration, start_date, end_date, priority,
+              column_end_position(conn, 'tasks', project_id, 'planned')))  # ← И ЭТУ
         
         task_id = cursor.lastrowid
+        bump_project_revision(conn, project_id)
         conn.commit()
         conn.close()
         
+        publish_project_event(project_id, 'task_created', {'task_id': task_id})
+        
         return jsonify({'success': True, 'task_id': task_id})
         
     except Exception as e:
@@ -880,6 +1094,8 @@ def api_create_task(project_id):
 
 # ДОБАВЛЯЕМ ENDPOINT ДЛЯ ПРОВЕРКИ ВОЗМОЖНОСТИ НАЧАЛА ЗАДАЧИ
 @app.route('/api/task/<int:task_id>/can_start', methods=['GET'])
+@login_required
+@task_access
 def api_can_task_start(task_id):
     """
     Проверяет, может ли задача быть начата (все зависимости выполнены)
@@ -890,6 +1106,7 @@ def api_can_task_start(task_id):
 # API: Получить задачу
 @app.route('/api/task/<int:task_id>', methods=['GET'])
 @login_required
+@task_access
 def api_get_task(task_id):
     conn = get_db_connection()
     task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
@@ -912,28 +1129,96 @@ def api_get_task(task_id):
 # API: Обновить статус
 @app.route('/api/task/<int:task_id>/status', methods=['POST'])
 @login_required
+@task_access
 def api_update_task_status(task_id):
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         new_status = data.get('status')
-        new_position = data.get('position', 0)
+        
+        if new_status not in TASK_STATUSES:
+            return jsonify({'error': 'Valid status is required'}), 400
+        if 'position' in data:
+            # Позицию назначает сервер; место в колонке задается через /move (before_id/after_id)
+            return jsonify({'error': 'position is not supported here, use /api/task/<id>/move'}), 400
         
         conn = get_db_connection()
-        conn.execute('UPDATE tasks SET status = ?, position = ? WHERE id = ?',
-                    (new_status, new_position, task_id))
+        task = conn.execute('SELECT project_id, status, position FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if not task:
+            conn.close()
+            return jsonify({'error': 'Task not found'}), 404
+        
+        # При смене колонки карточка встает в ее конец
+        if task['status'] != new_status:
+            new_position = move_item(conn, 'tasks', task['project_id'], task_id, new_status)
+        else:
+            new_position = task['position']
+        
+        # ОБНОВЛЯЕМ ЗАВИСИМЫЕ ЗАДАЧИ В ТОЙ ЖЕ ТРАНЗАКЦИИ
+        propagated = propagate_status(conn, task_id, new_status)
+        bump_task_project_revision(conn, task_id)
         conn.commit()
         conn.close()
         
-        # ВЫЗЫВАЕМ ФУНКЦИЮ ДЛЯ ОБНОВЛЕНИЯ ЗАВИСИМЫХ ЗАДАЧ
-        update_dependent_tasks_status(task_id, new_status)
+        publish_task_event(task_id, 'task_status', {
+            'status': new_status,
+            'position': new_position,
+            'propagated': propagated
+        })
         
         return jsonify({'success': True})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# API: Переместить карточку (перед before_id, после after_id или в конец колонки)
+@app.route('/api/task/<int:task_id>/move', methods=['POST'])
+@login_required
+@task_access
+def api_move_task(task_id):
+    try:
+        data = request.get_json() or {}
+        new_status = data.get('status')
+        
+        if new_status not in TASK_STATUSES:
+            return jsonify({'error': 'Valid status is required'}), 400
+        
+        conn = get_db_connection()
+        task = conn.execute('SELECT project_id, status FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if not task:
+            conn.close()
+            return jsonify({'error': 'Task not found'}), 404
+        
+        try:
+            # Обычно меняется одна строка: позиция - середина между соседями
+            new_position = move_item(conn, 'tasks', task['project_id'], task_id, new_status,
+                                     before_id=data.get('before_id'), after_id=data.get('after_id'))
+        except LookupError as e:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+        
+        propagated = {}
+        if task['status'] != new_status:
+            propagated = propagate_status(conn, task_id, new_status)
+        bump_project_revision(conn, task['project_id'])
+        conn.commit()
+        conn.close()
+        
+        publish_task_event(task_id, 'task_status', {
+            'status': new_status,
+            'position': new_position,
+            'propagated': propagated
+        })
+        
+        return jsonify({'success': True, 'position': new_position, 'propagated': propagated})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # API: Обновить задачу
 @app.route('/api/task/<int:task_id>', methods=['PUT'])
+@login_required
+@task_access
 def api_update_task(task_id):
     try:
         data = request.get_json()
@@ -947,9 +1232,16 @@ def api_update_task(task_id):
         conn = get_db_connection()
         conn.execute('UPDATE tasks SET title = ?, description = ?, priority = ? WHERE id = ?',
                     (title, description, priority, task_id))  # ← ОБНОВИТЕ ЭТУ СТРОЧКУ
+        bump_task_project_revision(conn, task_id)
         conn.commit()
         conn.close()
         
+        publish_task_event(task_id, 'task_updated', {
+            'title': title,
+            'description': description,
+            'priority': priority
+        })
+        
         return jsonify({'success': True})
         
     except Exception as e:
@@ -957,6 +1249,8 @@ def api_update_task(task_id):
 
 # API: Обновить даты
 @app.route('/api/task/<int:task_id>/dates', methods=['POST'])
+@login_required
+@task_access
 def api_update_task_dates(task_id):
     try:
         data = request.get_json()
@@ -983,11 +1277,19 @@ def api_update_task_dates(task_id):
             conn.execute('UPDATE tasks SET start_date = ?, end_date = ?, duration = ? WHERE id = ?',
                         (new_start_date, end_date, duration, task_id))
         
+        bump_task_project_revision(conn, task_id)
         conn.commit()
         conn.close()
         
         # ВЫЗЫВАЕМ КАСКАДНЫЙ ПЕРЕСЧЕТ ДАТ
-        cascade_recalculate_dates(task_id)
+        changes = cascade_recalculate_dates(task_id)
+        
+        conn = get_db_connection()
+        task = conn.execute('SELECT start_date, end_date, duration FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        conn.close()
+        if task:
+            changes[task_id] = (task['start_date'], task['end_date'])
+        publish_task_event(task_id, 'task_dates', {'changes': changes})
         
         return jsonify({'success': True})
         
@@ -996,31 +1298,250 @@ def api_update_task_dates(task_id):
 
 # API: Удалить задачу
 @app.route('/api/task/<int:task_id>', methods=['DELETE'])
+@login_required
+@task_access
 def api_delete_task(task_id):
     try:
         conn = get_db_connection()
+        task = conn.execute('SELECT project_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
         conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        # Ревизия увеличивается последней: журнал изменений помечает строки следующей ревизией
+        if task:
+            bump_project_revision(conn, task['project_id'])
         conn.commit()
         conn.close()
+        forget_tasks([task_id])
+        
+        if task:
+            publish_project_event(task['project_id'], 'task_deleted', {'task_id': task_id})
         
         return jsonify({'success': True, 'message': 'Задача удалена'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Максимум операций в одном пакетном запросе
+BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', 1000))
+TASK_STATUSES = ('planned', 'in_progress', 'completed')
+
+
+def is_json_int(value):
+    """Целое число из JSON (True/False в Python тоже int - их не принимаем)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_iso_date(value):
+    """Строка даты строго в формате YYYY-MM-DD"""
+    if not isinstance(value, str) or len(value) != 10:
+        return False
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return False
+    return True
+
+
+def batch_task_dates(operation, today):
+    """(start_date, end_date, duration) новой задачи пакета - по тем же правилам, что api_update_task.
+
+    Даты задают длительность; одна дата с длительностью - вторую дату. Ошибки - ValueError
+    с текстом для ответа 400.
+    """
+    for field in ('start_date', 'end_date'):
+        if operation.get(field) and not is_iso_date(operation[field]):
+            raise ValueError(f'{field} must be YYYY-MM-DD')
+    duration = operation.get('duration')
+    if duration is not None and (not is_json_int(duration) or duration < 1):
+        raise ValueError('duration must be a positive integer')
+    
+    start_date = operation.get('start_date')
+    end_date = operation.get('end_date')
+    if start_date and end_date:
+        span = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days + 1
+        if span < 1:
+            raise ValueError('end_date is before start_date')
+        if duration is not None and duration != span:
+            raise ValueError('duration does not match start_date and end_date')
+        return start_date, end_date, span
+    
+    duration = duration or 1
+    if end_date:
+        start_date = (date.fromisoformat(end_date) - timedelta(days=duration - 1)).isoformat()
+    else:
+        start_date = start_date or today.isoformat()
+        end_date = (date.fromisoformat(start_date) + timedelta(days=duration - 1)).isoformat()
+    return start_date, end_date, duration
+
+
+# API: Пакетные операции с задачами (create/update/move/delete) в одной транзакции
+@app.route('/api/project/<int:project_id>/tasks:batch', methods=['POST'])
+@login_required
+@project_access
+def api_tasks_batch(project_id):
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Operations list is required'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'Too many operations (max {BATCH_MAX_OPERATIONS})'}), 400
+    
+    # Разбираем и проверяем все операции до записи в базу
+    creates, updates, moves, deletes = [], [], [], []
+    today = datetime.now().date()
+    for index, operation in enumerate(operations):
+        kind = operation.get('op') if isinstance(operation, dict) else None
+        
+        if kind in ('create', 'update') and operation.get('priority') is not None \
+                and operation['priority'] not in PRIORITIES:
+            return jsonify({'error': f'Operation {index}: invalid priority'}), 400
+        if kind in ('create', 'move') and operation.get('position') is not None \
+                and not is_json_int(operation['position']):
+            return jsonify({'error': f'Operation {index}: position must be an integer'}), 400
+        
+        if kind == 'create':
+            if not operation.get('title'):
+                return jsonify({'error': f'Operation {index}: title is required'}), 400
+            if operation.get('status', 'planned') not in TASK_STATUSES:
+                return jsonify({'error': f'Operation {index}: invalid status'}), 400
+            try:
+                dates = batch_task_dates(operation, today)
+            except ValueError as e:
+                return jsonify({'error': f'Operation {index}: {e}'}), 400
+            creates.append((operation, dates))
+            continue
+        
+        if kind not in ('update', 'move', 'delete'):
+            return jsonify({'error': f'Operation {index}: unknown op'}), 400
+        if not is_json_int(operation.get('id')):
+            return jsonify({'error': f'Operation {index}: task id is required'}), 400
+        
+        if kind == 'update':
+            if 'title' in operation and not operation['title']:
+                return jsonify({'error': f'Operation {index}: title is required'}), 400
+            updates.append(operation)
+        elif kind == 'move':
+            if operation.get('status') not in TASK_STATUSES:
+                return jsonify({'error': f'Operation {index}: invalid status'}), 400
+            moves.append(operation)
+        else:
+            deletes.append(operation)
+    
+    conn = get_db_connection()
+    try:
+        # Все задачи должны принадлежать проекту: одна выборка на весь пакет
+        task_ids = sorted({operation['id'] for operation in updates + moves + deletes})
+        current_statuses = {}
+        if task_ids:
+            rows = conn.execute('''
+                SELECT id, status FROM tasks
+                WHERE project_id = ? AND id IN (SELECT value FROM json_each(?))
+            ''', (project_id, json.dumps(task_ids))).fetchall()
+            current_statuses = {row['id']: row['status'] for row in rows}
+            missing = [task_id for task_id in task_ids if task_id not in current_statuses]
+            if missing:
+                conn.close()
+                return jsonify({'error': 'Tasks not found in project', 'task_ids': missing}), 404
+        
+        # Карточки без явной позиции встают в конец своей колонки
+        column_ends = {}
+        def next_position(status):
+            if status not in column_ends:
+                column_ends[status] = column_end_position(conn, 'tasks', project_id, status) - POSITION_GAP
+            column_ends[status] += POSITION_GAP
+            return column_ends[status]
+        
+        created_ids = []
+        cursor = conn.cursor()
+        for operation, (start_date, end_date, duration) in creates:
+            # lastrowid нужен для каждой новой задачи, поэтому вставка по одной (в той же транзакции)
+            status = operation.get('status', 'planned')
+            position = operation.get('position')
+            if position is None:
+                position = next_position(status)
+            cursor.execute('''
+                INSERT INTO tasks (project_id, title, description, status, position, duration,
+                                   start_date, end_date, priority)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (project_id, operation['title'], operation.get('description', ''),
+                  status, position, duration,
+                  start_date, end_date, operation.get('priority') or 'medium'))
+            created_ids.append(cursor.lastrowid)
+        
+        # Незаданные поля сохраняют текущее значение
+        conn.executemany('''
+            UPDATE tasks SET title = COALESCE(?, title),
+                             description = COALESCE(?, description),
+                             priority = COALESCE(?, priority)
+            WHERE id = ? AND project_id = ?
+        ''', [(operation.get('title'), operation.get('description'), operation.get('priority'),
+               operation['id'], project_id) for operation in updates])
+        
+        move_rows = []
+        for operation in moves:
+            position = operation.get('position')
+            if position is None and current_statuses[operation['id']] != operation['status']:
+                position = next_position(operation['status'])
+            move_rows.append((operation['status'], position, operation['id'], project_id))
+        conn.executemany('''
+            UPDATE tasks SET status = ?, position = COALESCE(?, position)
+            WHERE id = ? AND project_id = ?
+        ''', move_rows)
+        
+        conn.executemany('DELETE FROM tasks WHERE id = ? AND project_id = ?',
+                         [(operation['id'], project_id) for operation in deletes])
+        
+        # Зависимые статусы пересчитываются один раз для всех перемещенных задач
+        deleted_ids = {operation['id'] for operation in deletes}
+        new_statuses = {}
+        for operation in moves:
+            if operation['id'] not in deleted_ids:
+                new_statuses[operation['id']] = operation['status']
+        changed_statuses = {task_id: status for task_id, status in new_statuses.items()
+                            if current_statuses.get(task_id) != status}
+        propagated = propagate_statuses(conn, project_id, changed_statuses) if changed_statuses else {}
+        
+        bump_project_revision(conn, project_id)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return jsonify({'error': str(e)}), 500
+    
+    conn.close()
+    forget_tasks(deleted_ids)
+    
+    publish_project_event(project_id, 'tasks_batch', {
+        'created': created_ids,
+        'updated': [operation['id'] for operation in updates],
+        'moved': new_statuses,
+        'deleted': sorted(deleted_ids),
+        'propagated': propagated
+    })
+    
+    return jsonify({
+        'success': True,
+        'created': created_ids,
+        'updated': len(updates),
+        'moved': len(moves),
+        'deleted': len(deletes),
+        'propagated': propagated
+    })
+
 # API: Установить зависимости задач
 @app.route('/api/task/<int:task_id>/dependencies', methods=['POST'])
+@login_required
+@task_access
 def api_set_dependencies(task_id):
     try:
         data = request.get_json()
         dependencies = data.get('dependencies', [])
         
-        # Преобразуем список ID в строку через запятую
-        dependencies_str = ','.join(map(str, dependencies))
-        
+        # Список предшественников записывается в task_dependencies как связи FS,
+        # поле tasks.dependencies обновляется как зеркало
         conn = get_db_connection()
-        conn.execute('UPDATE tasks SET dependencies = ? WHERE id = ?', 
-                    (dependencies_str, task_id))
+        set_task_predecessors(conn, task_id, dependencies)
+        bump_task_project_revision(conn, task_id)
         conn.commit()
         conn.close()
         
@@ -1029,60 +1550,53 @@ def api_set_dependencies(task_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Функция для расчета дат проекта
-def calculate_project_dates(project_id):
-    conn = get_db_connection()
-    tasks = conn.execute('SELECT * FROM tasks WHERE project_id = ?', (project_id,)).fetchall()
-    conn.close()
-    
-    if not tasks:
-        return None, None
-    
-    start_dates = []
-    end_dates = []
-    
-    for task in tasks:
-        if task['start_date']:
-            start_dates.append(datetime.strptime(task['start_date'], '%Y-%m-%d'))
-        if task['end_date']:
-            end_dates.append(datetime.strptime(task['end_date'], '%Y-%m-%d'))
-    
-    project_start = min(start_dates) if start_dates else None
-    project_end = max(end_dates) if end_dates else None
-    
-    return project_start, project_end
-
 # API: Получить статистику проекта
 @app.route('/api/project/<int:project_id>/stats')
+@login_required
+@project_access
 def api_get_project_stats(project_id):
+    # Счетчики и крайние даты поддерживаются триггерами в project_summary
     conn = get_db_connection()
-    
-    # Общее количество задач
-    total_tasks = conn.execute('SELECT COUNT(*) FROM tasks WHERE project_id = ?', 
-                              (project_id,)).fetchone()[0]
-    
-    # Задачи по статусам
-    status_stats = conn.execute('''
-        SELECT status, COUNT(*) as count 
-        FROM tasks 
-        WHERE project_id = ? 
-        GROUP BY status
-    ''', (project_id,)).fetchall()
-    
-    # Даты проекта
-    project_start, project_end = calculate_project_dates(project_id)
-    
+    summary = conn.execute('SELECT * FROM project_summary WHERE project_id = ?', (project_id,)).fetchone()
     conn.close()
     
+    if not summary:
+        return jsonify({'error': 'Project not found'}), 404
+    
     stats = {
-        'total_tasks': total_tasks,
-        'status_stats': {row['status']: row['count'] for row in status_stats},
-        'project_start': project_start.strftime('%Y-%m-%d') if project_start else None,
-        'project_end': project_end.strftime('%Y-%m-%d') if project_end else None
+        'total_tasks': summary['task_count'],
+        'status_stats': {status: summary[status] for status in TASK_STATUSES if summary[status]},
+        'project_start': summary['min_start'],
+        'project_end': summary['max_end']
     }
     
     return jsonify(stats)
 
+# Портфель: сводка по всем проектам пользователя
+@app.route('/portfolio')
+@login_required
+def portfolio():
+    conn = get_db_connection()
+    projects = analytics.portfolio(conn, current_user.id)
+    conn.close()
+    
+    return render_template('portfolio.html', projects=projects, active_tab='portfolio', current_user=current_user)
+
+# API: Портфель проектов
+@app.route('/api/portfolio')
+@login_required
+def api_get_portfolio():
+    try:
+        conn = get_db_connection()
+        projects = analytics.portfolio(conn, current_user.id)
+        conn.close()
+        
+        return jsonify({'success': True, 'projects': projects})
+        
+    except Exception as e:
+        logger.exception("Ошибка при загрузке портфеля")
+        return jsonify({'error': str(e)}), 500
+
 # Обработчик ошибок
 @app.errorhandler(404)
 def not_found(error):
@@ -1094,6 +1608,9 @@ def internal_error(error):
 
 # API: Получить вехи проекта
 @app.route('/api/project/<int:project_id>/milestones', methods=['GET'])
+@login_required
+@project_access
+@project_etag
 def api_get_milestones(project_id):
     conn = get_db_connection()
     milestones = conn.execute('SELECT * FROM milestones WHERE project_id = ?', (project_id,)).fetchall()
@@ -1113,6 +1630,8 @@ def api_get_milestones(project_id):
 
 # API: Создать веху
 @app.route('/api/project/<int:project_id>/milestone', methods=['POST'])
+@login_required
+@project_access
 def api_create_milestone(project_id):
     try:
         data = request.get_json()
@@ -1133,6 +1652,7 @@ def api_create_milestone(project_id):
         ''', (project_id, title, description, date, color))
         
         milestone_id = cursor.lastrowid
+        bump_project_revision(conn, project_id)
         conn.commit()
         conn.close()
         
@@ -1143,6 +1663,8 @@ def api_create_milestone(project_id):
 
 # API: Обновить веху
 @app.route('/api/milestone/<int:milestone_id>', methods=['PUT'])
+@login_required
+@milestone_access
 def api_update_milestone(milestone_id):
     try:
         data = request.get_json()
@@ -1159,6 +1681,7 @@ def api_update_milestone(milestone_id):
             UPDATE milestones SET title = ?, description = ?, date = ?, color = ?
             WHERE id = ?
         ''', (title, description, date, color, milestone_id))
+        bump_milestone_project_revision(conn, milestone_id)
         conn.commit()
         conn.close()
         
@@ -1169,12 +1692,18 @@ def api_update_milestone(milestone_id):
 
 # API: Удалить веху
 @app.route('/api/milestone/<int:milestone_id>', methods=['DELETE'])
+@login_required
+@milestone_access
 def api_delete_milestone(milestone_id):
     try:
         conn = get_db_connection()
+        milestone = conn.execute('SELECT project_id FROM milestones WHERE id = ?', (milestone_id,)).fetchone()
         conn.execute('DELETE FROM milestones WHERE id = ?', (milestone_id,))
+        if milestone:
+            bump_project_revision(conn, milestone['project_id'])
         conn.commit()
         conn.close()
+        forget_milestone(milestone_id)
         
         return jsonify({'success': True, 'message': 'Веха удалена'})
         
@@ -1183,6 +1712,9 @@ def api_delete_milestone(milestone_id):
 
 # API: Получить зависимости проекта
 @app.route('/api/project/<int:project_id>/dependencies', methods=['GET'])
+@login_required
+@project_access
+@project_etag
 def api_get_dependencies(project_id):
     conn = get_db_connection()
     dependencies = conn.execute('''
@@ -1212,6 +1744,7 @@ def api_get_dependencies(project_id):
 # Заменить существующий endpoint или добавить новый
 @app.route('/api/task/<int:task_id>/dependency', methods=['POST'])
 @login_required
+@task_access
 def api_add_dependency_with_recalculation(task_id):
     try:
         data = request.get_json()
@@ -1222,6 +1755,10 @@ def api_add_dependency_with_recalculation(task_id):
         if not predecessor_id:
             return jsonify({'error': 'Predecessor ID is required'}), 400
         
+        # Связи только внутри проекта: чужая задача не должна стать предшественником
+        if task_project_id(predecessor_id) != g.access_project_id:
+            return jsonify({'error': 'Predecessor must belong to the same project'}), 400
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -1232,11 +1769,21 @@ def api_add_dependency_with_recalculation(task_id):
         ''', (task_id, predecessor_id, dependency_type, lag))
         
         dependency_id = cursor.lastrowid
+        sync_legacy_dependencies(conn, [task_id])
+        bump_task_project_revision(conn, task_id)
         conn.commit()
         conn.close()
         
-        # Автоматически пересчитываем даты
-        recalculate_task_dates(task_id, dependency_type, lag)
+        # Автоматически пересчитываем даты задачи и всех ее последователей
+        changes = cascade_recalculate_dates(task_id, include_changed=True)
+        
+        publish_task_event(task_id, 'dependency_added', {
+            'dependency_id': dependency_id,
+            'predecessor_id': predecessor_id,
+            'dependency_type': dependency_type,
+            'lag': lag,
+            'changes': changes
+        })
         
         return jsonify({'success': True, 'dependency_id': dependency_id})
         
@@ -1245,10 +1792,16 @@ def api_add_dependency_with_recalculation(task_id):
 
 # API: Удалить зависимость
 @app.route('/api/dependency/<int:dependency_id>', methods=['DELETE'])
+@login_required
+@dependency_access
 def api_delete_dependency(dependency_id):
     try:
         conn = get_db_connection()
+        dependency = conn.execute('SELECT task_id FROM task_dependencies WHERE id = ?', (dependency_id,)).fetchone()
         conn.execute('DELETE FROM task_dependencies WHERE id = ?', (dependency_id,))
+        if dependency:
+            sync_legacy_dependencies(conn, [dependency['task_id']])
+            bump_task_project_revision(conn, dependency['task_id'])
         conn.commit()
         conn.close()
         
@@ -1257,124 +1810,14 @@ def api_delete_dependency(dependency_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# app.py - ДОБАВЛЯЕМ ПОСЛЕ СУЩЕСТВУЮЩИХ ИМПОРТОВ
-
-# ЗАМЕНИТЕ существующую функцию update_dependent_tasks_status в app.py на эту:
+# ДОБАВЬТЕ этот endpoint в app.py для отладки:
 
-def update_dependent_tasks_status(task_id, new_status):
+@app.route('/api/debug/dependencies/<int:task_id>', methods=['GET'])
+@login_required
+@task_access
+def api_debug_dependencies(task_id):
     """
-    Автоматически обновляет статусы зависимых задач при изменении статуса текущей задачи
-    Обрабатывает все типы зависимостей: FS, SS, FF, SF
-    """
-    conn = get_db_connection()
-    
-    try:
-        # Получаем текущую задачу
-        task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-        if not task:
-            return
-        
-        print(f"Обновление зависимостей: задача {task_id} -> статус {new_status}")
-        
-        # Получаем ВСЕ зависимости где текущая задача является предшественником
-        dependencies = conn.execute('''
-            SELECT td.*, t.status as dependent_task_status, t.title as dependent_task_title
-            FROM task_dependencies td 
-            JOIN tasks t ON td.task_id = t.id 
-            WHERE td.predecessor_id = ?
-        ''', (task_id,)).fetchall()
-        
-        for dep in dependencies:
-            dependent_task_id = dep['task_id']
-            dependency_type = dep['dependency_type']
-            dependent_task_status = dep['dependent_task_status']
-            dependent_task_title = dep['dependent_task_title']
-            
-            print(f"Обработка зависимости: {dependency_type} -> задача {dependent_task_id} ({dependent_task_title})")
-            
-            # Обрабатываем разные типы зависимостей
-            if dependency_type == 'FS' and new_status == 'completed':
-                # F-S: Когда задача завершена, следующая задача может начаться
-                if dependent_task_status == 'planned':
-                    conn.execute('UPDATE tasks SET status = "in_progress" WHERE id = ?', 
-                               (dependent_task_id,))
-                    print(f"FS: Задача '{dependent_task_title}' ({dependent_task_id}) переведена в 'В работе'")
-            
-            elif dependency_type == 'SS':
-                # S-S: Когда задача начинается, следующая задача тоже начинается
-                if new_status == 'in_progress' and dependent_task_status == 'planned':
-                    conn.execute('UPDATE tasks SET status = "in_progress" WHERE id = ?', 
-                               (dependent_task_id,))
-                    print(f"SS: Задача '{dependent_task_title}' ({dependent_task_id}) переведена в 'В работе'")
-                
-                # S-S: Если текущая задача возвращается в planned, зависимая тоже должна вернуться
-                elif new_status == 'planned' and dependent_task_status == 'in_progress':
-                    # Проверяем, есть ли другие активные SS зависимости
-                    other_active_deps = conn.execute('''
-                        SELECT COUNT(*) as count FROM task_dependencies td
-                        JOIN tasks t ON td.predecessor_id = t.id
-                        WHERE td.task_id = ? AND td.dependency_type = 'SS' AND t.status = 'in_progress'
-                    ''', (dependent_task_id,)).fetchone()['count']
-                    
-                    if other_active_deps == 0:
-                        conn.execute('UPDATE tasks SET status = "planned" WHERE id = ?', 
-                                   (dependent_task_id,))
-                        print(f"SS: Задача '{dependent_task_title}' ({dependent_task_id}) возвращена в 'Запланировано'")
-            
-            elif dependency_type == 'FF':
-                # F-F: Когда задача завершена, следующая задача тоже завершается
-                if new_status == 'completed' and dependent_task_status == 'in_progress':
-                    conn.execute('UPDATE tasks SET status = "completed" WHERE id = ?', 
-                               (dependent_task_id,))
-                    print(f"FF: Задача '{dependent_task_title}' ({dependent_task_id}) переведена в 'Завершено'")
-                
-                # F-F: Если текущая задача возвращается из completed, зависимая тоже должна вернуться
-                elif new_status == 'in_progress' and dependent_task_status == 'completed':
-                    # Проверяем, есть ли другие завершенные FF зависимости
-                    other_completed_deps = conn.execute('''
-                        SELECT COUNT(*) as count FROM task_dependencies td
-                        JOIN tasks t ON td.predecessor_id = t.id
-                        WHERE td.task_id = ? AND td.dependency_type = 'FF' AND t.status = 'completed'
-                    ''', (dependent_task_id,)).fetchone()['count']
-                    
-                    if other_completed_deps == 0:
-                        conn.execute('UPDATE tasks SET status = "in_progress" WHERE id = ?', 
-                                   (dependent_task_id,))
-                        print(f"FF: Задача '{dependent_task_title}' ({dependent_task_id}) возвращена в 'В работе'")
-            
-            elif dependency_type == 'SF' and new_status == 'in_progress':
-                # S-F: Когда задача начинается, следующая задача завершается
-                if dependent_task_status == 'in_progress':
-                    conn.execute('UPDATE tasks SET status = "completed" WHERE id = ?', 
-                               (dependent_task_id,))
-                    print(f"SF: Задача '{dependent_task_title}' ({dependent_task_id}) переведена в 'Завершено'")
-        
-        # Также обрабатываем СТАРЫЕ зависимости (из поля dependencies) как FS связи
-        all_tasks = conn.execute('SELECT * FROM tasks WHERE project_id = ?', (task['project_id'],)).fetchall()
-        
-        for dependent_task in all_tasks:
-            if dependent_task['dependencies']:
-                dependencies_old = dependent_task['dependencies'].split(',')
-                if str(task_id) in dependencies_old and new_status == 'completed':
-                    # Для старых зависимостей считаем их FS связями
-                    if dependent_task['status'] == 'planned':
-                        conn.execute('UPDATE tasks SET status = "in_progress" WHERE id = ?', 
-                                   (dependent_task['id'],))
-                        print(f"Старая FS: Задача {dependent_task['id']} переведена в 'В работе'")
-        
-        conn.commit()
-        
-    except Exception as e:
-        print(f"Ошибка при обновлении зависимых задач: {e}")
-    finally:
-        conn.close()
-
-# ДОБАВЬТЕ этот endpoint в app.py для отладки:
-
-@app.route('/api/debug/dependencies/<int:task_id>', methods=['GET'])
-def api_debug_dependencies(task_id):
-    """
-    Отладочный endpoint для проверки зависимостей задачи
+    Отладочный endpoint для проверки зависимостей задачи
     """
     conn = get_db_connection()
     
@@ -1424,8 +1867,7 @@ def debug_routes():
 def internal_error_handler(error):
     import traceback
     error_traceback = traceback.format_exc()
-    print("Internal Server Error:")
-    print(error_traceback)
+    logger.error("Internal Server Error:\n%s", error_traceback)
     return jsonify({
         'error': 'Internal server error',
         'traceback': error_traceback
@@ -1461,6 +1903,7 @@ def calculate_task_progress(task):
 # api_get_gantt_data
 @app.route('/api/project/<int:project_id>/gantt/data', methods=['GET'])
 @login_required
+@project_etag
 def api_get_gantt_data(project_id):
     # Проверяем доступ к проекту
     project = check_project_access(project_id, current_user.id)
@@ -1512,6 +1955,312 @@ def api_get_gantt_data(project_id):
     
     return jsonify(gantt_data)
 
+# Результаты расчета критического пути: project_id -> (ревизия, результат)
+critical_path_cache = LRUCache(max_size=64)
+
+# API: Критический путь проекта (ранние/поздние даты и резерв каждой задачи)
+@app.route('/api/project/<int:project_id>/critical-path', methods=['GET'])
+@login_required
+@project_etag
+def api_get_critical_path(project_id):
+    project = check_project_access(project_id, current_user.id)
+    
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+    
+    try:
+        conn = get_db_connection()
+        revision = get_project_revision(conn, project_id)
+        
+        # Пока проект не менялся, отдаем ранее посчитанный результат
+        cached = critical_path_cache.get(project_id)
+        if cached and cached[0] == revision:
+            result = cached[1]
+        else:
+            graph = load_project_graph(conn, project_id, include_legacy=True)
+            result = critical_path(graph)
+            critical_path_cache.set(project_id, (revision, result))
+        
+        conn.close()
+        
+        return jsonify(dict(result, success=True, revision=revision))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Выравнивание ресурсов: сколько задач исполнитель может вести в один день
+LEVELING_DEFAULT_CAPACITY = int(os.environ.get('LEVELING_DEFAULT_CAPACITY', 1))
+
+
+def parse_leveling_capacity(value):
+    try:
+        capacity = int(value if value is not None else LEVELING_DEFAULT_CAPACITY)
+    except (TypeError, ValueError):
+        raise ValueError('capacity must be an integer')
+    if capacity < 1:
+        raise ValueError('capacity must be positive')
+    return capacity
+
+# API: Выравнивание ресурсов. GET - предпросмотр, POST - применить одной транзакцией
+@app.route('/api/project/<int:project_id>/leveling', methods=['GET', 'POST'])
+@login_required
+@project_access
+def api_level_resources(project_id):
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    try:
+        capacity = parse_leveling_capacity(data.get('capacity', request.args.get('capacity')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    try:
+        if request.method == 'GET':
+            result = level_project(conn, project_id, capacity)
+            revision = get_project_revision(conn, project_id)
+            conn.close()
+            return jsonify(dict(result, success=True, applied=False, revision=revision))
+        
+        # Запись: граф читается и даты пишутся в одной транзакции
+        conn.execute('BEGIN IMMEDIATE')
+        revision = get_project_revision(conn, project_id)
+        expected = data.get('revision')
+        if expected is not None and expected != revision:
+            # С момента предпросмотра проект изменился - клиент должен пересчитать
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': 'Project changed since preview', 'revision': revision}), 409
+        
+        result = level_project(conn, project_id, capacity, apply=True)
+        if result['changes']:
+            bump_project_revision(conn, project_id)
+        conn.commit()
+        revision = get_project_revision(conn, project_id)
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        logger.exception("Ошибка при выравнивании ресурсов проекта %s", project_id)
+        return jsonify({'error': str(e)}), 500
+    
+    conn.close()
+    if result['changes']:
+        publish_project_event(project_id, 'task_dates', {'changes': result['changes']})
+    
+    return jsonify(dict(result, success=True, applied=True, revision=revision))
+
+# API: Все данные страницы проекта одним запросом (задачи, исполнители, связи, вехи, участники)
+@app.route('/api/project/<int:project_id>/bundle', methods=['GET'])
+@login_required
+@project_etag
+def api_get_project_bundle(project_id):
+    project = check_project_access(project_id, current_user.id)
+    
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+    
+    conn = get_db_connection()
+    try:
+        # Все запросы в одной транзакции чтения - данные согласованы между собой
+        conn.execute('BEGIN')
+        
+        tasks = conn.execute('''
+            SELECT id, title, description, status, position, duration, start_date, end_date,
+                   dependencies, priority
+            FROM tasks WHERE project_id = ? ORDER BY position ASC
+        ''', (project_id,)).fetchall()
+        
+        assignees = conn.execute('''
+            SELECT ta.task_id, u.id, u.username
+            FROM task_assignees ta
+            JOIN tasks t ON ta.task_id = t.id
+            JOIN users u ON ta.user_id = u.id
+            WHERE t.project_id = ?
+            ORDER BY ta.task_id, u.username
+        ''', (project_id,)).fetchall()
+        
+        dependencies = conn.execute('''
+            SELECT td.id, td.task_id, td.predecessor_id, td.dependency_type, td.lag
+            FROM task_dependencies td
+            JOIN tasks t ON td.task_id = t.id
+            WHERE t.project_id = ?
+        ''', (project_id,)).fetchall()
+        
+        milestones = conn.execute('''
+            SELECT id, title, description, date, color
+            FROM milestones WHERE project_id = ? ORDER BY date
+        ''', (project_id,)).fetchall()
+        
+        members = conn.execute('''
+            SELECT u.id, u.username, u.email, 'owner' as role
+            FROM projects p JOIN users u ON p.user_id = u.id
+            WHERE p.id = ?
+            UNION
+            SELECT u.id, u.username, u.email, pm.role
+            FROM project_members pm JOIN users u ON pm.user_id = u.id
+            WHERE pm.project_id = ? AND pm.user_id != ?
+        ''', (project_id, project_id, project['user_id'])).fetchall()
+        
+        revision = get_project_revision(conn, project_id)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return jsonify({'error': str(e)}), 500
+    
+    conn.close()
+    
+    assignees_by_task = {}
+    for row in assignees:
+        assignees_by_task.setdefault(row['task_id'], []).append({
+            'id': row['id'],
+            'username': row['username']
+        })
+    
+    tasks_list = []
+    for task in tasks:
+        task_dict = dict(task)
+        task_dict['assignees'] = assignees_by_task.get(task['id'], [])
+        tasks_list.append(task_dict)
+    
+    bundle = {
+        'project': {
+            'id': project['id'],
+            'name': project['name'],
+            'description': project['description'],
+            'user_id': project['user_id']
+        },
+        'revision': revision,
+        'tasks': tasks_list,
+        'dependencies': [dict(dep) for dep in dependencies],
+        'milestones': [dict(milestone) for milestone in milestones],
+        'members': [dict(member) for member in members]
+    }
+    
+    # ETag по ревизии проекта выставляет project_etag
+    return jsonify(bundle)
+
+# API: Изменения проекта после ревизии since (дельта-синхронизация клиентов)
+@app.route('/api/project/<int:project_id>/changes', methods=['GET'])
+@login_required
+@project_etag
+def api_get_project_changes(project_id):
+    project = check_project_access(project_id, current_user.id)
+    
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'Parameter since is required'}), 400
+    
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        
+        state = conn.execute(
+            'SELECT revision, changelog_start FROM projects WHERE id = ?', (project_id,)
+        ).fetchone()
+        
+        # Журнал не покрывает запрошенный интервал - клиент должен загрузить проект целиком
+        if since < state['changelog_start'] or since > state['revision']:
+            conn.commit()
+            conn.close()
+            return jsonify({'success': True, 'revision': state['revision'], 'reset': True})
+        
+        changed = conn.execute('''
+            SELECT DISTINCT entity, entity_id FROM project_changes
+            WHERE project_id = ? AND revision > ?
+        ''', (project_id, since)).fetchall()
+        
+        # Текущее состояние измененных сущностей; чего уже нет - удалено
+        tasks = conn.execute('''
+            SELECT t.*, 
+                   GROUP_CONCAT(DISTINCT u.id) as assignee_ids,
+                   GROUP_CONCAT(DISTINCT u.username) as assignee_names
+            FROM tasks t
+            LEFT JOIN task_assignees ta ON t.id = ta.task_id
+            LEFT JOIN users u ON ta.user_id = u.id
+            WHERE t.project_id = ? AND t.id IN (
+                SELECT entity_id FROM project_changes
+                WHERE project_id = ? AND revision > ? AND entity = 'task'
+            )
+            GROUP BY t.id
+            ORDER BY t.position ASC
+        ''', (project_id, project_id, since)).fetchall()
+        
+        dependencies = conn.execute('''
+            SELECT td.id, td.task_id, td.predecessor_id, td.dependency_type, td.lag
+            FROM task_dependencies td
+            JOIN tasks t ON td.task_id = t.id
+            WHERE t.project_id = ? AND td.id IN (
+                SELECT entity_id FROM project_changes
+                WHERE project_id = ? AND revision > ? AND entity = 'dependency'
+            )
+        ''', (project_id, project_id, since)).fetchall()
+        
+        milestones = conn.execute('''
+            SELECT id, title, description, date, color FROM milestones
+            WHERE project_id = ? AND id IN (
+                SELECT entity_id FROM project_changes
+                WHERE project_id = ? AND revision > ? AND entity = 'milestone'
+            )
+            ORDER BY date
+        ''', (project_id, project_id, since)).fetchall()
+        
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return jsonify({'error': str(e)}), 500
+    
+    conn.close()
+    
+    # Сущность журнала -> (ключ ответа, ID, которые еще существуют)
+    present = {
+        'task': ('tasks', {task['id'] for task in tasks}),
+        'dependency': ('dependencies', {dep['id'] for dep in dependencies}),
+        'milestone': ('milestones', {milestone['id'] for milestone in milestones})
+    }
+    deleted = {'tasks': [], 'dependencies': [], 'milestones': []}
+    for row in changed:
+        key, existing = present[row['entity']]
+        if row['entity_id'] not in existing:
+            deleted[key].append(row['entity_id'])
+    
+    return jsonify({
+        'success': True,
+        'revision': state['revision'],
+        'reset': False,
+        'tasks': [serialize_task(task) for task in tasks],
+        'dependencies': [dict(dep) for dep in dependencies],
+        'milestones': [dict(milestone) for milestone in milestones],
+        'deleted': deleted
+    })
+
+# API: Поток событий проекта (Server-Sent Events)
+@app.route('/api/project/<int:project_id>/events', methods=['GET'])
+@login_required
+def api_project_events(project_id):
+    project = check_project_access(project_id, current_user.id)
+    
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+    
+    subscription = event_bus.subscribe(project_id)
+    if subscription is None:
+        # Лимит одновременных потоков: клиент вернется к обычным запросам
+        response = jsonify({'error': 'Too many event subscribers'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    # Поток живет долго - соединение с базой возвращаем в пул сразу
+    close_db()
+    
+    response = app.response_class(event_stream(event_bus, subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Добавить в app.py после существующих API endpoints
 @app.route('/api/user/<int:user_id>', methods=['GET'])
 @login_required
@@ -1554,10 +2303,52 @@ def api_get_user(user_id):
 def api_get_my_assigned_tasks():
     """Получить все задачи, где текущий пользователь является исполнителем"""
     try:
-        print(f"DEBUG: Запрос назначенных задач для пользователя {current_user.id}")
-        
         conn = get_db_connection()
         
+        try:
+            listing = parse_listing(request.args, default_sort='start_date')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if listing:
+            # Задачи пользователя находятся по idx_task_assignees_user
+            page = fetch_page(
+                conn, listing,
+                '''FROM tasks t
+                JOIN task_assignees ta ON t.id = ta.task_id
+                JOIN projects p ON t.project_id = p.id
+                LEFT JOIN project_members pm ON p.id = pm.project_id AND pm.user_id = ?''',
+                'ta.user_id = ? AND (p.user_id = ? OR pm.user_id IS NOT NULL)',
+                [current_user.id, current_user.id, current_user.id],
+                't.id, t.title, t.description, t.status, t.duration, t.start_date, t.end_date, '
+                'p.name as project_name, p.id as project_id',
+                current_user.id
+            )
+            conn.close()
+            
+            tasks_list = []
+            for task in page['rows']:
+                tasks_list.append({
+                    'id': task['id'],
+                    'title': task['title'],
+                    'description': task['description'],
+                    'status': task['status'],
+                    'duration': task['duration'],
+                    'start_date': task['start_date'],
+                    'end_date': task['end_date'],
+                    'project_id': task['project_id'],
+                    'project_name': task['project_name'],
+                    'type': 'project_task'
+                })
+            
+            return jsonify({
+                'success': True,
+                'tasks': tasks_list,
+                'next_cursor': page['next_cursor'],
+                'total': page['total'],
+                'total_is_estimate': page['total_is_estimate']
+            })
+        
         # Получаем задачи, где пользователь назначен исполнителем
         tasks = conn.execute('''
             SELECT DISTINCT 
@@ -1579,11 +2370,8 @@ def api_get_my_assigned_tasks():
                 t.start_date ASC
         ''', (current_user.id, current_user.id, current_user.id)).fetchall()
         
-        print(f"DEBUG: Найдено задач для пользователя {current_user.id}: {len(tasks)}")
-        
-        # Выведем информацию о найденных задачах для отладки
-        for task in tasks:
-            print(f"DEBUG: Задача {task['id']} - {task['title']} (проект: {task['project_name']})")
+        logger.debug("Назначенные задачи пользователя %s: %d", current_user.id, len(tasks),
+                     extra={'sampled': True})
         
         conn.close()
         
@@ -1605,9 +2393,54 @@ def api_get_my_assigned_tasks():
         return jsonify(tasks_list)
         
     except Exception as e:
-        print(f"ERROR: Ошибка при получении назначенных задач: {str(e)}")
+        logger.exception("Ошибка при получении назначенных задач")
         return jsonify({'error': str(e)}), 500
     
+# Метрики в текстовом формате Prometheus
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Метрики процесса: с METRICS_TOKEN - по заголовку Bearer, без него - только с localhost"""
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    pool_stats = db_pool.stats()
+    bus_stats = event_bus.stats()
+    log_stats = logging_stats()
+    user_stats = user_cache.stats()
+    hash_stats = hashing.stats()
+    gauges = [
+        ('gepard_db_pool_size', 'Maximum pooled SQLite connections', pool_stats['max_size']),
+        ('gepard_db_pool_idle', 'Idle pooled SQLite connections', pool_stats['idle']),
+        ('gepard_sse_subscribers', 'Open Server-Sent Events streams', bus_stats['subscribers']),
+        ('gepard_user_cache_hit_rate', 'User cache hit rate', user_stats['hit_rate']),
+        ('gepard_password_hash_in_flight', 'Password hashing jobs queued or running', hash_stats['in_flight']),
+    ]
+    # Растущие с запуска процесса значения - счетчики (rate() в Prometheus)
+    counters = [
+        ('gepard_db_pool_hits_total', 'Connections taken from the pool', pool_stats['hits']),
+        ('gepard_db_pool_misses_total', 'Connections opened because the pool was empty', pool_stats['misses']),
+        ('gepard_sse_published_total', 'Events published to SSE subscribers', bus_stats['published']),
+        ('gepard_sse_dropped_total', 'SSE clients asked to resync after queue overflow', bus_stats['dropped']),
+        ('gepard_log_records_dropped_total', 'Log records dropped because the queue was full', log_stats['dropped']),
+        ('gepard_log_records_sampled_out_total', 'Sampled log records skipped', log_stats['sampled_out']),
+        ('gepard_user_cache_hits_total', 'Authenticated requests served from the user cache', user_stats['hits']),
+        ('gepard_user_cache_misses_total', 'Authenticated requests that loaded the user from SQLite',
+         user_stats['misses']),
+        ('gepard_password_hash_rejected_total', 'Password hashing jobs rejected with 503', hash_stats['rejected']),
+        ('gepard_password_hash_timeouts_total', 'Password hashing jobs that exceeded HASH_TIMEOUT',
+         hash_stats['timeouts']),
+        ('gepard_password_rehashed_total', 'Password hashes upgraded on login', hash_stats['rehashed']),
+    ]
+    response = make_response(metrics.render(gauges, counters))
+    response.mimetype = 'text/plain'
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
 # Отладочный endpoint для проверки базы данных
 @app.route('/api/debug/database')
 @login_required
@@ -1683,91 +2516,23 @@ def api_debug_task_assignees():
         'current_user_id': current_user.id
     })
 
-# Добавить в app.py после существующих функций
-def recalculate_task_dates(task_id, dependency_type='FS', lag=0, visited=None):
-    """
-    Автоматически пересчитывает даты задачи на основе зависимостей
-    visited - множество для отслеживания посещенных задач (предотвращение циклов)
-    """
-    if visited is None:
-        visited = set()
-    
-    if task_id in visited:
-        return  # Предотвращаем бесконечную рекурсию при циклических зависимостях
-    
-    visited.add(task_id)
-    
-    conn = get_db_connection()
-    
-    try:
-        task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-        if not task:
-            return
-        
-        # Получаем все зависимости задачи
-        dependencies = conn.execute('''
-            SELECT td.*, t.end_date as predecessor_end, t.start_date as predecessor_start
-            FROM task_dependencies td
-            JOIN tasks t ON td.predecessor_id = t.id
-            WHERE td.task_id = ?
-        ''', (task_id,)).fetchall()
-        
-        if not dependencies:
-            return
-        
-        earliest_start_date = None
-        
-        # Для FS зависимостей находим самую позднюю дату окончания предшественников
-        for dep in dependencies:
-            if dep['dependency_type'] == 'FS':  # Finish-to-Start
-                if dep['predecessor_end']:
-                    lag_days = dep['lag'] or 0
-                    dep_start_date = datetime.strptime(dep['predecessor_end'], '%Y-%m-%d') + timedelta(days=1 + lag_days)
-                    
-                    if earliest_start_date is None or dep_start_date > earliest_start_date:
-                        earliest_start_date = dep_start_date
-        
-        if earliest_start_date:
-            new_end_date = earliest_start_date + timedelta(days=task['duration'] - 1)
-            
-            conn.execute('''
-                UPDATE tasks SET start_date = ?, end_date = ? 
-                WHERE id = ?
-            ''', (earliest_start_date.strftime('%Y-%m-%d'), 
-                  new_end_date.strftime('%Y-%m-%d'), 
-                  task_id))
-            
-            conn.commit()
-        
-    except Exception as e:
-        print(f"Ошибка при пересчете дат задачи {task_id}: {e}")
-    finally:
-        conn.close()
-
-
-def cascade_recalculate_dates(changed_task_id):
+def cascade_recalculate_dates(changed_task_id, include_changed=False):
     """
-    Пересчитывает даты всех задач, которые зависят от измененной задачи
+    Пересчитывает даты всех задач, которые зависят от измененной задачи.
+    Граф проекта загружается один раз, пересчет идет одним проходом (см. scheduler.py)
     """
     conn = get_db_connection()
     
     try:
-        # Находим все задачи, которые зависят от измененной задачи
-        dependent_tasks = conn.execute('''
-            SELECT td.task_id, td.dependency_type, td.lag
-            FROM task_dependencies td
-            WHERE td.predecessor_id = ?
-        ''', (changed_task_id,)).fetchall()
-        
-        # Пересчитываем даты для каждой зависимой задачи
-        for dep_task in dependent_tasks:
-            recalculate_task_dates(dep_task['task_id'], dep_task['dependency_type'], dep_task['lag'])
-            
-            # Рекурсивно пересчитываем задачи, зависящие от этой задачи (каскад)
-            cascade_recalculate_dates(dep_task['task_id'])
-            
+        changes = cascade_reschedule(conn, changed_task_id, include_changed=include_changed)
+        if changes:
+            bump_task_project_revision(conn, changed_task_id)
+        conn.commit()
+        return changes
     except Exception as e:
-        print(f"Ошибка при каскадном пересчете дат: {e}")
+        conn.rollback()
+        logger.exception("Ошибка при каскадном пересчете дат задачи %s", changed_task_id)
+        return {}
     finally:
         conn.close()
 
@@ -1778,15 +2543,89 @@ def calendar():
     return render_template('calendar.html', active_tab='calendar', current_user=current_user)
 
 # API: Получить все события календаря (включая задачи, вехи и кастомные события)
+CALENDAR_MAX_WINDOW_DAYS = int(os.environ.get('CALENDAR_MAX_WINDOW_DAYS', 400))
+
+
+def parse_calendar_window(args):
+    """Окно [start, end) из параметров start/end (как их передает FullCalendar).
+
+    Без параметров - от месяца назад до двух месяцев вперед. Ошибки - ValueError.
+    """
+    try:
+        if args.get('start'):
+            window_start = date.fromisoformat(args['start'][:10])
+        else:
+            window_start = date.today() - timedelta(days=31)
+        if args.get('end'):
+            window_end = date.fromisoformat(args['end'][:10])
+        else:
+            window_end = window_start + timedelta(days=92)
+    except ValueError:
+        raise ValueError('Invalid start or end date, expected YYYY-MM-DD')
+    if window_end <= window_start:
+        raise ValueError('end must be after start')
+    if (window_end - window_start).days > CALENDAR_MAX_WINDOW_DAYS:
+        raise ValueError(f'Window is limited to {CALENDAR_MAX_WINDOW_DAYS} days')
+    return window_start, window_end
+
+
+def custom_event_data(event, start_date=None):
+    """Кастомное событие в формате FullCalendar; start_date - дата конкретного повтора"""
+    shift = timedelta(0)
+    if start_date is not None:
+        shift = start_date - date.fromisoformat(event['start_date'][:10])
+    event_start = (date.fromisoformat(event['start_date'][:10]) + shift).isoformat()
+    event_end = (date.fromisoformat(event['end_date'][:10]) + shift).isoformat() if event['end_date'] else None
+
+    start_datetime = event_start
+    if event['start_time'] and not event['all_day']:
+        start_datetime = f"{event_start}T{event['start_time']}"
+
+    end_datetime = None
+    if event_end:
+        end_datetime = event_end
+        if event['end_time'] and not event['all_day']:
+            end_datetime = f"{event_end}T{event['end_time']}"
+    elif event['duration_minutes'] and event['start_time'] and not event['all_day']:
+        start_dt = datetime.strptime(f"{event_start} {event['start_time']}", '%Y-%m-%d %H:%M')
+        end_dt = start_dt + timedelta(minutes=event['duration_minutes'])
+        end_datetime = end_dt.strftime('%Y-%m-%dT%H:%M')
+
+    event_data = {
+        'id': f"custom_{event['id']}",
+        'title': event['title'],
+        'description': event['description'],
+        'start': start_datetime,
+        'end': end_datetime,
+        'allDay': bool(event['all_day']),
+        'color': event['color'],
+        'extendedProps': {
+            'event_type': 'custom',
+            'custom_type': event['event_type'],
+            'source': 'custom'
+        }
+    }
+    if event['recurrence_rule']:
+        # Все повторы серии - одно событие в базе
+        event_data['groupId'] = f"custom_{event['id']}"
+        event_data['extendedProps']['recurrence_rule'] = event['recurrence_rule']
+        event_data['extendedProps']['occurrence_date'] = event_start
+    return event_data
+
+
 @app.route('/api/calendar/events', methods=['GET'])
 @login_required
 def api_get_calendar_events():
-    """Получить только те события, которые относятся к текущему пользователю"""
+    """События текущего пользователя, пересекающиеся с окном ?start=&end= (end не включается)"""
+    try:
+        window_start, window_end = parse_calendar_window(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    start_str, end_str = window_start.isoformat(), window_end.isoformat()
     try:
         conn = get_db_connection()
         
-        print(f"DEBUG: Загрузка событий для пользователя {current_user.id}")
-        
         # Задачи из проектов (только назначенные текущему пользователю)
         project_tasks = conn.execute('''
             SELECT 
@@ -1794,18 +2633,17 @@ def api_get_calendar_events():
                 t.start_date, t.end_date, t.duration,
                 p.name as project_name, p.id as project_id,
                 'project_task' as event_type
-            FROM tasks t
+            FROM task_assignees ta
+            JOIN tasks t ON t.id = ta.task_id
             JOIN projects p ON t.project_id = p.id
-            JOIN task_assignees ta ON t.id = ta.task_id
-            LEFT JOIN project_members pm ON p.id = pm.project_id AND pm.user_id = ?
             WHERE ta.user_id = ?  -- ТОЛЬКО задачи, назначенные текущему пользователю
-            AND (p.user_id = ? OR pm.user_id IS NOT NULL)
-            AND t.start_date IS NOT NULL AND t.end_date IS NOT NULL
-        ''', (current_user.id, current_user.id, current_user.id)).fetchall()
+            AND (p.user_id = ? OR EXISTS (
+                SELECT 1 FROM project_members pm WHERE pm.project_id = p.id AND pm.user_id = ?
+            ))
+            AND t.start_date < ? AND t.end_date >= ?
+        ''', (current_user.id, current_user.id, current_user.id, end_str, start_str)).fetchall()
         
-        print(f"DEBUG: Найдено проектных задач для пользователя: {len(project_tasks)}")
-        
-        # Персональные задачи (только текущего пользователя)
+        # Персональные задачи (только текущего пользователя), idx_personal_tasks_user_end
         personal_tasks = conn.execute('''
             SELECT 
                 id, title, description, status,
@@ -1815,12 +2653,10 @@ def api_get_calendar_events():
                 'personal_task' as event_type
             FROM personal_tasks 
             WHERE user_id = ?
-            AND start_date IS NOT NULL AND end_date IS NOT NULL
-        ''', (current_user.id,)).fetchall()
-        
-        print(f"DEBUG: Найдено персональных задач: {len(personal_tasks)}")
+            AND end_date >= ? AND start_date < ?
+        ''', (current_user.id, start_str, end_str)).fetchall()
         
-        # Вехи проектов (где пользователь участник)
+        # Вехи проектов (где пользователь участник), idx_milestones_project_date
         milestones = conn.execute('''
             SELECT 
                 m.id, m.title, m.description, m.date,
@@ -1828,24 +2664,36 @@ def api_get_calendar_events():
                 'milestone' as event_type
             FROM milestones m
             JOIN projects p ON m.project_id = p.id
-            LEFT JOIN project_members pm ON p.id = pm.project_id AND pm.user_id = ?
-            WHERE (p.user_id = ? OR pm.user_id IS NOT NULL)
-            AND m.date IS NOT NULL
-        ''', (current_user.id, current_user.id)).fetchall()
-        
-        print(f"DEBUG: Найдено вех: {len(milestones)}")
+            WHERE m.project_id IN (
+                SELECT id FROM projects WHERE user_id = ?
+                UNION
+                SELECT project_id FROM project_members WHERE user_id = ?
+            )
+            AND m.date >= ? AND m.date < ?
+        ''', (current_user.id, current_user.id, start_str, end_str)).fetchall()
         
-        # Кастомные события календаря (только текущего пользователя)
+        # Разовые кастомные события, idx_calendar_events_user_end
         custom_events = conn.execute('''
             SELECT 
                 id, title, description, start_date, start_time,
                 end_date, end_time, duration_minutes, all_day,
-                event_type, color, created_at
+                event_type, color, created_at, recurrence_rule
             FROM calendar_events 
-            WHERE user_id = ?
-        ''', (current_user.id,)).fetchall()
+            WHERE user_id = ? AND recurrence_rule IS NULL
+            AND COALESCE(end_date, start_date) >= ? AND start_date < ?
+        ''', (current_user.id, start_str, end_str)).fetchall()
         
-        print(f"DEBUG: Найдено кастомных событий: {len(custom_events)}")
+        # Повторяющиеся события: только серии, которые еще идут в этом окне
+        recurring_events = conn.execute('''
+            SELECT 
+                id, title, description, start_date, start_time,
+                end_date, end_time, duration_minutes, all_day,
+                event_type, color, created_at, recurrence_rule
+            FROM calendar_events 
+            WHERE user_id = ? AND recurrence_rule IS NOT NULL
+            AND start_date < ?
+            AND (recurrence_until IS NULL OR recurrence_until >= ?)
+        ''', (current_user.id, end_str, start_str)).fetchall()
         
         conn.close()
         
@@ -1872,7 +2720,6 @@ def api_get_calendar_events():
                 'color': get_task_color(task['status'], task['event_type'])
             }
             all_events.append(event_data)
-            print(f"DEBUG: Добавлена проектная задача (назначенная): {task['title']}")
         
         # Добавляем персональные задачи
         for task in personal_tasks:
@@ -1893,7 +2740,6 @@ def api_get_calendar_events():
                 'color': get_task_color(task['status'], task['event_type'])
             }
             all_events.append(event_data)
-            print(f"DEBUG: Добавлена персональная задача: {task['title']}")
         
         # Добавляем вехи
         for milestone in milestones:
@@ -1912,48 +2758,26 @@ def api_get_calendar_events():
                 'allDay': True
             }
             all_events.append(event_data)
-            print(f"DEBUG: Добавлена веха: {milestone['title']}")
         
         # Добавляем кастомные события
         for event in custom_events:
-            start_datetime = event['start_date']
-            if event['start_time'] and not event['all_day']:
-                start_datetime = f"{event['start_date']}T{event['start_time']}"
-            
-            end_datetime = None
-            if event['end_date']:
-                end_datetime = event['end_date']
-                if event['end_time'] and not event['all_day']:
-                    end_datetime = f"{event['end_date']}T{event['end_time']}"
-            elif event['duration_minutes'] and event['start_time'] and not event['all_day']:
-                start_dt = datetime.strptime(f"{event['start_date']} {event['start_time']}", '%Y-%m-%d %H:%M')
-                end_dt = start_dt + timedelta(minutes=event['duration_minutes'])
-                end_datetime = end_dt.strftime('%Y-%m-%dT%H:%M')
-            
-            event_data = {
-                'id': f"custom_{event['id']}",
-                'title': event['title'],
-                'description': event['description'],
-                'start': start_datetime,
-                'end': end_datetime,
-                'allDay': bool(event['all_day']),
-                'color': event['color'],
-                'extendedProps': {
-                    'event_type': 'custom',
-                    'custom_type': event['event_type'],
-                    'source': 'custom'
-                }
-            }
-            all_events.append(event_data)
-            print(f"DEBUG: Добавлено кастомное событие: {event['title']}")
+            all_events.append(custom_event_data(event))
+        
+        # Повторы разворачиваются только внутри окна (с запасом на длину события)
+        for event in recurring_events:
+            try:
+                rule = parse_rule(event['recurrence_rule'])
+                dtstart = date.fromisoformat(event['start_date'][:10])
+                span = (date.fromisoformat(event['end_date'][:10]) - dtstart).days if event['end_date'] else 0
+            except ValueError:
+                continue
+            for occurrence in occurrences(rule, dtstart, window_start - timedelta(days=max(span, 0)), window_end):
+                all_events.append(custom_event_data(event, occurrence))
         
-        print(f"DEBUG: Всего событий для календаря пользователя {current_user.id}: {len(all_events)}")
         return jsonify(all_events)
         
     except Exception as e:
-        print(f"ERROR: Ошибка при загрузке событий календаря: {str(e)}")
-        import traceback
-        print(f"ERROR: Traceback: {traceback.format_exc()}")
+        logger.exception("Ошибка при загрузке событий календаря")
         return jsonify({'error': str(e)}), 500
 
 # API: Создать новое событие календаря
@@ -1978,16 +2802,24 @@ def api_create_calendar_event():
         if not title or not start_date:
             return jsonify({'error': 'Title and start date are required'}), 400
         
+        # Правило повтора (RRULE), например "FREQ=WEEKLY;BYDAY=MO,WE"
+        try:
+            recurrence_rule, recurrence_until = recurrence_columns(
+                data.get('recurrence_rule'), start_date, end_date)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
             INSERT INTO calendar_events 
             (user_id, title, description, start_date, start_time, end_date, end_time, 
-             duration_minutes, all_day, event_type, color)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             duration_minutes, all_day, event_type, color, recurrence_rule, recurrence_until)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (current_user.id, title, description, start_date, start_time, end_date, 
-              end_time, duration_minutes, all_day, event_type, color))
+              end_time, duration_minutes, all_day, event_type, color,
+              recurrence_rule, recurrence_until))
         
         event_id = cursor.lastrowid
         conn.commit()
@@ -2040,6 +2872,20 @@ def api_update_calendar_event(event_id):
                 update_fields.append(f"{field} = ?")
                 update_values.append(value)
         
+        # Граница серии зависит от правила и дат - пересчитываем при любом их изменении
+        if any(key in data for key in ('recurrence_rule', 'start_date', 'end_date')):
+            rule_text = data['recurrence_rule'] if 'recurrence_rule' in data else event['recurrence_rule']
+            try:
+                recurrence_rule, recurrence_until = recurrence_columns(
+                    rule_text,
+                    data.get('start_date') or event['start_date'],
+                    data['end_date'] if 'end_date' in data else event['end_date'])
+            except ValueError as e:
+                conn.close()
+                return jsonify({'error': str(e)}), 400
+            update_fields.extend(['recurrence_rule = ?', 'recurrence_until = ?'])
+            update_values.extend([recurrence_rule, recurrence_until])
+        
         if update_fields:
             update_values.extend([event_id, current_user.id])
             conn.execute(f'''
@@ -2117,6 +2963,7 @@ def api_get_calendar_event(event_id):
             'all_day': bool(event['all_day']),
             'event_type': event['event_type'],
             'color': event['color'],
+            'recurrence_rule': event['recurrence_rule'],
             'created_at': event['created_at']
         }
         
@@ -2144,7 +2991,7 @@ def get_task_color(status, task_type):
 def api_delete_calendar_event_full(event_id):
     """Удалить событие календаря (полная реализация)"""
     try:
-        print(f"DEBUG: Deleting calendar event: {event_id}")
+        logger.debug("Удаление события календаря %s", event_id)
         
         # Разбираем ID события (формат: "type_id")
         if event_id.startswith('custom_'):
@@ -2193,7 +3040,7 @@ def api_delete_calendar_event_full(event_id):
             return jsonify({'error': 'Unknown event type'}), 400
             
     except Exception as e:
-        print(f"ERROR: Error deleting calendar event: {str(e)}")
+        logger.exception("Ошибка при удалении события календаря %s", event_id)
         return jsonify({'error': str(e)}), 500
     
     # Получаем актуальные данные пользователя
@@ -2214,6 +3061,7 @@ def api_delete_calendar_event_full(event_id):
 # В app.py - ОБНОВИТЬ api_get_team_tasks
 @app.route('/api/project/<int:project_id>/team/tasks', methods=['GET'])
 @login_required
+@project_etag
 def api_get_team_tasks(project_id):
     """Получить все задачи команды с группировкой по исполнителям"""
     try:
@@ -2237,6 +3085,35 @@ def api_get_team_tasks(project_id):
             WHERE p.id = ?
         ''', (project_id, project_id)).fetchall()
         
+        try:
+            listing = parse_listing(request.args, default_sort='start_date')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if listing:
+            page = fetch_page(conn, listing, 'FROM tasks t', 't.project_id = ?', [project_id],
+                              't.id, t.title, t.description, t.status, t.duration, t.start_date, '
+                              't.end_date, t.project_id',
+                              current_user.id)
+            result = paged_tasks_response(conn, page, ('id', 'title', 'description', 'status', 'duration',
+                                                       'start_date', 'end_date', 'project_id'))
+            result['members'] = [dict(member) for member in members]
+            
+            # Статистику по всему проекту считает SQLite, только для первой страницы
+            if listing['cursor'] is None:
+                counts = dict(conn.execute(
+                    'SELECT status, COUNT(*) FROM tasks WHERE project_id = ? GROUP BY status',
+                    (project_id,)
+                ).fetchall())
+                result['stats'] = {
+                    'total': sum(counts.values()),
+                    'planned': counts.get('planned', 0),
+                    'in_progress': counts.get('in_progress', 0),
+                    'completed': counts.get('completed', 0)
+                }
+            conn.close()
+            return jsonify(result)
+        
         # Получаем ВСЕ задачи проекта с исполнителями
         tasks = conn.execute('''
             SELECT 
@@ -2345,9 +3222,10 @@ def api_create_team_task(project_id):
         
         # Создаем задачу
         cursor.execute('''
-            INSERT INTO tasks (project_id, title, description, status, duration, start_date, end_date)
-            VALUES (?, ?, ?, 'planned', ?, ?, ?)
-        ''', (project_id, title, description, duration, start_date, end_date))
+            INSERT INTO tasks (project_id, title, description, status, duration, start_date, end_date, position)
+            VALUES (?, ?, ?, 'planned', ?, ?, ?, ?)
+        ''', (project_id, title, description, duration, start_date, end_date,
+              column_end_position(conn, 'tasks', project_id, 'planned')))
         
         task_id = cursor.lastrowid
         
@@ -2357,9 +3235,12 @@ def api_create_team_task(project_id):
             VALUES (?, ?)
         ''', (task_id, assignee_id))
         
+        bump_project_revision(conn, project_id)
         conn.commit()
         conn.close()
         
+        publish_project_event(project_id, 'task_created', {'task_id': task_id})
+        
         return jsonify({'success': True, 'task_id': task_id})
         
     except Exception as e:
@@ -2368,6 +3249,7 @@ def api_create_team_task(project_id):
 # API: Получить задачи конкретного участника
 @app.route('/api/project/<int:project_id>/member/<int:user_id>/tasks', methods=['GET'])
 @login_required
+@project_access
 def api_get_member_tasks(project_id, user_id):
     """Получить задачи конкретного участника проекта"""
     try:
@@ -2444,6 +3326,7 @@ def team_tasks(project_id):
 # В app.py - ДОБАВИТЬ новый endpoint для административного просмотра
 @app.route('/api/project/<int:project_id>/all-tasks', methods=['GET'])
 @login_required
+@project_etag
 def api_get_all_project_tasks(project_id):
     """Получить ВСЕ задачи проекта (для страницы 'Задачи команды')"""
     try:
@@ -2454,6 +3337,20 @@ def api_get_all_project_tasks(project_id):
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
+        try:
+            listing = parse_listing(request.args, default_sort='start_date')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if listing:
+            page = fetch_page(conn, listing, 'FROM tasks t', 't.project_id = ?', [project_id],
+                              't.id, t.title, t.description, t.status, t.duration, t.start_date, t.end_date',
+                              current_user.id)
+            result = paged_tasks_response(conn, page, ('id', 'title', 'description', 'status',
+                                                       'duration', 'start_date', 'end_date'))
+            conn.close()
+            return jsonify(result)
+        
         # Получаем ВСЕ задачи проекта с исполнителями
         tasks = conn.execute('''
             SELECT 
@@ -2517,100 +3414,58 @@ def project_analytics(project_id):
 # API: Получить данные для аналитики
 @app.route('/api/project/<int:project_id>/analytics/workload')
 @login_required
+@project_access
 def api_get_workload_analytics(project_id):
-    """Получить данные о загрузке участников"""
+    """Получить данные о загрузке участников (необязательное окно ?from=&to=)"""
+    try:
+        window = parse_window(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
         conn = get_db_connection()
-        
-        # Проверяем доступ к проекту
-        project = check_project_access(project_id, current_user.id)
-        if not project:
-            return jsonify({'error': 'Project not found'}), 404
-        
-        # Получаем участников проекта
-        members = conn.execute('''
-            SELECT pm.user_id, u.username, u.email, pm.role 
-            FROM project_members pm 
-            JOIN users u ON pm.user_id = u.id 
-            WHERE pm.project_id = ?
-            UNION
-            SELECT p.user_id as user_id, u.username, u.email, 'owner' as role
-            FROM projects p 
-            JOIN users u ON p.user_id = u.id 
-            WHERE p.id = ?
-        ''', (project_id, project_id)).fetchall()
-        
-        # Получаем все задачи проекта с приоритетами и исполнителями
-        tasks = conn.execute('''
-            SELECT 
-                t.id, t.title, t.status, t.duration, t.priority,
-                GROUP_CONCAT(ta.user_id) as assignee_ids
-            FROM tasks t
-            LEFT JOIN task_assignees ta ON t.id = ta.task_id
-            WHERE t.project_id = ?
-            GROUP BY t.id
-        ''', (project_id,)).fetchall()
-        
-        # Рассчитываем загрузку для каждого участника
-        workload_data = []
-        total_work_days = 30  # Общее количество рабочих дней в проекте (можно динамически рассчитывать)
-        
-        for member in members:
-            user_id = member['user_id']
-            user_tasks = [task for task in tasks if task['assignee_ids'] and str(user_id) in task['assignee_ids'].split(',')]
-            
-            total_duration = sum(task['duration'] for task in user_tasks)
-            workload_percentage = min((total_duration / total_work_days) * 100, 200)  # Ограничиваем 200%
-            
-            # Рассчитываем сложность задач
-            complexity_score = sum(
-                task['duration'] * get_priority_multiplier(task['priority']) 
-                for task in user_tasks
-            )
-            
-            workload_data.append({
-                'user_id': user_id,
-                'username': member['username'],
-                'email': member['email'],
-                'role': member['role'],
-                'task_count': len(user_tasks),
-                'total_duration': total_duration,
-                'workload_percentage': round(workload_percentage, 2),
-                'complexity_score': round(complexity_score, 2),
-                'tasks': [{
-                    'id': task['id'],
-                    'title': task['title'],
-                    'duration': task['duration'],
-                    'priority': task['priority'],
-                    'status': task['status'],
-                    'priority_multiplier': get_priority_multiplier(task['priority'])
-                } for task in user_tasks]
-            })
-        
+        result = analytics.workload(conn, project_id, window)
         conn.close()
         
-        return jsonify({
-            'success': True,
-            'workload_data': workload_data,
-            'total_work_days': total_work_days
-        })
+        return jsonify(dict(result, success=True))
         
     except Exception as e:
+        logger.exception("Ошибка при расчете загрузки участников")
+        return jsonify({'error': str(e)}), 500
+
+# API: Дневная загрузка участников
+@app.route('/api/project/<int:project_id>/analytics/load-histogram')
+@login_required
+@project_access
+def api_get_load_histogram(project_id):
+    """Загрузка исполнителей по дням и отрезки перегрузки (?from=&to=&capacity=)"""
+    try:
+        window = parse_window(request.args)
+        capacity = request.args.get('capacity', 1.0, type=float)
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        conn = get_db_connection()
+        try:
+            result = analytics.load_histogram(conn, project_id, window, capacity)
+        finally:
+            conn.close()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Ошибка при расчете дневной загрузки")
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify(dict(result, success=True))
 
 # API: Получить данные о сложности задач
 @app.route('/api/project/<int:project_id>/analytics/complexity')
 @login_required
+@project_access
 def api_get_complexity_analytics(project_id):
     """Получить данные о сложности задач"""
     try:
         conn = get_db_connection()
         
-        # Проверяем доступ к проекту
-        project = check_project_access(project_id, current_user.id)
-        if not project:
-            return jsonify({'error': 'Project not found'}), 404
-        
         # Получаем задачи с приоритетами
         tasks = conn.execute('''
             SELECT id, title, duration, priority, status
@@ -2654,17 +3509,12 @@ def api_get_complexity_analytics(project_id):
 
 def get_priority_multiplier(priority):
     """Возвращает множитель сложности для приоритета"""
-    multipliers = {
-        'low': 1.0,
-        'medium': 1.5,
-        'high': 2.0,
-        'critical': 3.0
-    }
-    return multipliers.get(priority, 1.0)
+    return analytics.priority_multiplier(priority)
 
 # Добавьте в app.py для отладки
 @app.route('/api/debug/project/<int:project_id>/tasks')
 @login_required
+@project_access
 def api_debug_project_tasks(project_id):
     """Отладочный endpoint для проверки задач проекта"""
     try:
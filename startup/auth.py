@@ -1,8 +1,9 @@
 # auth.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from database import create_user, verify_password, get_user_by_id
+from database import create_user, verify_password, get_user_by_id, user_cache
 from models import User
+from hashing import HashingBusy, HASH_RETRY_AFTER
 
 # Создаем blueprint для аутентификации
 auth_bp = Blueprint('auth', __name__)
@@ -10,12 +11,25 @@ auth_bp = Blueprint('auth', __name__)
 # Инициализация LoginManager будет в app.py
 login_manager = LoginManager()
 
+def server_busy(template):
+    """Ответ 503, когда пул хеширования паролей перегружен"""
+    flash('Сервер перегружен, попробуйте еще раз через несколько секунд')
+    return render_template(template), 503, {'Retry-After': str(HASH_RETRY_AFTER)}
+
 # В auth.py - обновите функцию load_user
 @login_manager.user_loader
 def load_user(user_id):
-    user_data = get_user_by_id(user_id)
+    try:
+        key = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    # Пользователь берется из кеша (сбрасывается в update_user_*), без запроса к базе
+    user = user_cache.get(key)
+    if user is not None:
+        return user
+    user_data = get_user_by_id(key)
     if user_data:
-        return User(
+        user = User(
             id=user_data['id'],
             username=user_data['username'],
             email=user_data['email'],
@@ -23,6 +37,8 @@ def load_user(user_id):
             created_at=user_data['created_at'],
             menu_position=user_data['menu_position']  # ДОБАВИТЬ ЭТУ СТРОКУ
         )
+        user_cache.set(key, user)
+        return user
     return None
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -40,7 +56,10 @@ def register():
             flash('Пароли не совпадают')
             return render_template('register.html')
         
-        user_id = create_user(username, email, password)
+        try:
+            user_id = create_user(username, email, password)
+        except HashingBusy:
+            return server_busy('register.html')
         if user_id:
             user_data = get_user_by_id(user_id)
             user = User(
@@ -63,7 +82,10 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        user_data = verify_password(username, password)
+        try:
+            user_data = verify_password(username, password)
+        except HashingBusy:
+            return server_busy('login.html')
         if user_data:
             user = User(
                 id=user_data['id'],
@@ -1,23 +1,244 @@
+import logging
 import sqlite3
 import os
+import queue
+import threading
+import time
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import g, has_app_context
+from werkzeug.security import generate_password_hash
+from metrics import track_cursor, track_execute
+from cache import TTLCache
+from hashing import hash_password, verify_password_hash
+
+logger = logging.getLogger(__name__)
 
 DATABASE = os.path.join(os.path.dirname(__file__), 'instance', 'app.db')
 
+# Размер пула соединений (waitress по умолчанию работает в 4 потока)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# Сколько секунд ждать свободное соединение, если пул исчерпан
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+# Профиль хранения: PRAGMA, применяемые один раз при создании соединения.
+# WAL позволяет читателям работать параллельно с записью (drag-and-drop на канбане),
+# busy_timeout - сколько писатель ждет блокировку вместо ошибки "database is locked"
+STORAGE_PROFILE = {
+    'journal_mode': os.environ.get('DB_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('DB_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('DB_BUSY_TIMEOUT', 15000)),
+    'mmap_size': int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('DB_CACHE_SIZE', -16000)),  # отрицательное значение - в КиБ
+    'temp_store': os.environ.get('DB_TEMP_STORE', 'MEMORY'),
+    'journal_size_limit': int(os.environ.get('DB_JOURNAL_SIZE_LIMIT', 64 * 1024 * 1024)),
+}
+# Как часто (в секундах) выполнять контрольную точку WAL, чтобы файл -wal не рос бесконечно
+DB_CHECKPOINT_INTERVAL = float(os.environ.get('DB_CHECKPOINT_INTERVAL', 300))
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений SQLite с ограничением размера"""
+
+    def __init__(self, database, max_size):
+        self.database = database
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.request_reuses = 0
+        self.checkpoints = 0
+        self._last_checkpoint = time.monotonic()
+        os.makedirs(os.path.dirname(database), exist_ok=True)
+
+    def _create(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               timeout=STORAGE_PROFILE['busy_timeout'] / 1000)
+        conn.row_factory = sqlite3.Row
+        for name, value in STORAGE_PROFILE.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _maybe_checkpoint(self, conn):
+        """Периодически переносит страницы из WAL в основной файл базы"""
+        if STORAGE_PROFILE['journal_mode'].upper() != 'WAL':
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_checkpoint < DB_CHECKPOINT_INTERVAL:
+                return
+            self._last_checkpoint = now
+        # PASSIVE не ждет читателей и писателей, поэтому не задерживает запрос
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        with self._lock:
+            self.checkpoints += 1
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise sqlite3.OperationalError('Пул соединений с базой данных исчерпан')
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+        try:
+            conn = self._create()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.misses += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            # Незафиксированные изменения упавшего запроса не должны попасть в следующий
+            if conn.in_transaction:
+                conn.rollback()
+            self._maybe_checkpoint(conn)
+            self._idle.put_nowait(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def note_request_reuse(self):
+        with self._lock:
+            self.request_reuses += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'request_reuses': self.request_reuses,
+                'checkpoints': self.checkpoints,
+            }
+
+
+class PooledConnection:
+    """Обертка над соединением из пула: close() возвращает соединение в пул.
+
+    Соединение, привязанное к запросу, по close() не освобождается -
+    это делает close_db() в teardown контекста приложения.
+    """
+
+    def __init__(self, conn, pool, request_bound=False):
+        self._conn = conn
+        self._pool = pool
+        self._request_bound = request_bound
+
+    def _raw(self):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def execute(self, sql, parameters=()):
+        return track_execute(self._raw().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return track_execute(self._raw().executemany, sql, seq_of_parameters, batch=True)
+
+    def cursor(self):
+        return track_cursor(self._raw().cursor())
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        if not self._request_bound:
+            self.release()
+
+    def release(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+pool = ConnectionPool(DATABASE, DB_POOL_SIZE)
+
+# Пользователи для login_manager.user_loader (auth.load_user): без кеша каждый
+# XHR начинался бы с запроса к users. Сбрасывается функциями update_user_*
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+user_cache = TTLCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Возвращает соединение текущего запроса (одно на запрос) или отдельное соединение из пула"""
+    if has_app_context():
+        if 'db' in g:
+            pool.note_request_reuse()
+            return g.db
+        g.db = PooledConnection(pool.acquire(), pool, request_bound=True)
+        return g.db
+    return PooledConnection(pool.acquire(), pool)
+
+
+def close_db(exception=None):
+    """Возвращает соединение запроса в пул"""
+    db = g.pop('db', None)
+    if db is not None:
+        db.release()
+
+
+def init_app(app):
+    """Регистрирует освобождение соединения в конце каждого запроса"""
+    app.teardown_appcontext(close_db)
+
+def bump_project_revision(conn, project_id):
+    """Увеличивает ревизию проекта (вызывается в транзакции изменения, до commit)"""
+    conn.execute('UPDATE projects SET revision = revision + 1 WHERE id = ?', (project_id,))
+
+
+def bump_task_project_revision(conn, task_id):
+    """Увеличивает ревизию проекта, которому принадлежит задача"""
+    conn.execute('''
+        UPDATE projects SET revision = revision + 1
+        WHERE id = (SELECT project_id FROM tasks WHERE id = ?)
+    ''', (task_id,))
+
+
+def bump_milestone_project_revision(conn, milestone_id):
+    """Увеличивает ревизию проекта, которому принадлежит веха"""
+    conn.execute('''
+        UPDATE projects SET revision = revision + 1
+        WHERE id = (SELECT project_id FROM milestones WHERE id = ?)
+    ''', (milestone_id,))
+
+
+def bump_user_projects_revision(conn, user_id):
+    """Увеличивает ревизию всех проектов пользователя (его имя и email есть в ответах API проекта)"""
+    conn.execute('''
+        UPDATE projects SET revision = revision + 1
+        WHERE user_id = ? OR id IN (SELECT project_id FROM project_members WHERE user_id = ?)
+    ''', (user_id, user_id))
+
+
+def get_project_revision(conn, project_id):
+    """Текущая ревизия проекта (None, если проекта нет)"""
+    row = conn.execute('SELECT revision FROM projects WHERE id = ?', (project_id,)).fetchone()
+    return row['revision'] if row else None
 
 # database.py - ОБНОВЛЕННАЯ функция init_db()
 def init_db():
     """Инициализирует базу данных только если она не существует"""
-    os.makedirs('instance', exist_ok=True)
+    os.makedirs(os.path.dirname(DATABASE), exist_ok=True)
     
     # Проверяем, существует ли уже база данных
     if os.path.exists(DATABASE):
-        print("База данных уже существует, пропускаем создание...")
+        logger.info("База данных уже существует, пропускаем создание")
         return
     
     conn = sqlite3.connect(DATABASE)
@@ -250,10 +471,10 @@ def init_db():
                         (today, today + timedelta(days=1), user_id))
 
         conn.commit()
-        print("База данных успешно создана с тестовыми назначениями задач!")
+        logger.info("База данных успешно создана с тестовыми назначениями задач")
         
     except Exception as e:
-        print(f"Ошибка при создании базы данных: {e}")
+        logger.exception("Ошибка при создании базы данных")
         conn.rollback()
         raise e
     finally:
@@ -261,9 +482,10 @@ def init_db():
 
 # Функции для работы с пользователями
 def create_user(username, email, password):
+    # Хеш считается до того, как занято соединение; HashingBusy - вызывающему
+    password_hash = hash_password(password)
     conn = get_db_connection()
     try:
-        password_hash = generate_password_hash(password)
         cursor = conn.cursor()
         cursor.execute(
             'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
@@ -291,9 +513,20 @@ def get_user_by_id(user_id):
 
 def verify_password(username, password):
     user = get_user_by_username(username)
-    if user and check_password_hash(user['password_hash'], password):
-        return user
-    return None
+    if not user:
+        return None
+    ok, new_hash = verify_password_hash(user['password_hash'], password)
+    if not ok:
+        return None
+    if new_hash:
+        # Хеш со старыми параметрами заменяется при успешном входе
+        conn = get_db_connection()
+        conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, user['id']))
+        conn.commit()
+        conn.close()
+        user_cache.invalidate(int(user['id']))
+        logger.info('Хеш пароля обновлен до текущих параметров', extra={'user_id': user['id']})
+    return user
 
 # Обновляем существующие функции для учета user_id
 def create_task(project_id, title, description, duration=1, start_date=None, end_date=None, assigned_to=None):
@@ -370,7 +603,7 @@ def update_task_dates(task_id, start_date=None, end_date=None, duration=None):
         
         conn.commit()
     except Exception as e:
-        print(f"Ошибка при обновлении дат: {e}")
+        logger.exception("Ошибка при обновлении дат задачи %s", task_id)
     finally:
         conn.close()
 
@@ -381,57 +614,6 @@ def get_task_by_id(task_id):
     conn.close()
     return task
 
-# В database.py ДОБАВЛЯЕМ ТЕ ЖЕ ФУНКЦИИ
-def update_dependent_tasks_status(task_id, new_status):
-    """Автоматически обновляет статусы зависимых задач при изменении статуса текущей задачи"""
-    conn = get_db_connection()
-    
-    try:
-        # Получаем текущую задачу
-        task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-        if not task:
-            return
-        
-        # Получаем ВСЕ зависимости где текущая задача является предшественником
-        dependencies = conn.execute('''
-            SELECT td.*, t.status as dependent_task_status 
-            FROM task_dependencies td 
-            JOIN tasks t ON td.task_id = t.id 
-            WHERE td.predecessor_id = ?
-        ''', (task_id,)).fetchall()
-        
-        for dep in dependencies:
-            dependent_task_id = dep['task_id']
-            dependency_type = dep['dependency_type']
-            dependent_task_status = dep['dependent_task_status']
-            
-            if dependency_type == 'FS' and new_status == 'completed':
-                if dependent_task_status == 'planned':
-                    conn.execute('UPDATE tasks SET status = "in_progress" WHERE id = ?', 
-                               (dependent_task_id,))
-            
-            elif dependency_type == 'SS' and new_status == 'in_progress':
-                if dependent_task_status == 'planned':
-                    conn.execute('UPDATE tasks SET status = "in_progress" WHERE id = ?', 
-                               (dependent_task_id,))
-            
-            elif dependency_type == 'FF' and new_status == 'completed':
-                if dependent_task_status == 'in_progress':
-                    conn.execute('UPDATE tasks SET status = "completed" WHERE id = ?', 
-                               (dependent_task_id,))
-            
-            elif dependency_type == 'SF' and new_status == 'in_progress':
-                if dependent_task_status == 'in_progress':
-                    conn.execute('UPDATE tasks SET status = "completed" WHERE id = ?', 
-                               (dependent_task_id,))
-        
-        conn.commit()
-        
-    except Exception as e:
-        print(f"Ошибка при обновлении зависимых задач: {e}")
-    finally:
-        conn.close()
-
 # В database.py добавить эти функции после существующих
 
 def update_user_profile(user_id, username, email):
@@ -442,7 +624,9 @@ def update_user_profile(user_id, username, email):
             'UPDATE users SET username = ?, email = ? WHERE id = ?',
             (username, email, user_id)
         )
+        bump_user_projects_revision(conn, user_id)
         conn.commit()
+        user_cache.invalidate(int(user_id))
         return True
     except sqlite3.IntegrityError:
         # Если имя пользователя или email уже существуют
@@ -452,7 +636,7 @@ def update_user_profile(user_id, username, email):
 
 def update_user_password(user_id, new_password):
     """Обновляет пароль пользователя"""
-    password_hash = generate_password_hash(new_password)
+    password_hash = hash_password(new_password)
     conn = get_db_connection()
     conn.execute(
         'UPDATE users SET password_hash = ? WHERE id = ?',
@@ -460,11 +644,12 @@ def update_user_password(user_id, new_password):
     )
     conn.commit()
     conn.close()
+    user_cache.invalidate(int(user_id))
 
 def verify_current_password(user_id, current_password):
     """Проверяет текущий пароль пользователя"""
     user = get_user_by_id(user_id)
-    if user and check_password_hash(user['password_hash'], current_password):
+    if user and verify_password_hash(user['password_hash'], current_password)[0]:
         return True
     return False
 
@@ -495,7 +680,7 @@ def get_assigned_tasks(user_id):
 # В database.py - обновить функцию create_user
 def create_user(username, email, password, menu_position='side'):
     """Создать нового пользователя"""
-    password_hash = generate_password_hash(password)
+    password_hash = hash_password(password)
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -521,9 +706,10 @@ def update_user_menu_position(user_id, menu_position):
             (menu_position, user_id)
         )
         conn.commit()
+        user_cache.invalidate(int(user_id))
         return True
     except Exception as e:
-        print(f"Ошибка при обновлении расположения меню: {e}")
+        logger.exception("Ошибка при обновлении расположения меню")
         return False
     finally:
         conn.close()
@@ -547,10 +733,11 @@ def update_user_menu_position(user_id, menu_position):
             (menu_position, user_id)
         )
         conn.commit()
+        user_cache.invalidate(int(user_id))
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка при обновлении расположения меню: {e}")
+        logger.exception("Ошибка при обновлении расположения меню")
         return False
     
 def update_user_menu_position(user_id, menu_position):
@@ -563,8 +750,9 @@ def update_user_menu_position(user_id, menu_position):
             (menu_position, user_id)
         )
         conn.commit()
+        user_cache.invalidate(int(user_id))
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка при обновлении расположения меню: {e}")
+        logger.exception("Ошибка при обновлении расположения меню")
         return False
\ No newline at end of file
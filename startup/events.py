@@ -0,0 +1,137 @@
+# events.py
+"""Шина событий в памяти процесса для потоков Server-Sent Events.
+
+Обработчики записи публикуют компактные изменения проекта, подписчики
+(/api/project/<id>/events) получают их через ограниченную очередь.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+# Потоки waitress; с этим числом сервер запускает wsgi.py
+WAITRESS_THREADS = int(os.environ.get('WAITRESS_THREADS', 32))
+# Сколько потоков всегда остается обычным запросам
+SSE_RESERVED_THREADS = int(os.environ.get('SSE_RESERVED_THREADS', 8))
+# Сколько потоков SSE одновременно (каждый занимает поток waitress на время потока)
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS',
+                                         max(1, WAITRESS_THREADS - SSE_RESERVED_THREADS)))
+# Сколько неотправленных сообщений держать для одного клиента
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 100))
+# Интервал heartbeat-комментария, секунды (держит соединение через прокси)
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+# Максимальная длительность одного потока: потом браузер переподключится сам
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+
+
+class Subscription:
+    """Подписка одного клиента на события проекта"""
+
+    def __init__(self, project_id, max_size):
+        self.project_id = project_id
+        self.queue = queue.Queue(maxsize=max_size)
+        # Клиент не успевал читать и пропустил события - ему нужна полная перезагрузка
+        self.overflowed = False
+
+    def put(self, message):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Не копим сообщения медленного клиента: очищаем очередь и просим resync
+            self.overflowed = True
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+
+class EventBus:
+    """Публикация событий по проектам с ограничением числа подписчиков"""
+
+    def __init__(self, max_subscribers=SSE_MAX_SUBSCRIBERS, queue_size=SSE_QUEUE_SIZE):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, project_id):
+        """Новая подписка или None, если достигнут лимит подписчиков"""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            subscription = Subscription(project_id, self.queue_size)
+            self._subscribers.setdefault(project_id, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.project_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.project_id]
+
+    def publish(self, project_id, event, data):
+        """Отправляет событие всем подписчикам проекта (не блокируется)"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(project_id, ()))
+            self.published += 1
+        if not subscribers:
+            return
+        message = format_event(event, data, data.get('revision'))
+        for subscription in subscribers:
+            was_overflowed = subscription.overflowed
+            subscription.put(message)
+            if subscription.overflowed and not was_overflowed:
+                with self._lock:
+                    self.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'max_subscribers': self.max_subscribers,
+                'projects': len(self._subscribers),
+                'published': self.published,
+                'dropped': self.dropped,
+            }
+
+
+def format_event(event, data, event_id=None):
+    """Сообщение в формате text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(bus, subscription, heartbeat=SSE_HEARTBEAT, max_seconds=SSE_MAX_STREAM_SECONDS):
+    """Генератор тела ответа SSE; при завершении снимает подписку"""
+    deadline = time.monotonic() + max_seconds
+    try:
+        # Через сколько миллисекунд браузеру переподключаться после обрыва
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            if subscription.overflowed:
+                yield format_event('resync', {'project_id': subscription.project_id})
+                return
+            try:
+                yield subscription.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': heartbeat\n\n'
+    finally:
+        bus.unsubscribe(subscription)
+
+
+bus = EventBus()
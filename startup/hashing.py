@@ -0,0 +1,138 @@
+# hashing.py
+"""Хеширование паролей в отдельных процессах.
+
+PBKDF2/scrypt занимает процессор на сотни миллисекунд, поэтому хеши считаются
+в ProcessPoolExecutor, а поток waitress только ждет результата. Очередь
+ограничена: если заняты все HASH_WORKERS процессов и HASH_QUEUE_SIZE мест в
+очереди, сразу выбрасывается HashingBusy, и обработчик отвечает 503 вместо
+того, чтобы занимать поток. HASH_WORKERS=0 - хеширование в потоке запроса.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', min(2, os.cpu_count() or 1)))
+# Сколько операций может ждать свободного процесса сверх HASH_WORKERS
+HASH_QUEUE_SIZE = int(os.environ.get('HASH_QUEUE_SIZE', 8))
+# Сколько секунд поток запроса ждет результата
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', 5))
+# Текущие параметры хеша; пароли со старыми параметрами перехешируются при входе
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+# Секунды для заголовка Retry-After в ответе 503
+HASH_RETRY_AFTER = int(os.environ.get('HASH_RETRY_AFTER', 2))
+
+
+class HashingBusy(Exception):
+    """Все процессы и места в очереди заняты или результат не пришел за HASH_TIMEOUT"""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = threading.BoundedSemaphore(max(1, HASH_WORKERS + HASH_QUEUE_SIZE))
+_stats = {'in_flight': 0, 'completed': 0, 'rejected': 0, 'timeouts': 0, 'rehashed': 0}
+
+
+# Функции ниже выполняются в процессах пула, поэтому объявлены на уровне модуля
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password, method):
+    """(пароль верен, новый хеш или None) - проверка и перехеширование за один вызов"""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    # Хеш со старыми параметрами (другой алгоритм, меньше итераций) заменяется
+    if pwhash.split('$', 1)[0] != method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: fork процесса с потоками waitress и логирования небезопасен
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            logger.info('Запущен пул хеширования паролей', extra={'workers': HASH_WORKERS})
+        return _executor
+
+
+def _reset_executor(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _release(future):
+    with _lock:
+        _stats['in_flight'] -= 1
+        _stats['completed'] += 1
+    _slots.release()
+
+
+def _run(function, *args):
+    if HASH_WORKERS <= 0:
+        return function(*args)
+
+    if not _slots.acquire(blocking=False):
+        with _lock:
+            _stats['rejected'] += 1
+        raise HashingBusy('Password hashing queue is full')
+
+    executor = _get_executor()
+    with _lock:
+        _stats['in_flight'] += 1
+    try:
+        future = executor.submit(function, *args)
+    except BaseException as e:
+        with _lock:
+            _stats['in_flight'] -= 1
+        _slots.release()
+        if isinstance(e, BrokenProcessPool):
+            _reset_executor(executor)
+            raise HashingBusy('Password hashing pool restarted')
+        raise
+    # Место в очереди освобождается, когда процесс закончит работу, даже если
+    # поток запроса перестал ждать по таймауту
+    future.add_done_callback(_release)
+
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeoutError:
+        with _lock:
+            _stats['timeouts'] += 1
+        raise HashingBusy('Password hashing timed out')
+    except BrokenProcessPool:
+        logger.error('Процесс хеширования паролей завершился аварийно')
+        _reset_executor(executor)
+        raise HashingBusy('Password hashing pool restarted')
+
+
+def hash_password(password):
+    """Хеш нового пароля с текущими параметрами; HashingBusy при перегрузке"""
+    return _run(_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password_hash(pwhash, password):
+    """Проверяет пароль; возвращает (верен ли, новый хеш для перезаписи или None)"""
+    ok, new_hash = _run(_verify, pwhash, password, PASSWORD_HASH_METHOD)
+    if new_hash:
+        with _lock:
+            _stats['rehashed'] += 1
+    return ok, new_hash
+
+
+def stats():
+    with _lock:
+        return dict(_stats, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE)
@@ -0,0 +1,172 @@
+# logging_setup.py
+"""Структурированное логирование приложения.
+
+Записи кладутся в ограниченную очередь (QueueHandler), а в stderr их пишет
+отдельный поток QueueListener, поэтому потоки waitress не ждут друг друга на
+выводе. Каждая запись получает request_id текущего запроса. Отладочные записи
+горячих путей помечаются extra={'sampled': True} и пропускаются только с долей
+LOG_DEBUG_SAMPLE_RATE.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# json - одна JSON-строка на запись, text - для чтения глазами при разработке
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+# Доля пропускаемых отладочных записей горячих путей (1 - все, 0 - ни одной)
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+# Сколько записей может ждать вывода; при переполнении новые записи отбрасываются
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Идентификатор запроса из заголовка принимается, только если он безопасен для логов
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Атрибуты LogRecord, которые не считаются дополнительными полями записи
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'sampled', 'taskName',
+}
+
+_listener = None
+_lock = threading.Lock()
+_stats = {'dropped': 0, 'sampled_out': 0}
+
+
+class RequestContextFilter(logging.Filter):
+    """Добавляет к записи request_id (выполняется в потоке, создавшем запись)"""
+
+    def filter(self, record):
+        request_id = '-'
+        if has_request_context():
+            request_id = g.get('request_id', '-')
+        record.request_id = request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю записей, помеченных extra={'sampled': True}"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        if random.random() < self.rate:
+            return True
+        with _lock:
+            _stats['sampled_out'] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON; поля из extra переносятся как есть"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокируется и не пишет ошибок при полной очереди"""
+
+    def prepare(self, record):
+        # Сообщение и трассировка вычисляются здесь, а форматирование в JSON
+        # остается потоку вывода
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock:
+                _stats['dropped'] += 1
+
+
+def _new_formatter():
+    return TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter()
+
+
+def _assign_request_id():
+    header = request.headers.get('X-Request-ID', '')
+    g.request_id = header if _REQUEST_ID_RE.match(header) else uuid.uuid4().hex[:16]
+
+
+def _return_request_id(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+
+def configure_logging(app=None):
+    """Настраивает корневой логгер (один раз на процесс) и request_id для app"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            output = logging.StreamHandler(sys.stderr)
+            output.setFormatter(_new_formatter())
+
+            handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+            handler.addFilter(RequestContextFilter())
+            handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+
+            root = logging.getLogger()
+            for existing in list(root.handlers):
+                root.removeHandler(existing)
+            root.addHandler(handler)
+            root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+
+            _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
+
+    if app is not None:
+        app.before_request(_assign_request_id)
+        app.after_request(_return_request_id)
+
+
+def logging_stats():
+    """Счетчики отброшенных записей (переполнение очереди, выборка)"""
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,307 @@
+# metrics.py
+"""Метрики запросов и SQL в памяти процесса, отдаются в текстовом формате Prometheus.
+
+Для каждого маршрута считаются задержки (гистограмма), коды ответа и запросы
+в обработке. Операторы запроса, время SQL и число прочитанных строк считает
+обертка execute/executemany и курсоров соединения (см. PooledConnection).
+По ней же находится N+1 - один и тот же оператор, повторенный в запросе
+много раз с разными параметрами. Операторы триггеров не считаются: запись,
+запускающая триггеры, - это один оператор приложения.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# Сколько одинаковых операторов за запрос считается признаком N+1
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    """Форма оператора без литералов: по ней одинаковые запросы складываются вместе"""
+    shape = _LITERAL_RE.sub('?', statement)
+    shape = _IN_LIST_RE.sub('(?, ...)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """Все метрики процесса; изменения под одной блокировкой"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = Counter()        # (method, endpoint, status) -> n
+        self.latency = {}                # (method, endpoint) -> Histogram
+        self.sql_queries = Counter()     # endpoint -> n
+        self.sql_rows = Counter()
+        self.sql_seconds = Counter()
+        self.sql_per_request = {}        # endpoint -> Histogram
+        self.n_plus_one = Counter()      # endpoint -> n
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method, endpoint, status, seconds, stats):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(method, endpoint, status)] += 1
+            self.latency.setdefault((method, endpoint), Histogram(LATENCY_BUCKETS)).observe(seconds)
+            if stats is not None:
+                self.sql_queries[endpoint] += stats.queries
+                self.sql_rows[endpoint] += stats.rows
+                self.sql_seconds[endpoint] += stats.seconds
+                self.sql_per_request.setdefault(endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.queries)
+                if stats.repeated:
+                    self.n_plus_one[endpoint] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'requests': dict(self.requests),
+                'latency': {key: (h.buckets, list(h.counts), h.total, h.sum) for key, h in self.latency.items()},
+                'sql_queries': dict(self.sql_queries),
+                'sql_rows': dict(self.sql_rows),
+                'sql_seconds': dict(self.sql_seconds),
+                'sql_per_request': {key: (h.buckets, list(h.counts), h.total, h.sum)
+                                    for key, h in self.sql_per_request.items()},
+                'n_plus_one': dict(self.n_plus_one),
+            }
+
+
+registry = Registry()
+
+
+class RequestStats:
+    """SQL одного запроса"""
+    __slots__ = ('queries', 'rows', 'seconds', 'shapes', 'repeated')
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.repeated = []
+
+
+def _current_stats():
+    if not has_app_context():
+        return None
+    return g.get('_sql_stats')
+
+
+class CountingCursor:
+    """Курсор, считающий прочитанные строки и время выборки в статистику запроса"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        self._stats.seconds += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchmany(self, *args):
+        rows = self._timed(self._cursor.fetchmany, *args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+
+class TrackedCursor(CountingCursor):
+    """Курсор из conn.cursor(): его execute/executemany тоже попадают в статистику"""
+
+    def execute(self, sql, parameters=()):
+        track_execute(self._cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        track_execute(self._cursor.executemany, sql, seq_of_parameters, batch=True)
+        return self
+
+
+def track_execute(method, sql, parameters, batch=False):
+    """Выполняет conn.execute/executemany с учетом времени; вне запроса - как есть"""
+    stats = _current_stats()
+    if stats is None:
+        return method(sql, parameters)
+    stats.queries += 1
+    # Внутри executemany оператор повторяется намеренно - это не N+1
+    if not batch:
+        stats.shapes[normalize_sql(sql)] += 1
+    started = time.perf_counter()
+    try:
+        cursor = method(sql, parameters)
+    finally:
+        stats.seconds += time.perf_counter() - started
+    return CountingCursor(cursor, stats)
+
+
+def track_cursor(cursor):
+    """Оборачивает conn.cursor() для статистики запроса; вне запроса - как есть"""
+    stats = _current_stats()
+    if stats is None:
+        return cursor
+    return TrackedCursor(cursor, stats)
+
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+    g._sql_stats = RequestStats()
+    registry.request_started()
+
+
+def _remember_status(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exception=None):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return
+    stats = g.pop('_sql_stats', None)
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    status = g.pop('_metrics_status', 500)
+
+    if stats is not None:
+        for shape, count in stats.shapes.items():
+            if count >= METRICS_N_PLUS_ONE_THRESHOLD:
+                stats.repeated.append(shape)
+                logger.warning('Возможный N+1: оператор выполнен %d раз за запрос', count,
+                               extra={'endpoint': endpoint, 'statement': shape[:300]})
+
+    registry.request_finished(request.method, endpoint, str(status),
+                              time.perf_counter() - started, stats)
+
+
+def init_app(app):
+    """Подключает сбор метрик к запросам приложения"""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(_finish_request)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, labels, data):
+    buckets, counts, total, value_sum = data
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {total}')
+    lines.append(f'{name}_sum{_labels(**labels)} {value_sum}')
+    lines.append(f'{name}_count{_labels(**labels)} {total}')
+    return lines
+
+
+def render(gauges=(), counters=()):
+    """Текст для /metrics; gauges и counters - дополнительные (имя, описание, значение).
+
+    counters - только растущие значения, их имена заканчиваются на _total.
+    """
+    data = registry.snapshot()
+    lines = []
+
+    def header(name, kind, text):
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    header('gepard_http_requests_total', 'counter', 'HTTP requests by route and status')
+    for (method, endpoint, status), value in sorted(data['requests'].items()):
+        lines.append(f'gepard_http_requests_total{_labels(method=method, endpoint=endpoint, status=status)} {value}')
+
+    header('gepard_http_request_duration_seconds', 'histogram', 'HTTP request latency by route')
+    for (method, endpoint), histogram in sorted(data['latency'].items()):
+        lines.extend(_histogram_lines('gepard_http_request_duration_seconds',
+                                      {'method': method, 'endpoint': endpoint}, histogram))
+
+    header('gepard_http_requests_in_flight', 'gauge', 'HTTP requests being processed')
+    lines.append(f"gepard_http_requests_in_flight {data['in_flight']}")
+
+    for key, name, text in (
+        ('sql_queries', 'gepard_sql_queries_total', 'SQL statements executed by route'),
+        ('sql_rows', 'gepard_sql_rows_total', 'Rows fetched by route'),
+        ('sql_seconds', 'gepard_sql_seconds_total', 'Time spent in SQL by route'),
+        ('n_plus_one', 'gepard_sql_n_plus_one_total', 'Requests with a statement repeated N+1 style'),
+    ):
+        header(name, 'counter', text)
+        for endpoint, value in sorted(data[key].items()):
+            lines.append(f'{name}{_labels(endpoint=endpoint)} {value}')
+
+    header('gepard_sql_queries_per_request', 'histogram', 'SQL statements per request by route')
+    for endpoint, histogram in sorted(data['sql_per_request'].items()):
+        lines.extend(_histogram_lines('gepard_sql_queries_per_request', {'endpoint': endpoint}, histogram))
+
+    for name, text, value in gauges:
+        header(name, 'gauge', text)
+        lines.append(f'{name} {value}')
+
+    for name, text, value in counters:
+        header(name, 'counter', text)
+        lines.append(f'{name} {value}')
+
+    return '\n'.join(lines) + '\n'
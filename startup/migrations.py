@@ -0,0 +1,473 @@
+# migrations.py
+"""Версионированные миграции схемы базы данных.
+
+Каждая миграция - запись (номер версии, описание, функция). Примененные версии
+записываются в таблицу schema_version, поэтому при старте приложения
+выполняются только новые шаги, по порядку, каждый в своей транзакции.
+"""
+import sqlite3
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def _add_column_if_missing(conn, table, column, definition):
+    if column not in _columns(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def migration_0001_user_and_priority_columns(conn):
+    """Поля, которые раньше добавлял update_database.py"""
+    _add_column_if_missing(conn, 'users', 'menu_position', "TEXT DEFAULT 'side'")
+    _add_column_if_missing(conn, 'tasks', 'priority', "TEXT DEFAULT 'medium'")
+    _add_column_if_missing(conn, 'personal_tasks', 'priority', "TEXT DEFAULT 'medium'")
+    conn.execute("UPDATE tasks SET priority = 'medium' WHERE priority IS NULL")
+    conn.execute("UPDATE personal_tasks SET priority = 'medium' WHERE priority IS NULL")
+
+
+def migration_0002_hot_path_indexes(conn):
+    """Индексы под WHERE/JOIN горячих запросов app.py"""
+    # Задачи проекта: канбан (ORDER BY position), Гант и календарь (по датам)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_position ON tasks(project_id, position)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_start ON tasks(project_id, start_date)')
+    # "Мои задачи", календарь, аналитика: задачи по исполнителю
+    # (поиск по task_id покрывает UNIQUE(task_id, user_id))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_task_assignees_user ON task_assignees(user_id, task_id)')
+    # Поиск последователей задачи (каскадный пересчет, статусы)
+    # (поиск предшественников покрывает UNIQUE(task_id, predecessor_id))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_task_dependencies_predecessor '
+                 'ON task_dependencies(predecessor_id, task_id)')
+    # Проекты пользователя (по project_id покрывает UNIQUE(project_id, user_id))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_project_members_user ON project_members(user_id, project_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_projects_user ON projects(user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_milestones_project_date ON milestones(project_id, date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_calendar_events_user_start ON calendar_events(user_id, start_date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_personal_tasks_user_position ON personal_tasks(user_id, position)')
+
+
+def migration_0003_project_revision(conn):
+    """Счетчик ревизий проекта: растет при каждом изменении, от него зависят кеши"""
+    _add_column_if_missing(conn, 'projects', 'revision', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def migration_0004_backfill_legacy_dependencies(conn):
+    """Переносит старое поле tasks.dependencies ("1,2,3") в task_dependencies как связи FS.
+
+    Переносятся только предшественники из того же проекта; уже существующие
+    типизированные связи не трогаются. Само поле остается зеркалом таблицы связей.
+    """
+    from scheduler import parse_legacy_dependencies, sync_legacy_dependencies
+
+    rows = conn.execute('''
+        SELECT id, project_id, dependencies FROM tasks
+        WHERE dependencies IS NOT NULL AND dependencies != ''
+    ''').fetchall()
+    project_of = dict(conn.execute('SELECT id, project_id FROM tasks').fetchall())
+
+    edges = []
+    for task_id, project_id, dependencies in rows:
+        for pred_id in parse_legacy_dependencies(dependencies):
+            if pred_id != task_id and project_of.get(pred_id) == project_id:
+                edges.append((task_id, pred_id))
+
+    conn.executemany('''
+        INSERT OR IGNORE INTO task_dependencies (task_id, predecessor_id, dependency_type, lag)
+        VALUES (?, ?, 'FS', 0)
+    ''', edges)
+    sync_legacy_dependencies(conn, [row[0] for row in rows])
+
+
+# Триггеры журнала изменений: (таблица, событие, сущность, ID сущности, действие, ID проекта)
+_CHANGE_TRIGGERS = [
+    ('tasks', 'INSERT', 'task', 'NEW.id', 'upsert', 'NEW.project_id'),
+    ('tasks', 'UPDATE', 'task', 'NEW.id', 'upsert', 'NEW.project_id'),
+    ('tasks', 'DELETE', 'task', 'OLD.id', 'delete', 'OLD.project_id'),
+    # Исполнители входят в представление задачи - меняется задача
+    ('task_assignees', 'INSERT', 'task', 'NEW.task_id', 'upsert',
+     '(SELECT project_id FROM tasks WHERE id = NEW.task_id)'),
+    ('task_assignees', 'DELETE', 'task', 'OLD.task_id', 'upsert',
+     '(SELECT project_id FROM tasks WHERE id = OLD.task_id)'),
+    ('task_dependencies', 'INSERT', 'dependency', 'NEW.id', 'upsert',
+     '(SELECT project_id FROM tasks WHERE id = NEW.task_id)'),
+    ('task_dependencies', 'UPDATE', 'dependency', 'NEW.id', 'upsert',
+     '(SELECT project_id FROM tasks WHERE id = NEW.task_id)'),
+    ('task_dependencies', 'DELETE', 'dependency', 'OLD.id', 'delete',
+     '(SELECT project_id FROM tasks WHERE id = OLD.task_id)'),
+    ('milestones', 'INSERT', 'milestone', 'NEW.id', 'upsert', 'NEW.project_id'),
+    ('milestones', 'UPDATE', 'milestone', 'NEW.id', 'upsert', 'NEW.project_id'),
+    ('milestones', 'DELETE', 'milestone', 'OLD.id', 'delete', 'OLD.project_id'),
+]
+
+
+def migration_0005_project_changes(conn):
+    """Журнал изменений проекта для дельта-синхронизации (/api/project/<id>/changes).
+
+    Строки пишут триггеры, поэтому в журнал попадают все пути записи, включая
+    каскадный пересчет дат и статусов. Изменение помечается ревизией, которую
+    получит проект при bump_*_revision в конце той же транзакции.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS project_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_project_changes_revision '
+                 'ON project_changes(project_id, revision)')
+    # Изменения до этой ревизии в журнале отсутствуют - клиенту нужна полная загрузка
+    _add_column_if_missing(conn, 'projects', 'changelog_start', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute('UPDATE projects SET changelog_start = revision')
+
+    for table, event, entity, entity_id, action, project_id in _CHANGE_TRIGGERS:
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_changes
+            AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO project_changes (project_id, revision, entity, entity_id, action)
+                SELECT id, revision + 1, '{entity}', {entity_id}, '{action}'
+                FROM projects WHERE id = {project_id};
+            END
+        ''')
+
+
+def migration_0006_sparse_positions(conn):
+    """Разреженные позиции карточек внутри колонок и индексы под них (см. ordering.py)"""
+    from ordering import POSITION_GAP
+
+    for table, scope in (('tasks', 'project_id'), ('personal_tasks', 'user_id')):
+        rows = conn.execute(f'''
+            SELECT id, {scope}, status FROM {table}
+            ORDER BY {scope}, status, position, id
+        ''').fetchall()
+        updates = []
+        rank = 0
+        column = None
+        for item_id, scope_id, status in rows:
+            if (scope_id, status) != column:
+                column = (scope_id, status)
+                rank = 0
+            rank += 1
+            updates.append((rank * POSITION_GAP, item_id))
+        conn.executemany(f'UPDATE {table} SET position = ? WHERE id = ?', updates)
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_status_position '
+                 'ON tasks(project_id, status, position)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_personal_tasks_user_status_position '
+                 'ON personal_tasks(user_id, status, position)')
+
+
+def migration_0007_calendar_windows(conn):
+    """Повторяющиеся события календаря и индексы под выборку по окну дат.
+
+    recurrence_until - дата окончания последнего повтора (NULL - серия бесконечна),
+    по ней закончившиеся серии отсекаются в SQL, а сами повторы разворачивает recurrence.py.
+    """
+    _add_column_if_missing(conn, 'calendar_events', 'recurrence_rule', 'TEXT')
+    _add_column_if_missing(conn, 'calendar_events', 'recurrence_until', 'DATE')
+    # Разовые события: окно отсекает историю по дате окончания
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_calendar_events_user_end '
+                 'ON calendar_events(user_id, COALESCE(end_date, start_date)) '
+                 'WHERE recurrence_rule IS NULL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_calendar_events_user_recurring '
+                 'ON calendar_events(user_id, start_date) WHERE recurrence_rule IS NOT NULL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_personal_tasks_user_end ON personal_tasks(user_id, end_date)')
+
+
+def migration_0008_workload_index(conn):
+    """Покрывающий индекс для агрегатов загрузки (analytics.py): без чтения строк задач"""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_workload '
+                 'ON tasks(project_id, priority, duration, start_date, end_date)')
+
+
+
+def _summary_delta(row, sign):
+    """Слагаемые project_summary от одной строки задачи (row - NEW или OLD)"""
+    return f'''
+        planned = planned {sign} ({row}.status IS 'planned'),
+        in_progress = in_progress {sign} ({row}.status IS 'in_progress'),
+        completed = completed {sign} ({row}.status IS 'completed'),
+        task_count = task_count {sign} 1,
+        total_duration = total_duration {sign} COALESCE({row}.duration, 0),
+        min_start = (SELECT MIN(start_date) FROM tasks WHERE project_id = {row}.project_id),
+        max_end = (SELECT MAX(end_date) FROM tasks WHERE project_id = {row}.project_id)'''
+
+
+def migration_0009_project_summary(conn):
+    """Сводка по проекту для портфеля (/portfolio), поддерживаемая триггерами.
+
+    Счетчики и длительность меняются на разницу от строки задачи, крайние даты
+    берутся по индексам idx_tasks_project_start/idx_tasks_project_end, поэтому
+    запись задачи не пересчитывает весь проект. Просрочка зависит от текущей
+    даты, поэтому в сводке ее нет: ее считает analytics.portfolio при чтении.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS project_summary (
+            project_id INTEGER PRIMARY KEY REFERENCES projects (id) ON DELETE CASCADE,
+            planned INTEGER NOT NULL DEFAULT 0,
+            in_progress INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            task_count INTEGER NOT NULL DEFAULT 0,
+            total_duration INTEGER NOT NULL DEFAULT 0,
+            min_start DATE,
+            max_end DATE,
+            revision INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_project_end ON tasks(project_id, end_date)')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_insert_summary AFTER INSERT ON projects
+        BEGIN
+            INSERT OR IGNORE INTO project_summary (project_id, revision) VALUES (NEW.id, NEW.revision);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_delete_summary AFTER DELETE ON projects
+        BEGIN
+            DELETE FROM project_summary WHERE project_id = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_revision_summary AFTER UPDATE OF revision ON projects
+        BEGIN
+            UPDATE project_summary SET revision = NEW.revision WHERE project_id = NEW.id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_summary AFTER INSERT ON tasks
+        BEGIN
+            UPDATE project_summary SET {_summary_delta('NEW', '+')}
+            WHERE project_id = NEW.project_id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_summary AFTER DELETE ON tasks
+        BEGIN
+            UPDATE project_summary SET {_summary_delta('OLD', '-')}
+            WHERE project_id = OLD.project_id;
+        END
+    ''')
+    # Перемещение карточки внутри колонки (position) сводку не трогает
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_update_summary
+        AFTER UPDATE OF status, duration, start_date, end_date, project_id ON tasks
+        BEGIN
+            UPDATE project_summary SET {_summary_delta('OLD', '-')}
+            WHERE project_id = OLD.project_id;
+            UPDATE project_summary SET {_summary_delta('NEW', '+')}
+            WHERE project_id = NEW.project_id;
+        END
+    ''')
+
+    # Начальное заполнение
+    conn.execute('''
+        INSERT OR REPLACE INTO project_summary
+            (project_id, planned, in_progress, completed, task_count, total_duration,
+             min_start, max_end, revision)
+        SELECT p.id,
+               COUNT(CASE WHEN t.status = 'planned' THEN 1 END),
+               COUNT(CASE WHEN t.status = 'in_progress' THEN 1 END),
+               COUNT(CASE WHEN t.status = 'completed' THEN 1 END),
+               COUNT(t.id),
+               COALESCE(SUM(t.duration), 0),
+               MIN(t.start_date),
+               MAX(t.end_date),
+               p.revision
+        FROM projects p
+        LEFT JOIN tasks t ON t.project_id = p.id
+        GROUP BY p.id
+    ''')
+
+
+# Сколько последних ревизий проекта хранит журнал изменений. Журнал обрезается
+# порциями: когда в нем набирается вдвое больше ревизий, changelog_start
+# сдвигается, и клиенты с более старой ревизией получают reset (полная загрузка).
+CHANGELOG_KEEP_REVISIONS = 500
+
+
+def migration_0010_changelog_retention(conn):
+    """Ограничение журнала project_changes последними CHANGELOG_KEEP_REVISIONS ревизиями"""
+    keep = CHANGELOG_KEEP_REVISIONS
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_changelog_retention
+        AFTER UPDATE OF revision ON projects
+        WHEN NEW.revision - NEW.changelog_start > {2 * keep}
+        BEGIN
+            UPDATE projects SET changelog_start = NEW.revision - {keep} WHERE id = NEW.id;
+            DELETE FROM project_changes
+            WHERE project_id = NEW.id AND revision <= NEW.revision - {keep};
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_projects_delete_changes AFTER DELETE ON projects
+        BEGIN
+            DELETE FROM project_changes WHERE project_id = OLD.id;
+        END
+    ''')
+    # Уже накопленный журнал и строки удаленных проектов
+    conn.execute(f'''
+        UPDATE projects SET changelog_start = revision - {keep}
+        WHERE revision - changelog_start > {keep}
+    ''')
+    conn.execute('''
+        DELETE FROM project_changes
+        WHERE revision <= COALESCE((SELECT changelog_start FROM projects p
+                                    WHERE p.id = project_changes.project_id), revision)
+    ''')
+
+
+def migration_0011_legacy_dependencies_fs_only(conn):
+    """Пересобирает зеркало tasks.dependencies: в нем остаются только FS-связи без задержки"""
+    from scheduler import sync_legacy_dependencies
+
+    rows = conn.execute('''
+        SELECT id FROM tasks WHERE dependencies IS NOT NULL AND dependencies != ''
+    ''').fetchall()
+    sync_legacy_dependencies(conn, [row[0] for row in rows])
+
+
+# Упорядоченный список миграций. Новые шаги добавляются только в конец.
+MIGRATIONS = [
+    (1, 'Поля menu_position и priority', migration_0001_user_and_priority_columns),
+    (2, 'Индексы для горячих запросов', migration_0002_hot_path_indexes),
+    (3, 'Ревизия проекта', migration_0003_project_revision),
+    (4, 'Перенос tasks.dependencies в task_dependencies', migration_0004_backfill_legacy_dependencies),
+    (5, 'Журнал изменений проекта', migration_0005_project_changes),
+    (6, 'Разреженные позиции карточек', migration_0006_sparse_positions),
+    (7, 'Повторяющиеся события и окно календаря', migration_0007_calendar_windows),
+    (8, 'Индекс для аналитики загрузки', migration_0008_workload_index),
+    (9, 'Сводка проектов для портфеля', migration_0009_project_summary),
+    (10, 'Ограничение журнала изменений', migration_0010_changelog_retention),
+    (11, 'Зеркало tasks.dependencies только для FS-связей', migration_0011_legacy_dependencies_fs_only),
+]
+
+
+def get_schema_version(conn):
+    """Возвращает номер последней примененной миграции (0 для новой базы)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn):
+    """Применяет все еще не примененные миграции, возвращает список их версий"""
+    applied = []
+    current = get_schema_version(conn)
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+
+        # IMMEDIATE сразу берет блокировку записи: параллельный процесс
+        # дождется окончания и увидит, что версия уже применена
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+            applied.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+
+    return applied
+
+
+# Горячие запросы app.py, которые должны идти по индексу, а не полным сканированием.
+# (название, имя таблицы в плане запроса, запрос)
+HOT_QUERIES = [
+    ('Задачи канбана', 'tasks',
+     'SELECT * FROM tasks WHERE project_id = 1 ORDER BY position ASC'),
+    ('Задачи для Ганта', 'tasks',
+     'SELECT id FROM tasks WHERE project_id = 1 ORDER BY start_date'),
+    ('Задачи проекта с исполнителями', 't', '''
+        SELECT t.id, GROUP_CONCAT(DISTINCT u.id)
+        FROM tasks t
+        LEFT JOIN task_assignees ta ON t.id = ta.task_id
+        LEFT JOIN users u ON ta.user_id = u.id
+        WHERE t.project_id = 1
+        GROUP BY t.id
+    '''),
+    ('Задачи, назначенные пользователю', 'ta', '''
+        SELECT t.id FROM tasks t
+        JOIN task_assignees ta ON t.id = ta.task_id
+        WHERE ta.user_id = 1
+    '''),
+    ('Соседи карточки в колонке', 'tasks',
+     "SELECT MIN(position) FROM tasks WHERE project_id = 1 AND status = 'planned' AND position > 1024"),
+    ('Последователи задачи', 'task_dependencies',
+     'SELECT task_id, dependency_type FROM task_dependencies WHERE predecessor_id = 1'),
+    ('Предшественники задачи', 'task_dependencies',
+     'SELECT predecessor_id FROM task_dependencies WHERE task_id = 1'),
+    ('Проекты участника', 'project_members',
+     'SELECT project_id FROM project_members WHERE user_id = 1'),
+    ('Участники проекта', 'project_members',
+     'SELECT user_id FROM project_members WHERE project_id = 1'),
+    ('Проекты владельца', 'projects',
+     'SELECT id FROM projects WHERE user_id = 1'),
+    ('Журнал изменений проекта', 'project_changes',
+     'SELECT entity, entity_id, action FROM project_changes WHERE project_id = 1 AND revision > 0'),
+    ('Вехи проекта', 'milestones',
+     'SELECT * FROM milestones WHERE project_id = 1 ORDER BY date'),
+    ('События календаря', 'calendar_events',
+     'SELECT * FROM calendar_events WHERE user_id = 1'),
+    ('Персональные задачи', 'personal_tasks',
+     'SELECT * FROM personal_tasks WHERE user_id = 1'),
+    ('Окно календаря: разовые события', 'calendar_events', '''
+        SELECT id FROM calendar_events
+        WHERE user_id = 1 AND recurrence_rule IS NULL
+        AND COALESCE(end_date, start_date) >= '2025-01-01' AND start_date < '2025-02-01'
+    '''),
+    ('Окно календаря: повторяющиеся события', 'calendar_events', '''
+        SELECT id FROM calendar_events
+        WHERE user_id = 1 AND recurrence_rule IS NOT NULL AND start_date < '2025-02-01'
+    '''),
+    ('Окно календаря: персональные задачи', 'personal_tasks',
+     "SELECT id FROM personal_tasks WHERE user_id = 1 AND end_date >= '2025-01-01' AND start_date < '2025-02-01'"),
+    ('Окно календаря: вехи', 'milestones',
+     "SELECT id FROM milestones WHERE project_id = 1 AND date >= '2025-01-01' AND date < '2025-02-01'"),
+    ('Крайняя дата окончания проекта', 'tasks',
+     'SELECT MAX(end_date) FROM tasks WHERE project_id = 1'),
+    ('Просроченные задачи проекта', 'tasks',
+     "SELECT COUNT(*) FROM tasks WHERE project_id = 1 AND status != 'completed' AND end_date < '2025-01-01'"),
+    ('Загрузка участников', 't', '''
+        SELECT ta.user_id, COUNT(*), SUM(t.duration)
+        FROM tasks t
+        JOIN task_assignees ta ON ta.task_id = t.id
+        WHERE t.project_id = 1
+        GROUP BY ta.user_id
+    '''),
+]
+
+
+def check_query_plans(conn):
+    """Проверяет через EXPLAIN QUERY PLAN, что горячие запросы не сканируют таблицы целиком.
+
+    Возвращает список (название, строка плана) для запросов, деградировавших до SCAN.
+    """
+    problems = []
+    for name, table, sql in HOT_QUERIES:
+        for row in conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall():
+            detail = row[3]
+            # "SCAN tasks" (в том числе по покрывающему индексу) - проход по всей таблице
+            if detail == f'SCAN {table}' or detail.startswith(f'SCAN {table} '):
+                problems.append((name, detail))
+    return problems
@@ -0,0 +1,99 @@
+# ordering.py
+"""Порядок карточек в колонках канбана (разреженные позиции).
+
+Позиции внутри колонки (проект/пользователь + статус) идут с шагом POSITION_GAP,
+поэтому перенос карточки меняет одну строку: новая позиция - середина между
+соседями. Когда между соседями не остается места, колонка перенумеровывается.
+"""
+
+POSITION_GAP = 1024
+
+# Таблица -> поле, задающее доску (колонка = доска + статус)
+_SCOPES = {
+    'tasks': 'project_id',
+    'personal_tasks': 'user_id',
+}
+
+
+def _scope_column(table):
+    if table not in _SCOPES:
+        raise ValueError(f'Unsupported table for ordering: {table}')
+    return _SCOPES[table]
+
+
+def column_end_position(conn, table, scope_id, status, exclude_id=None):
+    """Позиция для карточки, добавляемой в конец колонки"""
+    scope = _scope_column(table)
+    row = conn.execute(f'''
+        SELECT MAX(position) FROM {table}
+        WHERE {scope} = ? AND status = ? AND id != ?
+    ''', (scope_id, status, exclude_id or 0)).fetchone()
+    return (row[0] or 0) + POSITION_GAP
+
+
+def rebalance_column(conn, table, scope_id, status):
+    """Перенумеровывает колонку с шагом POSITION_GAP, сохраняя порядок"""
+    scope = _scope_column(table)
+    rows = conn.execute(f'''
+        SELECT id FROM {table} WHERE {scope} = ? AND status = ?
+        ORDER BY position ASC, id ASC
+    ''', (scope_id, status)).fetchall()
+    conn.executemany(f'UPDATE {table} SET position = ? WHERE id = ?',
+                     [((index + 1) * POSITION_GAP, row[0]) for index, row in enumerate(rows)])
+    return len(rows)
+
+
+def _neighbor_positions(conn, table, scope_id, item_id, status, before_id, after_id):
+    """Позиции соседей (prev, next), между которыми встанет карточка; None - края нет"""
+    scope = _scope_column(table)
+
+    anchor_id = before_id or after_id
+    anchor = conn.execute(f'''
+        SELECT position FROM {table} WHERE id = ? AND {scope} = ? AND status = ?
+    ''', (anchor_id, scope_id, status)).fetchone()
+    if not anchor:
+        raise LookupError('Anchor card not found in target column')
+
+    if before_id:
+        row = conn.execute(f'''
+            SELECT MAX(position) FROM {table}
+            WHERE {scope} = ? AND status = ? AND position < ? AND id != ?
+        ''', (scope_id, status, anchor[0], item_id)).fetchone()
+        return row[0], anchor[0]
+
+    row = conn.execute(f'''
+        SELECT MIN(position) FROM {table}
+        WHERE {scope} = ? AND status = ? AND position > ? AND id != ?
+    ''', (scope_id, status, anchor[0], item_id)).fetchone()
+    return anchor[0], row[0]
+
+
+def move_item(conn, table, scope_id, item_id, status, before_id=None, after_id=None):
+    """Ставит карточку в колонку status перед before_id, после after_id или в конец.
+
+    Обычно меняется одна строка; commit делает вызывающий код. Возвращает новую позицию.
+    """
+    if before_id == item_id or after_id == item_id:
+        before_id = after_id = None
+
+    if not before_id and not after_id:
+        position = column_end_position(conn, table, scope_id, status, exclude_id=item_id)
+    else:
+        prev_pos, next_pos = _neighbor_positions(conn, table, scope_id, item_id, status,
+                                                 before_id, after_id)
+        if prev_pos is not None and next_pos is not None and next_pos - prev_pos < 2:
+            # Место между соседями закончилось - разреживаем колонку и считаем заново
+            rebalance_column(conn, table, scope_id, status)
+            prev_pos, next_pos = _neighbor_positions(conn, table, scope_id, item_id, status,
+                                                     before_id, after_id)
+
+        if prev_pos is None:
+            position = next_pos - POSITION_GAP
+        elif next_pos is None:
+            position = prev_pos + POSITION_GAP
+        else:
+            position = (prev_pos + next_pos) // 2
+
+    conn.execute(f'UPDATE {table} SET status = ?, position = ? WHERE id = ?',
+                 (status, position, item_id))
+    return position
@@ -0,0 +1,209 @@
+# recurrence.py
+"""Повторяющиеся события календаря (подмножество RRULE из RFC 5545).
+
+Поддерживаются FREQ=DAILY|WEEKLY|MONTHLY|YEARLY, INTERVAL, COUNT, UNTIL и
+BYDAY (только для WEEKLY). Повторы не хранятся в базе: они вычисляются лениво
+и только внутри запрошенного окна, поэтому размер ответа не зависит от того,
+сколько лет событие уже повторяется.
+"""
+import calendar
+import os
+from datetime import date, timedelta
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Верхняя граница COUNT: по ней при сохранении вычисляется дата последнего повтора
+RECURRENCE_MAX_COUNT = int(os.environ.get('RECURRENCE_MAX_COUNT', 1000))
+# Сколько повторов одного события отдавать в одном ответе
+RECURRENCE_MAX_OCCURRENCES = int(os.environ.get('RECURRENCE_MAX_OCCURRENCES', 400))
+
+
+def _parse_until(value):
+    value = value.strip()
+    if len(value) >= 8 and value[:8].isdigit():
+        value = f'{value[:4]}-{value[4:6]}-{value[6:8]}'
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        raise ValueError(f'Invalid UNTIL: {value}')
+
+
+def parse_rule(text):
+    """Разбирает строку вида "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=10".
+
+    Возвращает словарь правила; ошибки - ValueError с текстом для ответа 400.
+    """
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    parts = {}
+    for part in text.split(';'):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid recurrence rule part: {part}')
+        parts[name.strip().upper()] = value.strip()
+
+    freq = parts.pop('FREQ', '').upper()
+    if freq not in FREQUENCIES:
+        raise ValueError('FREQ must be one of ' + ', '.join(FREQUENCIES))
+
+    try:
+        interval = int(parts.pop('INTERVAL', 1))
+        count = int(parts['COUNT']) if 'COUNT' in parts else None
+    except ValueError:
+        raise ValueError('INTERVAL and COUNT must be integers')
+    parts.pop('COUNT', None)
+    if interval < 1:
+        raise ValueError('INTERVAL must be positive')
+    if count is not None and not 1 <= count <= RECURRENCE_MAX_COUNT:
+        raise ValueError(f'COUNT must be between 1 and {RECURRENCE_MAX_COUNT}')
+
+    until = _parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    if until and count:
+        raise ValueError('COUNT and UNTIL cannot be used together')
+
+    byday = ()
+    if 'BYDAY' in parts:
+        if freq != 'WEEKLY':
+            raise ValueError('BYDAY is supported only with FREQ=WEEKLY')
+        codes = [code.strip().upper() for code in parts.pop('BYDAY').split(',') if code.strip()]
+        for code in codes:
+            if code not in WEEKDAYS:
+                raise ValueError(f'Invalid BYDAY: {code}')
+        byday = tuple(sorted({WEEKDAYS.index(code) for code in codes}))
+
+    if parts:
+        raise ValueError('Unsupported recurrence rule parts: ' + ', '.join(sorted(parts)))
+
+    return {'freq': freq, 'interval': interval, 'count': count, 'until': until, 'byday': byday}
+
+
+def format_rule(rule):
+    """Каноническая строка правила для хранения в calendar_events.recurrence_rule"""
+    parts = [f"FREQ={rule['freq']}"]
+    if rule['interval'] != 1:
+        parts.append(f"INTERVAL={rule['interval']}")
+    if rule['byday']:
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in rule['byday']))
+    if rule['count']:
+        parts.append(f"COUNT={rule['count']}")
+    if rule['until']:
+        parts.append('UNTIL=' + rule['until'].strftime('%Y%m%d'))
+    return ';'.join(parts)
+
+
+def _add_months(start, months):
+    """Тот же день через months месяцев или None, если такого дня нет (31-е, 29 февраля)"""
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    if year > date.max.year:
+        return None
+    if start.day > calendar.monthrange(year, month + 1)[1]:
+        return None
+    return date(year, month + 1, start.day)
+
+
+def _iterate(rule, dtstart, from_date):
+    """Пары (номер повтора, дата) начиная с периода, где может быть from_date.
+
+    Для DAILY/WEEKLY начальный период вычисляется арифметически, поэтому старые
+    повторы не перебираются. Номер нужен только для COUNT.
+    """
+    interval = rule['interval']
+    freq = rule['freq']
+    offset = max(0, (from_date - dtstart).days)
+
+    if freq == 'DAILY' or (freq == 'WEEKLY' and not rule['byday']):
+        step = interval * (7 if freq == 'WEEKLY' else 1)
+        k = -(-offset // step)
+        while True:
+            yield k, dtstart + timedelta(days=k * step)
+            k += 1
+
+    elif freq == 'WEEKLY':
+        days = rule['byday']
+        week_start = dtstart - timedelta(days=dtstart.weekday())
+        first_week = [day for day in days if day >= dtstart.weekday()]
+        period = (from_date - week_start).days // (7 * interval) if from_date > week_start else 0
+        index = 0 if period == 0 else len(first_week) + (period - 1) * len(days)
+        while True:
+            base = week_start + timedelta(days=period * 7 * interval)
+            for day in (first_week if period == 0 else days):
+                yield index, base + timedelta(days=day)
+                index += 1
+            period += 1
+
+    else:
+        months_step = interval * (12 if freq == 'YEARLY' else 1)
+        k = 0
+        index = 0
+        if rule['count'] is None:
+            # Без COUNT номера не важны - пропускаем прошедшие периоды сразу
+            months = (from_date.year - dtstart.year) * 12 + from_date.month - dtstart.month
+            k = max(0, months // months_step - 1)
+        while True:
+            current = _add_months(dtstart, k * months_step)
+            if current is None and k * months_step > (date.max.year - dtstart.year) * 12:
+                return
+            if current is not None:
+                yield index, current
+                index += 1
+            k += 1
+
+
+def occurrences(rule, dtstart, window_start, window_end, limit=RECURRENCE_MAX_OCCURRENCES):
+    """Даты начала повторов в полуинтервале [window_start, window_end), не больше limit"""
+    if window_start >= window_end:
+        return
+    emitted = 0
+    for index, current in _iterate(rule, dtstart, max(dtstart, window_start)):
+        if rule['count'] is not None and index >= rule['count']:
+            return
+        if rule['until'] is not None and current > rule['until']:
+            return
+        if current >= window_end:
+            return
+        if current < window_start or current < dtstart:
+            continue
+        yield current
+        emitted += 1
+        if emitted >= limit:
+            return
+
+
+def last_occurrence(rule, dtstart):
+    """Дата последнего повтора или None для бесконечного правила.
+
+    По ней вычисляется calendar_events.recurrence_until, чтобы окно календаря
+    отсекало закончившиеся серии прямо в SQL.
+    """
+    if rule['until'] is not None:
+        return rule['until']
+    if rule['count'] is None:
+        return None
+    last = dtstart
+    for index, current in _iterate(rule, dtstart, dtstart):
+        if index >= rule['count']:
+            break
+        last = current
+    return last
+
+
+def recurrence_columns(rule_text, start_date, end_date=None):
+    """Значения (recurrence_rule, recurrence_until) для записи события.
+
+    Пустое правило - разовое событие (None, None). Ошибки - ValueError.
+    """
+    if not rule_text:
+        return None, None
+    rule = parse_rule(rule_text)
+    try:
+        dtstart = date.fromisoformat(str(start_date)[:10])
+        span = (date.fromisoformat(str(end_date)[:10]) - dtstart).days if end_date else 0
+    except ValueError:
+        raise ValueError('Invalid start or end date')
+    last = last_occurrence(rule, dtstart)
+    until = (last + timedelta(days=max(span, 0))).isoformat() if last else None
+    return format_rule(rule), until
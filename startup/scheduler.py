@@ -0,0 +1,735 @@
+# scheduler.py
+"""Планировщик дат задач проекта по зависимостям.
+
+Граф проекта (задачи + task_dependencies) загружается из базы одним проходом,
+сортируется топологически, а новые даты распространяются по нему за один
+проход вперед с учетом типов связей FS/SS/FF/SF и задержки (lag).
+Все измененные даты записываются одной транзакцией через executemany.
+
+Выравнивание ресурсов (level_resources) сдвигает некритические задачи в
+пределах их резерва так, чтобы у исполнителя в один день было не больше
+capacity задач.
+"""
+import heapq
+from collections import deque
+from datetime import date
+
+
+def parse_date(value):
+    """Переводит дату 'YYYY-MM-DD' в порядковый номер дня (или None)"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def format_date(day):
+    """Обратное преобразование для parse_date"""
+    return date.fromordinal(day).isoformat()
+
+
+class ProjectGraph:
+    """Задачи проекта и связи между ними в памяти"""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        # task_id -> {'start': int|None, 'end': int|None, 'duration': int, ...}
+        self.tasks = {}
+        # task_id -> [(связанная задача, тип связи, lag)]
+        self.successors = {}
+        self.predecessors = {}
+
+    def add_task(self, task_id, start, end, duration, **extra):
+        self.tasks[task_id] = dict(start=start, end=end, duration=max(int(duration or 1), 1), **extra)
+        self.successors.setdefault(task_id, [])
+        self.predecessors.setdefault(task_id, [])
+
+    def add_edge(self, predecessor_id, task_id, dependency_type='FS', lag=0):
+        # Связи с задачами других проектов и петли в граф не попадают
+        if predecessor_id not in self.tasks or task_id not in self.tasks or predecessor_id == task_id:
+            return
+        edge_type = (dependency_type or 'FS').upper()
+        self.successors[predecessor_id].append((task_id, edge_type, int(lag or 0)))
+        self.predecessors[task_id].append((predecessor_id, edge_type, int(lag or 0)))
+
+    def reachable_from(self, task_ids):
+        """Все задачи, достижимые по связям из task_ids (включая сами task_ids)"""
+        seen = set()
+        queue = deque(t for t in task_ids if t in self.tasks)
+        while queue:
+            task_id = queue.popleft()
+            if task_id in seen:
+                continue
+            seen.add(task_id)
+            queue.extend(succ for succ, _, _ in self.successors[task_id] if succ not in seen)
+        return seen
+
+    def topological_order(self, subset=None):
+        """Топологическая сортировка (алгоритм Кана).
+
+        Задачи, входящие в циклы, в результат не попадают - их даты не трогаем.
+        """
+        nodes = self.tasks.keys() if subset is None else subset
+        indegree = {task_id: 0 for task_id in nodes}
+        for task_id in indegree:
+            for succ, _, _ in self.successors[task_id]:
+                if succ in indegree:
+                    indegree[succ] += 1
+
+        queue = deque(task_id for task_id, degree in indegree.items() if degree == 0)
+        order = []
+        while queue:
+            task_id = queue.popleft()
+            order.append(task_id)
+            for succ, _, _ in self.successors[task_id]:
+                if succ in indegree:
+                    indegree[succ] -= 1
+                    if indegree[succ] == 0:
+                        queue.append(succ)
+        return order
+
+
+# Сколько ID передавать в один запрос с IN (...)
+_IN_CHUNK = 500
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), _IN_CHUNK):
+        yield ids[i:i + _IN_CHUNK]
+
+
+def _placeholders(ids):
+    return ','.join('?' * len(ids))
+
+
+def parse_legacy_dependencies(value):
+    """Разбирает старое поле tasks.dependencies ("1,2,3") в список ID"""
+    ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.isdigit():
+            ids.append(int(part))
+    return ids
+
+
+# Связи, которые видны в старом поле tasks.dependencies
+LEGACY_EDGE_SQL = "COALESCE(dependency_type, 'FS') = 'FS' AND COALESCE(lag, 0) = 0"
+
+
+def sync_legacy_dependencies(conn, task_ids):
+    """Пересобирает старое поле tasks.dependencies из task_dependencies.
+
+    Поле остается только зеркалом для старых клиентов; источник истины - таблица связей.
+    Старые клиенты (Гант) читают каждую связь поля как FS без задержки, поэтому
+    в зеркало попадают только такие связи.
+    """
+    for chunk in _chunks(task_ids):
+        conn.execute(f'''
+            UPDATE tasks SET dependencies = (
+                SELECT COALESCE(GROUP_CONCAT(predecessor_id), '')
+                FROM task_dependencies
+                WHERE task_id = tasks.id AND {LEGACY_EDGE_SQL}
+            )
+            WHERE id IN ({_placeholders(chunk)})
+        ''', chunk)
+
+
+def set_task_predecessors(conn, task_id, predecessor_ids):
+    """Заменяет набор предшественников задачи (семантика старого POST /dependencies).
+
+    Связи к предшественникам из списка сохраняют свой тип и задержку, новые
+    создаются как FS без задержки, остальные FS-связи без задержки удаляются.
+    Связи других типов и с задержкой старый клиент не видит, поэтому они
+    остаются. Не коммитит.
+    Возвращает (добавленные, удаленные) ID предшественников.
+    """
+    task = conn.execute('SELECT project_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    if not task:
+        return [], []
+
+    wanted = set()
+    for pred_id in parse_legacy_dependencies(','.join(map(str, predecessor_ids))):
+        if pred_id != task_id:
+            wanted.add(pred_id)
+    # Предшественник должен быть задачей того же проекта
+    valid = set()
+    for chunk in _chunks(wanted):
+        rows = conn.execute(f'''
+            SELECT id FROM tasks WHERE project_id = ? AND id IN ({_placeholders(chunk)})
+        ''', [task['project_id']] + chunk).fetchall()
+        valid.update(row['id'] for row in rows)
+
+    rows = conn.execute(f'''
+        SELECT predecessor_id, {LEGACY_EDGE_SQL} AS legacy
+        FROM task_dependencies WHERE task_id = ?
+    ''', (task_id,)).fetchall()
+    current = {row['predecessor_id'] for row in rows}
+    added = sorted(valid - current)
+    removed = sorted({row['predecessor_id'] for row in rows if row['legacy']} - valid)
+
+    conn.executemany('DELETE FROM task_dependencies WHERE task_id = ? AND predecessor_id = ?',
+                     [(task_id, pred_id) for pred_id in removed])
+    conn.executemany('''
+        INSERT OR IGNORE INTO task_dependencies (task_id, predecessor_id, dependency_type, lag)
+        VALUES (?, ?, 'FS', 0)
+    ''', [(task_id, pred_id) for pred_id in added])
+    sync_legacy_dependencies(conn, [task_id])
+    return added, removed
+
+
+def load_project_graph(conn, project_id, include_legacy=False):
+    """Загружает задачи и связи проекта двумя запросами.
+
+    include_legacy - учитывать и старое поле tasks.dependencies (как связи FS без задержки),
+    если в нем остались ID, не перенесенные в task_dependencies.
+    """
+    graph = ProjectGraph(project_id)
+
+    tasks = conn.execute('''
+        SELECT id, title, start_date, end_date, duration, status, priority, dependencies
+        FROM tasks WHERE project_id = ?
+    ''', (project_id,)).fetchall()
+    for task in tasks:
+        graph.add_task(task['id'], parse_date(task['start_date']), parse_date(task['end_date']),
+                       task['duration'], title=task['title'], status=task['status'],
+                       priority=task['priority'])
+
+    edges = conn.execute('''
+        SELECT td.predecessor_id, td.task_id, td.dependency_type, td.lag
+        FROM task_dependencies td
+        JOIN tasks t ON td.task_id = t.id
+        WHERE t.project_id = ?
+    ''', (project_id,)).fetchall()
+    for edge in edges:
+        graph.add_edge(edge['predecessor_id'], edge['task_id'], edge['dependency_type'], edge['lag'])
+
+    if include_legacy:
+        for task in tasks:
+            known = {pred_id for pred_id, _, _ in graph.predecessors[task['id']]}
+            for pred_id in parse_legacy_dependencies(task['dependencies']):
+                if pred_id not in known:
+                    graph.add_edge(pred_id, task['id'], 'FS', 0)
+
+    return graph
+
+
+def constrained_start(graph, task_id, dates):
+    """Самая ранняя дата начала задачи, допускаемая ее предшественниками.
+
+    dates - текущие (start, end) задач; None, если ограничений нет.
+    """
+    duration = graph.tasks[task_id]['duration']
+    earliest = None
+    for pred_id, dependency_type, lag in graph.predecessors[task_id]:
+        pred_start, pred_end = dates[pred_id]
+        if dependency_type == 'SS':
+            # Начало не раньше начала предшественника
+            candidate = pred_start + lag if pred_start is not None else None
+        elif dependency_type == 'FF':
+            # Окончание не раньше окончания предшественника
+            candidate = pred_end + lag - (duration - 1) if pred_end is not None else None
+        elif dependency_type == 'SF':
+            # Окончание не раньше начала предшественника
+            candidate = pred_start + lag - (duration - 1) if pred_start is not None else None
+        else:
+            # FS: начало на следующий день после окончания предшественника
+            candidate = pred_end + 1 + lag if pred_end is not None else None
+
+        if candidate is not None and (earliest is None or candidate > earliest):
+            earliest = candidate
+    return earliest
+
+
+def latest_start_before(dependency_type, lag, duration, succ_start, succ_end):
+    """Самая поздняя дата начала предшественника длительностью duration, при
+    которой связь с последователем, стоящим в (succ_start, succ_end), не нарушена.
+
+    Обратная к constrained_start; None, если у последователя нет нужной даты.
+    """
+    if dependency_type == 'SS':
+        return succ_start - lag if succ_start is not None else None
+    if dependency_type == 'FF':
+        return succ_end - lag - (duration - 1) if succ_end is not None else None
+    if dependency_type == 'SF':
+        return succ_end - lag if succ_end is not None else None
+    # FS: окончание накануне начала последователя
+    return succ_start - 1 - lag - (duration - 1) if succ_start is not None else None
+
+
+def reschedule(graph, changed_task_ids, include_changed=False):
+    """Пересчитывает даты задач, зависящих от changed_task_ids.
+
+    Каждая задача пересчитывается один раз, в топологическом порядке, поэтому
+    "ромбовидные" связи не приводят к повторным пересчетам.
+    include_changed - пересчитать и сами changed_task_ids (например, после
+    добавления им новой связи). Возвращает {task_id: (start, end)} измененных задач.
+    """
+    roots = {task_id for task_id in changed_task_ids if task_id in graph.tasks}
+    affected = graph.reachable_from(roots)
+    dates = {task_id: (task['start'], task['end']) for task_id, task in graph.tasks.items()}
+    changes = {}
+
+    for task_id in graph.topological_order(affected):
+        if task_id in roots and not include_changed:
+            continue
+        start = constrained_start(graph, task_id, dates)
+        if start is None:
+            continue
+        end = start + graph.tasks[task_id]['duration'] - 1
+        if (start, end) != dates[task_id]:
+            dates[task_id] = (start, end)
+            changes[task_id] = (start, end)
+
+    return changes
+
+
+def apply_schedule(conn, graph, changes):
+    """Записывает новые даты одной пачкой и обновляет граф в памяти"""
+    if not changes:
+        return
+    conn.executemany(
+        'UPDATE tasks SET start_date = ?, end_date = ? WHERE id = ?',
+        [(format_date(start), format_date(end), task_id) for task_id, (start, end) in changes.items()]
+    )
+    for task_id, (start, end) in changes.items():
+        graph.tasks[task_id]['start'] = start
+        graph.tasks[task_id]['end'] = end
+
+
+def cascade_reschedule(conn, task_id, include_changed=False):
+    """Пересчитывает даты всех задач, зависящих от task_id (commit делает вызывающий код).
+
+    Возвращает {task_id: (start_date, end_date)} измененных задач в формате 'YYYY-MM-DD'.
+    """
+    row = conn.execute('SELECT project_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    if not row:
+        return {}
+
+    graph = load_project_graph(conn, row['project_id'])
+    changes = reschedule(graph, [task_id], include_changed=include_changed)
+    apply_schedule(conn, graph, changes)
+
+    return {changed_id: (format_date(start), format_date(end)) for changed_id, (start, end) in changes.items()}
+
+
+def _cpm(graph):
+    """Прямой и обратный проход метода критического пути.
+
+    Задачи без предшественников начинаются в свою дату начала (или в дату
+    начала проекта), остальные - как можно раньше по своим связям.
+    Возвращает (order, durations, es, ef, ls, lf) - массивы по позиции задачи
+    в топологическом порядке; задачи в циклах в order не входят.
+    Проходы идут циклами Python по плоским спискам, а не векторами NumPy:
+    NumPy нет в зависимостях проекта, а у каждой задачи свое правило связи,
+    так что проход остается O(V+E).
+    """
+    order = graph.topological_order()
+    if not order:
+        return order, [], [], [], [], []
+
+    # Плотные массивы по позиции задачи в топологическом порядке
+    index = {task_id: i for i, task_id in enumerate(order)}
+    durations = [graph.tasks[task_id]['duration'] for task_id in order]
+    known_starts = [graph.tasks[task_id]['start'] for task_id in order if graph.tasks[task_id]['start'] is not None]
+    project_start = min(known_starts) if known_starts else date.today().toordinal()
+
+    preds = [[(index[p], kind, lag) for p, kind, lag in graph.predecessors[task_id] if p in index]
+             for task_id in order]
+    succs = [[(index[s], kind, lag) for s, kind, lag in graph.successors[task_id] if s in index]
+             for task_id in order]
+
+    # Прямой проход: ранние даты
+    count = len(order)
+    es = [0] * count
+    ef = [0] * count
+    for i in range(count):
+        duration = durations[i]
+        start = None
+        for p, kind, lag in preds[i]:
+            if kind == 'SS':
+                candidate = es[p] + lag
+            elif kind == 'FF':
+                candidate = ef[p] + lag - (duration - 1)
+            elif kind == 'SF':
+                candidate = es[p] + lag - (duration - 1)
+            else:
+                candidate = ef[p] + 1 + lag
+            if start is None or candidate > start:
+                start = candidate
+        if start is None:
+            own_start = graph.tasks[order[i]]['start']
+            start = own_start if own_start is not None else project_start
+        es[i] = start
+        ef[i] = start + duration - 1
+
+    # Обратный проход: поздние даты
+    project_finish = max(ef)
+    lf = [0] * count
+    ls = [0] * count
+    for i in range(count - 1, -1, -1):
+        duration = durations[i]
+        finish = None
+        for s, kind, lag in succs[i]:
+            if kind == 'SS':
+                candidate = ls[s] - lag + duration - 1
+            elif kind == 'FF':
+                candidate = lf[s] - lag
+            elif kind == 'SF':
+                candidate = lf[s] - lag + duration - 1
+            else:
+                candidate = ls[s] - 1 - lag
+            if finish is None or candidate < finish:
+                finish = candidate
+        # Связи SS/SF ограничивают только начало предшественника: его окончание
+        # все равно не может быть позже окончания проекта
+        if finish is None or finish > project_finish:
+            finish = project_finish
+        lf[i] = finish
+        ls[i] = finish - duration + 1
+
+    return order, durations, es, ef, ls, lf
+
+
+def critical_path(graph):
+    """Метод критического пути: прямой и обратный проход по графу проекта.
+
+    Возвращает словарь с ES/EF/LS/LF и полным резервом каждой задачи,
+    критической цепочкой и списком задач, попавших в циклы.
+    """
+    order, durations, es, ef, ls, lf = _cpm(graph)
+    if not order:
+        return {'project_start': None, 'project_finish': None, 'tasks': [],
+                'critical_path': [], 'cycles': sorted(graph.tasks)}
+
+    index = {task_id: i for i, task_id in enumerate(order)}
+    project_finish = max(ef)
+    tasks = []
+    chain = []
+    for i, task_id in enumerate(order):
+        total_float = ls[i] - es[i]
+        critical = total_float <= 0
+        tasks.append({
+            'id': task_id,
+            'title': graph.tasks[task_id].get('title'),
+            'duration': durations[i],
+            'early_start': format_date(es[i]),
+            'early_finish': format_date(ef[i]),
+            'late_start': format_date(ls[i]),
+            'late_finish': format_date(lf[i]),
+            'total_float': total_float,
+            'critical': critical,
+        })
+        if critical:
+            chain.append((es[i], task_id))
+
+    return {
+        'project_start': format_date(min(es)),
+        'project_finish': format_date(project_finish),
+        'tasks': tasks,
+        'critical_path': [task_id for _, task_id in sorted(chain)],
+        'cycles': sorted(set(graph.tasks) - set(index)),
+    }
+
+
+def _load_successors(conn, project_id, task_ids):
+    """Последователи задач task_ids из проекта project_id по индексу idx_task_dependencies_predecessor.
+
+    Старое поле dependencies перенесено в task_dependencies миграцией 4, поэтому
+    обратный поиск идет только по таблице связей. Возвращает список (predecessor_id, task_id, тип связи, статус последователя).
+    """
+    result = []
+    for chunk in _chunks(task_ids):
+        rows = conn.execute(f'''
+            SELECT td.predecessor_id, td.task_id, td.dependency_type, t.status
+            FROM task_dependencies td
+            JOIN tasks t ON td.task_id = t.id
+            WHERE td.predecessor_id IN ({_placeholders(chunk)}) AND t.project_id = ?
+        ''', chunk + [project_id]).fetchall()
+        result.extend((r['predecessor_id'], r['task_id'], (r['dependency_type'] or 'FS').upper(), r['status'])
+                      for r in rows)
+    return result
+
+
+def _load_predecessor_statuses(conn, task_ids):
+    """task_id -> [(тип связи, predecessor_id, статус предшественника)]"""
+    result = {}
+    for chunk in _chunks(task_ids):
+        rows = conn.execute(f'''
+            SELECT td.task_id, td.dependency_type, td.predecessor_id, t.status
+            FROM task_dependencies td
+            JOIN tasks t ON td.predecessor_id = t.id
+            WHERE td.task_id IN ({_placeholders(chunk)})
+        ''', chunk).fetchall()
+        for r in rows:
+            result.setdefault(r['task_id'], []).append(
+                ((r['dependency_type'] or 'FS').upper(), r['predecessor_id'], r['status']))
+    return result
+
+
+def _status_transition(dependency_type, new_status, dependent_status):
+    """Новый статус зависимой задачи по правилам FS/SS/FF/SF (или None).
+
+    Возвращает (статус, требуется_проверка) - для отката SS/FF нужно убедиться,
+    что у задачи не осталось других "держащих" предшественников.
+    """
+    if dependency_type == 'FS':
+        # F-S: Когда задача завершена, следующая задача может начаться
+        if new_status == 'completed' and dependent_status == 'planned':
+            return 'in_progress', None
+    elif dependency_type == 'SS':
+        # S-S: Когда задача начинается, следующая задача тоже начинается
+        if new_status == 'in_progress' and dependent_status == 'planned':
+            return 'in_progress', None
+        # S-S: Если задача возвращается в planned, зависимая тоже возвращается
+        if new_status == 'planned' and dependent_status == 'in_progress':
+            return 'planned', ('SS', 'in_progress')
+    elif dependency_type == 'FF':
+        # F-F: Когда задача завершена, следующая задача тоже завершается
+        if new_status == 'completed' and dependent_status == 'in_progress':
+            return 'completed', None
+        # F-F: Если задача возвращается из completed, зависимая тоже возвращается
+        if new_status == 'in_progress' and dependent_status == 'completed':
+            return 'in_progress', ('FF', 'completed')
+    elif dependency_type == 'SF':
+        # S-F: Когда задача начинается, следующая задача завершается
+        if new_status == 'in_progress' and dependent_status == 'in_progress':
+            return 'completed', None
+    return None, None
+
+
+def propagate_status(conn, task_id, new_status):
+    """Распространяет смену статуса задачи на зависимые задачи (транзитивно).
+
+    Последователи загружаются пачкой на каждый уровень графа, все переходы
+    применяются одним executemany. Каждая задача меняет статус не более одного
+    раза, поэтому циклы в связях не приводят к зацикливанию.
+    commit делает вызывающий код. Возвращает {task_id: новый статус}.
+    """
+    row = conn.execute('SELECT project_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    if not row:
+        return {}
+    return propagate_statuses(conn, row['project_id'], {task_id: new_status})
+
+
+def propagate_statuses(conn, project_id, new_statuses):
+    """То же для нескольких задач сразу ({task_id: новый статус}), одним проходом по уровням"""
+    statuses = dict(new_statuses)
+    changes = {}
+    frontier = dict(new_statuses)
+
+    while frontier:
+        edges = _load_successors(conn, project_id, frontier.keys())
+        for _, succ, _, status in edges:
+            statuses.setdefault(succ, status)
+
+        candidates = {}
+        for pred, succ, dependency_type, _ in edges:
+            if succ in changes or succ in new_statuses or succ in candidates:
+                continue
+            target, guard = _status_transition(dependency_type, frontier[pred], statuses[succ])
+            if target:
+                candidates[succ] = (target, guard)
+
+        guarded = [succ for succ, (_, guard) in candidates.items() if guard]
+        predecessors = _load_predecessor_statuses(conn, guarded) if guarded else {}
+
+        next_frontier = {}
+        for succ, (target, guard) in candidates.items():
+            if guard:
+                guard_type, guard_status = guard
+                # Откат только если больше ни один предшественник того же типа его не "держит"
+                if any(kind == guard_type and statuses.get(pred_id, status) == guard_status
+                       for kind, pred_id, status in predecessors.get(succ, [])):
+                    continue
+            statuses[succ] = target
+            changes[succ] = target
+            next_frontier[succ] = target
+        frontier = next_frontier
+
+    if changes:
+        conn.executemany('UPDATE tasks SET status = ? WHERE id = ?',
+                         [(status, changed_id) for changed_id, status in changes.items()])
+    return changes
+
+
+# Порядок выравнивания: задачи с более высоким приоритетом занимают исполнителя первыми
+PRIORITY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+# Начатые и завершенные задачи выравнивание не сдвигает
+LEVELING_FIXED_STATUSES = ('in_progress', 'completed')
+
+
+def load_assignments(conn, project_id):
+    """task_id -> [user_id] исполнителей всех задач проекта одним запросом"""
+    rows = conn.execute('''
+        SELECT ta.task_id, ta.user_id
+        FROM task_assignees ta
+        JOIN tasks t ON ta.task_id = t.id
+        WHERE t.project_id = ?
+    ''', (project_id,)).fetchall()
+    result = {}
+    for row in rows:
+        result.setdefault(row['task_id'], []).append(row['user_id'])
+    return result
+
+
+def _reserve(usage, users, start, end):
+    for user_id in users:
+        days = usage.setdefault(user_id, {})
+        for day in range(start, end + 1):
+            days[day] = days.get(day, 0) + 1
+
+
+def _find_slot(usage, users, earliest, latest, duration, capacity):
+    """Первое начало в [earliest, latest], при котором всем users хватает capacity.
+
+    Окно проверяется с конца: найдя занятый день, поиск сразу прыгает за него.
+    """
+    start = earliest
+    while start <= latest:
+        conflict = None
+        for day in range(start + duration - 1, start - 1, -1):
+            if any(usage.get(user_id, {}).get(day, 0) >= capacity for user_id in users):
+                conflict = day
+                break
+        if conflict is None:
+            return start
+        start = conflict + 1
+    return None
+
+
+def _overallocations(usage, capacity):
+    """Отрезки дней, где у исполнителя больше capacity задач"""
+    result = []
+    for user_id, days in sorted(usage.items()):
+        span = None
+        for day in sorted(day for day, count in days.items() if count > capacity):
+            if span and day == span['end'] + 1:
+                span['end'] = day
+                span['peak'] = max(span['peak'], days[day])
+            else:
+                span = {'user_id': user_id, 'start': day, 'end': day, 'peak': days[day]}
+                result.append(span)
+    return result
+
+
+def level_resources(graph, assignments, capacity=1):
+    """Выравнивание ресурсов эвристикой последовательного планирования.
+
+    Критические (без резерва), начатые, завершенные и попавшие в циклы задачи
+    остаются на месте и резервируют исполнителей первыми. Остальные задачи
+    берутся по готовности (все предшественники уже размещены) в порядке
+    приоритета и резерва и ставятся в первый день, начиная с текущей даты и
+    ограничения по связям, когда у всех исполнителей есть свободная емкость.
+    Позже позднего начала (LS) задача не сдвигается - срок проекта не меняется,
+    и не позже даты, которую допускают фактические даты неподвижных
+    последователей (связи с ними не нарушаются).
+    Задачи, которым места не нашлось, остаются в самой ранней допустимой дате.
+
+    Возвращает {'changes': {task_id: (start, end)}, 'unresolved': [task_id],
+    'overallocated': [{'user_id', 'start', 'end', 'peak'}]} с датами-ординалами.
+    """
+    order, durations, es, ef, ls, lf = _cpm(graph)
+    index = {task_id: i for i, task_id in enumerate(order)}
+    dates = {task_id: (task['start'], task['end']) for task_id, task in graph.tasks.items()}
+
+    def movable(task_id):
+        task = graph.tasks[task_id]
+        i = index.get(task_id)
+        return (i is not None and task['start'] is not None
+                and task.get('status') not in LEVELING_FIXED_STATUSES
+                and ls[i] - es[i] > 0)
+
+    # Самое позднее начало по фактическим датам неподвижных последователей,
+    # в том числе через цепочки подвижных задач (обратный проход)
+    deadlines = {}
+    for task_id in reversed(order):
+        if not movable(task_id):
+            continue
+        duration = graph.tasks[task_id]['duration']
+        deadline = None
+        for succ, dependency_type, lag in graph.successors[task_id]:
+            if succ not in index:
+                continue
+            if movable(succ):
+                succ_start = deadlines.get(succ)
+                succ_end = succ_start + graph.tasks[succ]['duration'] - 1 if succ_start is not None else None
+            else:
+                succ_start, succ_end = dates[succ]
+            candidate = latest_start_before(dependency_type, lag, duration, succ_start, succ_end)
+            if candidate is not None and (deadline is None or candidate < deadline):
+                deadline = candidate
+        if deadline is not None:
+            deadlines[task_id] = deadline
+
+    usage = {}
+    for task_id, (start, end) in dates.items():
+        if start is not None and not movable(task_id):
+            _reserve(usage, assignments.get(task_id, ()), start, end if end is not None else start)
+
+    def ready_key(task_id):
+        i = index[task_id]
+        rank = PRIORITY_RANK.get(graph.tasks[task_id].get('priority'), len(PRIORITY_RANK))
+        return (rank, ls[i] - es[i], dates[task_id][0] or es[i], task_id)
+
+    waiting = {task_id: sum(1 for pred, _, _ in graph.predecessors[task_id] if pred in index)
+               for task_id in order}
+    ready = [ready_key(task_id) for task_id, count in waiting.items() if count == 0]
+    heapq.heapify(ready)
+
+    changes = {}
+    unresolved = []
+    while ready:
+        task_id = heapq.heappop(ready)[-1]
+        i = index[task_id]
+
+        if movable(task_id):
+            duration = durations[i]
+            current = dates[task_id][0]
+            constraint = constrained_start(graph, task_id, dates)
+            earliest = max(current, constraint) if constraint is not None else current
+            latest = ls[i] if task_id not in deadlines else min(ls[i], deadlines[task_id])
+            latest = max(earliest, latest)
+            users = assignments.get(task_id, ())
+            start = _find_slot(usage, users, earliest, latest, duration, capacity) if users else earliest
+            if start is None:
+                start = earliest
+                unresolved.append(task_id)
+            end = start + duration - 1
+            _reserve(usage, users, start, end)
+            if (start, end) != dates[task_id]:
+                dates[task_id] = (start, end)
+                changes[task_id] = (start, end)
+
+        for succ, _, _ in graph.successors[task_id]:
+            if succ in waiting:
+                waiting[succ] -= 1
+                if waiting[succ] == 0:
+                    heapq.heappush(ready, ready_key(succ))
+
+    return {
+        'changes': changes,
+        'unresolved': unresolved,
+        'overallocated': _overallocations(usage, capacity),
+    }
+
+
+def level_project(conn, project_id, capacity=1, apply=False):
+    """Выравнивание ресурсов проекта; apply=True - записать даты (commit делает вызывающий код).
+
+    Возвращает результат level_resources с датами в формате 'YYYY-MM-DD'.
+    """
+    graph = load_project_graph(conn, project_id)
+    result = level_resources(graph, load_assignments(conn, project_id), capacity)
+    if apply:
+        apply_schedule(conn, graph, result['changes'])
+
+    return {
+        'changes': {task_id: (format_date(start), format_date(end))
+                    for task_id, (start, end) in result['changes'].items()},
+        'unresolved': result['unresolved'],
+        'overallocated': [dict(span, start=format_date(span['start']), end=format_date(span['end']))
+                          for span in result['overallocated']],
+    }
@@ -32,8 +32,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 list: 'Список'
             },
             events: function(fetchInfo, successCallback, failureCallback) {
-                console.log('Loading calendar events...');
-                loadCalendarEvents(successCallback, failureCallback);
+                // Запрашиваем только видимый диапазон (месяц/неделя/день)
+                loadCalendarEvents(fetchInfo, successCallback, failureCallback);
             },
             eventClick: function(info) {
                 console.log('Event clicked:', info.event);
@@ -45,16 +45,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 openCreateEventModal(info.dateStr);
             },
             eventDidMount: function(info) {
-                console.log('Event mounted:', info.event); // Отладочная информация
-                
                 const props = info.event.extendedProps;
                 const eventType = props.event_type;
                 const isMilestone = eventType === 'milestone';
                 const isCustom = eventType === 'custom' || props.source === 'custom';
                 const isTask = eventType === 'task';
                 
-                console.log('Event props:', props); // Отладочная информация
-                
                 // Добавляем классы для разных типов событий
                 if (isMilestone) {
                     info.el.classList.add('fc-event-milestone');
@@ -113,8 +109,12 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Загрузка событий для календаря
-    function loadCalendarEvents(successCallback, failureCallback) {
-        fetch('/api/calendar/events')
+    function loadCalendarEvents(fetchInfo, successCallback, failureCallback) {
+        const params = new URLSearchParams({
+            start: fetchInfo.startStr.slice(0, 10),
+            end: fetchInfo.endStr.slice(0, 10)
+        });
+        fetch(`/api/calendar/events?${params}`)
             .then(response => {
                 if (!response.ok) {
                     throw new Error('Network response was not ok');
@@ -122,7 +122,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 return response.json();
             })
             .then(events => {
-                console.log('Loaded events:', events);
                 allEvents = events;
                 const filteredEvents = filterEvents(allEvents);
                 successCallback(filteredEvents);
@@ -173,10 +172,8 @@ document.addEventListener('DOMContentLoaded', function() {
         const filterInputs = document.querySelectorAll('.calendar-filters input');
         filterInputs.forEach(input => {
             input.addEventListener('change', function() {
-                console.log('Filter changed, updating calendar...');
-                const filteredEvents = filterEvents(allEvents);
-                calendar.removeAllEvents();
-                calendar.addEventSource(filteredEvents);
+                // Статический источник пережил бы смену месяца - перезапрашиваем окно
+                calendar.refetchEvents();
             });
         });
     }
@@ -359,7 +356,8 @@ document.addEventListener('DOMContentLoaded', function() {
             description: formData.get('description'),
             start_date: formData.get('start_date'),
             event_type: formData.get('event_type'),
-            color: formData.get('color')
+            color: formData.get('color'),
+            recurrence_rule: formData.get('recurrence_rule') || null
         };
         
         // Настройка параметров времени
@@ -483,7 +481,10 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // В функции showEventDetails замените блок удаления:
             deleteEventBtn.onclick = function() {
-                if (confirm('Вы уверены, что хотите удалить это событие?')) {
+                const question = props.recurrence_rule
+                    ? 'Это повторяющееся событие. Удалить все его повторы?'
+                    : 'Вы уверены, что хотите удалить это событие?';
+                if (confirm(question)) {
                     deleteCalendarEvent(event.id);
                 }
             };
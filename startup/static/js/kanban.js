@@ -190,8 +190,7 @@ async function updateTaskStatus(taskId, newStatus) {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                status: newStatus,
-                position: 0
+                status: newStatus
             })
         });
     } catch (error) {
@@ -264,8 +263,7 @@ async function saveTaskChanges() {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    status: status,
-                    position: 0
+                    status: status
                 })
             });
         }
@@ -1,4 +1,7 @@
 // static/js/team_tasks.js
+// Сколько задач запрашивать за одну страницу
+const TEAM_TASKS_PAGE_SIZE = 100;
+
 class TeamTasksManager {
     constructor(projectId) {
         this.projectId = projectId;
@@ -7,6 +10,10 @@ class TeamTasksManager {
             status: 'all'
         };
         this.currentTaskId = null; // Для отслеживания текущей редактируемой задачи
+        this.tasks = []; // Загруженные страницы задач
+        this.nextCursor = null; // Курсор следующей страницы (null - загружено все)
+        this.listVersion = 0; // Увеличивается при перезагрузке списка, чтобы отбросить старые ответы
+        this.loadingPage = false;
         this.init();
     }
 
@@ -28,6 +35,17 @@ class TeamTasksManager {
             this.applyFilters();
         });
 
+        // Следующая страница задач: по кнопке или когда кнопка видна при прокрутке
+        const loadMoreBtn = document.getElementById('loadMoreTasksBtn');
+        loadMoreBtn.addEventListener('click', () => this.loadMoreTasks());
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    this.loadMoreTasks();
+                }
+            }).observe(loadMoreBtn);
+        }
+
         // Кнопка назначения задачи
         document.getElementById('assignTaskBtn').addEventListener('click', () => {
             this.openAssignModal();
@@ -77,38 +95,73 @@ class TeamTasksManager {
         });
     }
 
+    // Первая страница заменяет список (в том числе после изменения задач)
     async loadTeamTasks() {
+        this.listVersion++;
+        this.loadingPage = false;
+        await this.loadTasksPage(true);
+    }
+
+    // Следующая страница добавляется к уже показанным карточкам
+    async loadMoreTasks() {
+        if (this.nextCursor && !this.loadingPage) {
+            await this.loadTasksPage(false);
+        }
+    }
+
+    async loadTasksPage(reset) {
+        const version = this.listVersion;
+        this.loadingPage = true;
         try {
-            const response = await fetch(`/api/project/${this.projectId}/team/tasks`);
+            const params = new URLSearchParams({ limit: TEAM_TASKS_PAGE_SIZE });
+            if (!reset) {
+                params.set('cursor', this.nextCursor);
+            }
+            const response = await fetch(`/api/project/${this.projectId}/team/tasks?${params}`);
             const data = await response.json();
             
-            if (data.success) {
-                this.renderTeamTasks(data.tasks);
-                this.updateStats(data.stats);
-            } else {
+            if (version !== this.listVersion) {
+                return; // Список уже перезагружен
+            }
+            if (!data.success) {
                 console.error('Ошибка загрузки задач:', data.error);
+                return;
             }
+            
+            this.tasks = reset ? data.tasks : this.tasks.concat(data.tasks);
+            this.renderTeamTasks(data.tasks, !reset);
+            if (data.stats) {
+                this.updateStats(data.stats);
+            }
+            this.nextCursor = data.next_cursor || null;
+            document.getElementById('loadMoreTasksBtn').style.display = this.nextCursor ? 'inline-block' : 'none';
         } catch (error) {
             console.error('Ошибка:', error);
+        } finally {
+            if (version === this.listVersion) {
+                this.loadingPage = false;
+            }
         }
     }
 
-    renderTeamTasks(tasks) {
+    renderTeamTasks(tasks, append = false) {
         // Группируем задачи по исполнителям
         const tasksByMember = this.groupTasksByMember(tasks);
         
-        // Очищаем контейнеры задач
-        document.querySelectorAll('.member-tasks').forEach(container => {
-            container.innerHTML = '';
-        });
+        // Очищаем контейнеры задач (при догрузке страницы карточки только добавляются)
+        if (!append) {
+            document.querySelectorAll('.member-tasks').forEach(container => {
+                container.innerHTML = '';
+            });
+        }
 
         // Рендерим задачи для каждого участника
         Object.entries(tasksByMember).forEach(([userId, userTasks]) => {
-            this.renderMemberTasks(userId, userTasks);
+            this.renderMemberTasks(userId, userTasks, append);
         });
 
-        // Обновляем счетчики задач
-        this.updateTaskCounts(tasksByMember);
+        // Обновляем счетчики задач по всем загруженным страницам
+        this.updateTaskCounts(this.groupTasksByMember(this.tasks));
     }
 
     groupTasksByMember(tasks) {
@@ -127,16 +180,18 @@ class TeamTasksManager {
     }
 
     // ✅ ОБНОВЛЯЕМ: Рендеринг карточек с кнопками действий
-    renderMemberTasks(userId, tasks) {
+    renderMemberTasks(userId, tasks, append = false) {
         const container = document.getElementById(`tasks-${userId}`);
         if (!container) return;
 
         if (tasks.length === 0) {
-            container.innerHTML = '<div class="empty-tasks">Нет назначенных задач</div>';
+            if (!append) {
+                container.innerHTML = '<div class="empty-tasks">Нет назначенных задач</div>';
+            }
             return;
         }
 
-        container.innerHTML = tasks.map(task => `
+        const html = tasks.map(task => `
             <div class="task-card ${task.status}" 
                  onclick="teamTasksManager.openTaskEdit(${task.id})">
                 <div class="task-actions">
@@ -159,6 +214,12 @@ class TeamTasksManager {
                 </div>
             </div>
         `).join('');
+
+        if (append) {
+            container.insertAdjacentHTML('beforeend', html);
+        } else {
+            container.innerHTML = html;
+        }
     }
 
     updateTaskCounts(tasksByMember) {
@@ -440,8 +501,7 @@ class TeamTasksManager {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    status: taskData.status,
-                    position: 0
+                    status: taskData.status
                 })
             });
 
@@ -535,8 +595,7 @@ class TeamTasksManager {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    status: newStatus,
-                    position: 0
+                    status: newStatus
                 })
             });
             
@@ -0,0 +1,212 @@
+# task_queries.py
+"""Фильтры и постраничная выборка (keyset) для API списков задач.
+
+Постраничный режим включается параметрами limit/cursor или любым фильтром,
+без них обработчики отдают полный список, как раньше. Курсор - ключ сортировки
+последней отданной строки, поэтому следующая страница начинается поиском по
+индексу, а не пропуском OFFSET строк.
+"""
+import base64
+import json
+import os
+import re
+
+TASKS_PAGE_SIZE = int(os.environ.get('TASKS_PAGE_SIZE', 100))
+TASKS_PAGE_SIZE_MAX = int(os.environ.get('TASKS_PAGE_SIZE_MAX', 500))
+# Точное число строк считается до этого предела, дальше - только "больше чем"
+TASKS_COUNT_LIMIT = int(os.environ.get('TASKS_COUNT_LIMIT', 10000))
+
+# Порядки сортировки: имя -> столбцы ключа (последний - уникальный id)
+SORTS = {
+    'position': ('t.status', 't.position', 't.id'),  # idx_tasks_project_status_position
+    'start_date': ('t.start_date', 't.id'),          # idx_tasks_project_start
+    'id': ('t.id',),
+}
+
+STATUSES = ('planned', 'in_progress', 'completed')
+PRIORITIES = ('low', 'medium', 'high', 'critical')
+FILTER_PARAMS = ('status', 'assignee', 'priority', 'from', 'to', 'q')
+
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def encode_cursor(sort, values):
+    raw = json.dumps({'s': sort, 'k': list(values)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = data['k']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if data.get('s') != sort or len(values) != len(SORTS[sort]):
+        raise ValueError('Cursor does not match sort order')
+    return values
+
+
+def _split(value, allowed, name):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    for item in items:
+        if item not in allowed:
+            raise ValueError(f'Invalid {name}: {item}')
+    return items
+
+
+def parse_listing(args, default_sort):
+    """Разбирает параметры списка; None, если клиент не просил страницы или фильтры.
+
+    Ошибки в параметрах - ValueError с текстом для ответа 400.
+    """
+    if not any(name in args for name in ('limit', 'cursor', 'sort') + FILTER_PARAMS):
+        return None
+
+    limit = args.get('limit', TASKS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, TASKS_PAGE_SIZE_MAX))
+
+    sort = args.get('sort', default_sort)
+    if sort not in SORTS:
+        raise ValueError(f'Invalid sort: {sort}')
+
+    cursor = decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+
+    filters = {}
+    if args.get('status'):
+        filters['status'] = _split(args['status'], STATUSES, 'status')
+    if args.get('priority'):
+        filters['priority'] = _split(args['priority'], PRIORITIES, 'priority')
+    if args.get('assignee'):
+        assignee = args['assignee']
+        if assignee != 'me' and not assignee.isdigit():
+            raise ValueError('Invalid assignee')
+        filters['assignee'] = assignee
+    for name in ('from', 'to'):
+        if args.get(name):
+            if not _DATE_RE.match(args[name]):
+                raise ValueError(f'Invalid {name} date, expected YYYY-MM-DD')
+            filters[name] = args[name]
+    if args.get('q'):
+        filters['q'] = args['q'].strip()[:200]
+
+    return {'limit': limit, 'sort': sort, 'cursor': cursor, 'filters': filters}
+
+
+def _filter_clauses(filters, user_id):
+    clauses, params = [], []
+    if 'status' in filters:
+        clauses.append(f"t.status IN ({','.join('?' * len(filters['status']))})")
+        params.extend(filters['status'])
+    if 'priority' in filters:
+        clauses.append(f"t.priority IN ({','.join('?' * len(filters['priority']))})")
+        params.extend(filters['priority'])
+    if 'assignee' in filters:
+        # Поиск по idx_task_assignees_user, без GROUP_CONCAT по всему проекту
+        clauses.append('t.id IN (SELECT task_id FROM task_assignees WHERE user_id = ?)')
+        params.append(user_id if filters['assignee'] == 'me' else int(filters['assignee']))
+    # Окно дат: задачи, пересекающиеся с [from, to]
+    if 'from' in filters:
+        clauses.append('t.end_date >= ?')
+        params.append(filters['from'])
+    if 'to' in filters:
+        clauses.append('t.start_date <= ?')
+        params.append(filters['to'])
+    if 'q' in filters:
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', filters['q']) + '%'
+        clauses.append("(t.title LIKE ? ESCAPE '\\' OR t.description LIKE ? ESCAPE '\\')")
+        params.extend([pattern, pattern])
+    return clauses, params
+
+
+def _keyset_clause(columns, values):
+    """Условие "ключ строки больше курсора" для сортировки по возрастанию"""
+    if all(value is not None for value in values):
+        # Сравнение row values SQLite выполняет поиском по индексу
+        return f"({', '.join(columns)}) > ({', '.join('?' * len(values))})", list(values)
+
+    # В ключе есть NULL (в SQLite он меньше любых значений): раскрываем сравнение вручную
+    alternatives, params = [], []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        parts = []
+        for prev_column, prev_value in zip(columns[:i], values[:i]):
+            if prev_value is None:
+                parts.append(f'{prev_column} IS NULL')
+            else:
+                parts.append(f'{prev_column} = ?')
+                params.append(prev_value)
+        if value is None:
+            parts.append(f'{column} IS NOT NULL')
+        else:
+            parts.append(f'{column} > ?')
+            params.append(value)
+        alternatives.append('(' + ' AND '.join(parts) + ')')
+    return '(' + ' OR '.join(alternatives) + ')', params
+
+
+def fetch_page(conn, listing, base_from, base_where, base_params, columns, user_id):
+    """Одна страница задач по разобранным параметрам listing.
+
+    base_from/base_where/base_params - источник и условия конкретного API
+    (таблица задач должна называться t). Возвращает словарь со строками,
+    курсором следующей страницы и подсказкой об общем числе строк (только
+    для первой страницы).
+    """
+    keys = SORTS[listing['sort']]
+    filter_clauses, filter_params = _filter_clauses(listing['filters'], user_id)
+    where = [base_where] + filter_clauses
+    params = list(base_params) + filter_params
+
+    page_where, page_params = list(where), list(params)
+    if listing['cursor'] is not None:
+        clause, clause_params = _keyset_clause(keys, listing['cursor'])
+        page_where.append(clause)
+        page_params.extend(clause_params)
+
+    key_columns = ', '.join(f'{key} AS _k{i}' for i, key in enumerate(keys))
+    rows = conn.execute(f'''
+        SELECT {columns}, {key_columns}
+        {base_from}
+        WHERE {' AND '.join(page_where)}
+        ORDER BY {', '.join(keys)}
+        LIMIT ?
+    ''', page_params + [listing['limit'] + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > listing['limit']:
+        rows = rows[:listing['limit']]
+        last = rows[-1]
+        next_cursor = encode_cursor(listing['sort'], [last[f'_k{i}'] for i in range(len(keys))])
+
+    total = None
+    total_is_estimate = False
+    if listing['cursor'] is None:
+        total = conn.execute(f'''
+            SELECT COUNT(*) FROM (SELECT 1 {base_from} WHERE {' AND '.join(where)} LIMIT ?)
+        ''', params + [TASKS_COUNT_LIMIT + 1]).fetchone()[0]
+        if total > TASKS_COUNT_LIMIT:
+            total, total_is_estimate = TASKS_COUNT_LIMIT, True
+
+    return {
+        'rows': rows,
+        'next_cursor': next_cursor,
+        'total': total,
+        'total_is_estimate': total_is_estimate,
+    }
+
+
+def load_assignees(conn, task_ids):
+    """Исполнители задач одной страницы: {task_id: [{'id', 'username'}]}"""
+    result = {}
+    if not task_ids:
+        return result
+    rows = conn.execute('''
+        SELECT ta.task_id, u.id, u.username
+        FROM task_assignees ta
+        JOIN users u ON ta.user_id = u.id
+        WHERE ta.task_id IN (SELECT value FROM json_each(?))
+        ORDER BY ta.task_id, u.username
+    ''', (json.dumps(list(task_ids)),)).fetchall()
+    for row in rows:
+        result.setdefault(row['task_id'], []).append({'id': row['id'], 'username': row['username']})
+    return result
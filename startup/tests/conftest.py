@@ -0,0 +1,87 @@
+import atexit
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Модули приложения лежат в startup/ без пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Хеши паролей в потоке теста: пул процессов в тестах не нужен
+os.environ.setdefault('HASH_WORKERS', '0')
+
+import database  # noqa: E402
+
+# Временная база до первого импорта app: init_db и миграции выполняются при импорте
+_db_dir = tempfile.mkdtemp(prefix='app-tests-')
+atexit.register(shutil.rmtree, _db_dir, True)
+database.DATABASE = os.path.join(_db_dir, 'app.db')
+database.pool = database.ConnectionPool(database.DATABASE, database.DB_POOL_SIZE)
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app():
+    """Приложение на временной базе"""
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+def login(client, username, password):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302, response.status_code
+    return client
+
+
+@pytest.fixture
+def make_user(app):
+    """Создает пользователя: make_user() -> (id, username, пароль)"""
+    import database
+
+    def make(password='secret-1'):
+        username = f'user{next(_names)}'
+        with app.app_context():
+            user_id = database.create_user(username, f'{username}@example.com', password)
+        return user_id, username, password
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def client(app, user):
+    """Клиент, вошедший под user"""
+    return login(app.test_client(), user[1], user[2])
+
+
+@pytest.fixture
+def project_id(app, user):
+    """Проект, которым владеет user"""
+    import database
+    with app.app_context():
+        conn = database.get_db_connection()
+        cursor = conn.execute('INSERT INTO projects (name, description, user_id) VALUES (?, ?, ?)',
+                              ('Проект', '', user[0]))
+        conn.commit()
+        conn.close()
+    return cursor.lastrowid
+
+
+@pytest.fixture
+def db(app):
+    """Соединение из пула приложения вне контекста приложения.
+
+    Открытый контекст приложения запросы тестового клиента использовали бы
+    повторно (вместе с g), поэтому соединение берется из пула напрямую.
+    """
+    conn = database.get_db_connection()
+    yield conn
+    conn.rollback()
+    conn.close()
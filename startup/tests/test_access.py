@@ -0,0 +1,57 @@
+import access
+from access import project_role, role_cache, task_project_cache
+from conftest import login
+
+
+def test_role_is_cached_and_reset_by_membership_changes(app, db, client, user, make_user, project_id):
+    outsider_id, username, password = make_user()
+    outsider = login(app.test_client(), username, password)
+    stats_url = f'/api/project/{project_id}/stats'
+
+    assert outsider.get(stats_url).status_code == 404
+    # Отсутствие доступа тоже кешируется
+    assert role_cache.get((outsider_id, project_id)) == ''
+
+    assert client.post(f'/api/project/{project_id}/team', json={'user_id': outsider_id}).status_code == 200
+    assert role_cache.get((outsider_id, project_id)) is None
+    assert outsider.get(stats_url).status_code == 200
+    assert role_cache.get((outsider_id, project_id)) == 'member'
+
+    assert client.put(f'/api/project/{project_id}/team/{outsider_id}/role',
+                      json={'role': 'admin'}).status_code == 200
+    with app.app_context():
+        assert project_role(project_id, outsider_id) == 'admin'
+
+    assert client.delete(f'/api/project/{project_id}/team/{outsider_id}').status_code == 200
+    assert outsider.get(stats_url).status_code == 404
+
+
+def test_owner_role_and_missing_project(app, user, project_id):
+    with app.app_context():
+        assert project_role(project_id, user[0]) == 'owner'
+        assert project_role(10 ** 9, user[0]) is None
+
+
+def test_cached_role_is_served_without_query(app, user, project_id, monkeypatch):
+    with app.app_context():
+        project_role(project_id, user[0])
+    monkeypatch.setattr(access, 'get_db_connection', lambda: (_ for _ in ()).throw(AssertionError('query')))
+    with app.app_context():
+        assert project_role(project_id, user[0]) == 'owner'
+
+
+def test_task_guard_resolves_project_and_forgets_deleted_tasks(app, client, make_user, project_id):
+    created = client.post(f'/api/project/{project_id}/tasks:batch',
+                          json={'operations': [{'op': 'create', 'title': 'A'}]}).get_json()['created']
+    task_id = created[0]
+    _, username, password = make_user()
+    outsider = login(app.test_client(), username, password)
+
+    assert client.get(f'/api/task/{task_id}/assignees').status_code == 200
+    assert task_project_cache.get(task_id) == project_id
+    # Чужая задача неотличима от несуществующей
+    assert outsider.get(f'/api/task/{task_id}/assignees').status_code == 404
+
+    client.post(f'/api/project/{project_id}/tasks:batch', json={'operations': [{'op': 'delete', 'id': task_id}]})
+    assert task_project_cache.get(task_id) is None
+    assert client.get(f'/api/task/{task_id}/assignees').status_code == 404
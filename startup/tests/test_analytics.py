@@ -0,0 +1,120 @@
+from datetime import date
+
+import pytest
+
+import analytics
+from analytics import load_histogram, portfolio
+
+
+def add_task(db, project_id, user_ids, start_date, end_date, duration, status='planned', priority='medium'):
+    task_id = db.execute('''
+        INSERT INTO tasks (project_id, title, status, priority, start_date, end_date, duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (project_id, 'Задача', status, priority, start_date, end_date, duration)).lastrowid
+    db.executemany('INSERT INTO task_assignees (task_id, user_id) VALUES (?, ?)',
+                   [(task_id, user_id) for user_id in user_ids])
+    db.commit()
+    return task_id
+
+
+def window(start, end):
+    return {'from': date.fromisoformat(start), 'to': date.fromisoformat(end)}
+
+
+def loads(histogram):
+    return {item['user_id']: item['load'] for item in histogram['users']}
+
+
+def test_horizon_defaults_to_task_dates(db, user, project_id):
+    add_task(db, project_id, [user[0]], '2025-03-03', '2025-03-04', 2)
+    add_task(db, project_id, [user[0]], '2025-03-04', '2025-03-05', 1)
+    histogram = load_histogram(db, project_id)
+    assert histogram['horizon'] == {'start': '2025-03-03', 'end': '2025-03-05', 'days': 3}
+    # Вторая задача: 1 день работы на 2 календарных дня
+    assert loads(histogram)[user[0]] == [1.0, 1.5, 0.5]
+
+
+def test_tasks_are_clipped_at_window_edges(db, user, project_id):
+    # Начинается до окна и кончается после него: нагрузка в день по всей длине задачи
+    add_task(db, project_id, [user[0]], '2025-03-01', '2025-03-10', 5)
+    # Начинается до окна
+    add_task(db, project_id, [user[0]], '2025-02-27', '2025-03-04', 6)
+    # Кончается после окна
+    add_task(db, project_id, [user[0]], '2025-03-07', '2025-03-12', 3)
+    histogram = load_histogram(db, project_id, window('2025-03-03', '2025-03-08'))
+    assert histogram['horizon']['days'] == 6
+    assert loads(histogram)[user[0]] == [1.5, 1.5, 0.5, 0.5, 1.0, 1.0]
+
+
+def test_tasks_outside_window_and_without_dates_are_ignored(db, user, make_user, project_id):
+    other = make_user()
+    add_task(db, project_id, [other[0]], '2025-01-01', '2025-01-31', 20)
+    add_task(db, project_id, [other[0]], None, None, 3)
+    add_task(db, project_id, [user[0]], '2025-03-03', '2025-03-03', 1)
+    histogram = load_histogram(db, project_id, window('2025-03-01', '2025-03-05'))
+    assert list(loads(histogram)) == [user[0]]
+
+
+def test_single_day_window(db, user, project_id):
+    add_task(db, project_id, [user[0]], '2025-03-01', '2025-03-04', 2)
+    histogram = load_histogram(db, project_id, window('2025-03-04', '2025-03-04'))
+    assert loads(histogram)[user[0]] == [0.5]
+
+
+def test_each_assignee_gets_full_task_load(db, user, make_user, project_id):
+    other = make_user()
+    add_task(db, project_id, [user[0], other[0]], '2025-03-03', '2025-03-04', 2)
+    histogram = load_histogram(db, project_id, window('2025-03-03', '2025-03-04'))
+    assert loads(histogram) == {user[0]: [1.0, 1.0], other[0]: [1.0, 1.0]}
+    assert {item['username'] for item in histogram['users']} == {user[1], other[1]}
+
+
+def test_overallocated_spans(db, user, project_id):
+    add_task(db, project_id, [user[0]], '2025-03-03', '2025-03-07', 5)
+    add_task(db, project_id, [user[0]], '2025-03-04', '2025-03-05', 2)
+    histogram = load_histogram(db, project_id, window('2025-03-03', '2025-03-07'))
+    item = histogram['users'][0]
+    assert item['peak'] == 2.0
+    assert item['overallocated'] == [{'start': '2025-03-04', 'end': '2025-03-05', 'days': 2, 'peak': 2.0}]
+    relaxed = load_histogram(db, project_id, window('2025-03-03', '2025-03-07'), capacity=2.0)
+    assert relaxed['users'][0]['overallocated'] == []
+
+
+def test_empty_project_and_too_long_window(db, project_id, monkeypatch):
+    assert load_histogram(db, project_id)['users'] == []
+    monkeypatch.setattr(analytics, 'HISTOGRAM_MAX_DAYS', 10)
+    with pytest.raises(ValueError):
+        load_histogram(db, project_id, window('2025-03-01', '2025-03-11'))
+
+
+def portfolio_item(db, user_id, project_id, today):
+    return next(item for item in portfolio(db, user_id, today=date.fromisoformat(today))
+                if item['id'] == project_id)
+
+
+def test_portfolio_counts_overdue_at_read_time(db, user, project_id):
+    add_task(db, project_id, [], '2025-03-01', '2025-03-05', 5)
+    add_task(db, project_id, [], '2025-03-01', '2025-03-10', 5, status='in_progress')
+    add_task(db, project_id, [], '2025-03-01', '2025-03-02', 2, status='completed')
+    add_task(db, project_id, [], None, None, 1)
+    # Просрочены незавершенные задачи с окончанием раньше сегодняшнего дня
+    assert portfolio_item(db, user[0], project_id, '2025-03-05')['overdue'] == 0
+    assert portfolio_item(db, user[0], project_id, '2025-03-06')['overdue'] == 1
+    assert portfolio_item(db, user[0], project_id, '2025-03-11')['overdue'] == 2
+
+
+def test_portfolio_lists_owned_and_member_projects(db, user, make_user, project_id):
+    member = make_user()
+    db.execute('INSERT INTO project_members (project_id, user_id, role) VALUES (?, ?, ?)',
+               (project_id, member[0], 'member'))
+    db.commit()
+    add_task(db, project_id, [], '2025-03-03', '2025-03-04', 2, status='completed')
+    add_task(db, project_id, [], '2025-03-01', '2025-03-07', 4, status='in_progress')
+
+    owned = portfolio_item(db, user[0], project_id, '2025-03-01')
+    shared = portfolio_item(db, member[0], project_id, '2025-03-01')
+    assert owned['is_owner'] and not shared['is_owner']
+    assert owned['status_counts'] == {'planned': 0, 'in_progress': 1, 'completed': 1}
+    assert (owned['task_count'], owned['progress'], owned['total_duration']) == (2, 50.0, 6)
+    assert (owned['project_start'], owned['project_end']) == ('2025-03-01', '2025-03-07')
+    assert portfolio(db, make_user()[0]) == []
@@ -0,0 +1,98 @@
+import pytest
+
+import cache
+import database
+from auth import load_user
+from cache import LRUCache, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_ttl_cache_entries_expire(clock):
+    ttl_cache = TTLCache(max_size=4, ttl=30)
+    ttl_cache.set('a', 1)
+    clock.now += 29.9
+    assert ttl_cache.get('a') == 1
+    clock.now += 0.2
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.stats()['size'] == 0
+    assert (ttl_cache.hits, ttl_cache.misses) == (1, 1)
+
+
+def test_ttl_cache_zero_ttl_disables_cache():
+    ttl_cache = TTLCache(ttl=0)
+    ttl_cache.set('a', 1)
+    assert ttl_cache.get('a', 'default') == 'default'
+
+
+def test_caches_evict_least_recently_used():
+    for lru in (LRUCache(max_size=2), TTLCache(max_size=2, ttl=60)):
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        assert lru.get('b') is None
+        assert (lru.get('a'), lru.get('c')) == (1, 3)
+
+
+def test_invalidate_many():
+    ttl_cache = TTLCache(ttl=60)
+    for key in 'abc':
+        ttl_cache.set(key, key)
+    ttl_cache.invalidate_many(['a', 'c', 'missing'])
+    assert [ttl_cache.get(key) for key in 'abc'] == [None, 'b', None]
+
+
+def cached_user(app, user_id):
+    with app.app_context():
+        return load_user(str(user_id))
+
+
+def test_user_loader_serves_from_cache(app, user):
+    first = cached_user(app, user[0])
+    hits = database.user_cache.hits
+    assert cached_user(app, user[0]) is first
+    assert database.user_cache.hits == hits + 1
+
+
+def test_user_cache_keeps_direct_changes_until_ttl(app, db, user, clock):
+    database.user_cache.invalidate(user[0])
+    assert cached_user(app, user[0]).email == f'{user[1]}@example.com'
+    # Изменение в обход update_user_* видно только после USER_CACHE_TTL
+    db.execute('UPDATE users SET email = ? WHERE id = ?', ('direct@example.com', user[0]))
+    db.commit()
+    assert cached_user(app, user[0]).email == f'{user[1]}@example.com'
+    clock.now += database.USER_CACHE_TTL + 1
+    assert cached_user(app, user[0]).email == 'direct@example.com'
+
+
+@pytest.mark.parametrize('update, check', [
+    (lambda user_id: database.update_user_profile(user_id, f'renamed{user_id}', f'renamed{user_id}@example.com'),
+     lambda loaded: loaded.username.startswith('renamed')),
+    (lambda user_id: database.update_user_menu_position(user_id, 'top'),
+     lambda loaded: loaded.menu_position == 'top'),
+    (lambda user_id: database.update_user_password(user_id, 'new-secret'),
+     lambda loaded: database.verify_password_hash(loaded.password_hash, 'new-secret')[0]),
+])
+def test_update_user_functions_reset_cache(app, user, update, check):
+    before = cached_user(app, user[0])
+    with app.app_context():
+        update(user[0])
+    # Без ожидания TTL: запись сброшена, пользователь читается из базы заново
+    assert database.user_cache.get(user[0]) is None
+    after = cached_user(app, user[0])
+    assert after is not before
+    assert check(after)
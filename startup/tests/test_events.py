@@ -0,0 +1,69 @@
+import events
+from events import EventBus, stream
+
+
+def test_subscribe_returns_none_at_cap_and_unsubscribe_frees_slot():
+    bus = EventBus(max_subscribers=2, queue_size=4)
+    first = bus.subscribe(1)
+    second = bus.subscribe(2)
+    assert first is not None and second is not None
+    assert bus.subscribe(1) is None
+    bus.unsubscribe(first)
+    assert bus.subscribe(1) is not None
+    assert bus.stats()['subscribers'] == 2
+
+
+def test_default_cap_leaves_threads_for_requests():
+    assert 1 <= events.SSE_MAX_SUBSCRIBERS < events.WAITRESS_THREADS
+
+
+def test_overflow_clears_queue_and_stream_sends_resync():
+    bus = EventBus(max_subscribers=1, queue_size=2)
+    subscription = bus.subscribe(7)
+    for i in range(3):
+        bus.publish(7, 'task_updated', {'task_id': i})
+    assert subscription.overflowed
+    assert subscription.queue.empty()
+    assert bus.stats()['dropped'] == 1
+    # Переполненный клиент больше не получает событий до переподключения
+    bus.publish(7, 'task_updated', {'task_id': 3})
+    assert subscription.queue.empty()
+
+    body = list(stream(bus, subscription, heartbeat=0.01, max_seconds=1))
+    assert body[0] == 'retry: 3000\n\n'
+    assert body[1].startswith('event: resync\n')
+    assert bus.stats()['subscribers'] == 0
+
+
+def test_stream_delivers_published_events():
+    bus = EventBus(max_subscribers=1, queue_size=4)
+    subscription = bus.subscribe(3)
+    bus.publish(3, 'task_created', {'task_id': 5, 'revision': 9})
+    body = stream(bus, subscription, heartbeat=0.01, max_seconds=1)
+    assert next(body) == 'retry: 3000\n\n'
+    assert next(body) == 'id: 9\nevent: task_created\ndata: {"task_id":5,"revision":9}\n\n'
+    body.close()
+    assert bus.stats()['subscribers'] == 0
+
+
+def test_events_route_returns_503_over_limit(app, client, project_id, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module.event_bus, 'max_subscribers', 0)
+    response = client.get(f'/api/project/{project_id}/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+
+
+def test_team_task_creation_is_published(app, client, project_id, user):
+    import app as app_module
+    subscription = app_module.event_bus.subscribe(project_id)
+    try:
+        response = client.post(f'/api/project/{project_id}/team/task', json={
+            'title': 'Задача команды', 'assignee_id': user[0], 'duration': 2,
+        })
+        assert response.status_code == 200, response.get_json()
+        message = subscription.queue.get_nowait()
+        assert 'event: task_created' in message
+        assert f'"task_id":{response.get_json()["task_id"]}' in message
+    finally:
+        app_module.event_bus.unsubscribe(subscription)
@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import database
+import hashing
+from conftest import login
+from hashing import HashingBusy
+
+
+@pytest.fixture
+def pool_mode(monkeypatch):
+    """Режим пула процессов с одним процессом и без очереди"""
+    monkeypatch.setattr(hashing, 'HASH_WORKERS', 1)
+    monkeypatch.setattr(hashing, '_slots', threading.BoundedSemaphore(1))
+
+
+class HangingExecutor:
+    """Исполнитель, задачи которого завершаются только по команде теста"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, function, *args):
+        future = Future()
+        self.futures.append((future, function, args))
+        return future
+
+
+def test_full_queue_raises_busy(pool_mode, monkeypatch):
+    monkeypatch.setattr(hashing, '_get_executor', lambda: pytest.fail('executor must not be used'))
+    hashing._slots.acquire()
+    rejected = hashing.stats()['rejected']
+    with pytest.raises(HashingBusy):
+        hashing.hash_password('secret')
+    assert hashing.stats()['rejected'] == rejected + 1
+
+
+def test_timeout_raises_busy_and_slot_is_freed_when_job_ends(pool_mode, monkeypatch):
+    executor = HangingExecutor()
+    monkeypatch.setattr(hashing, '_get_executor', lambda: executor)
+    monkeypatch.setattr(hashing, 'HASH_TIMEOUT', 0.01)
+    timeouts = hashing.stats()['timeouts']
+
+    with pytest.raises(HashingBusy):
+        hashing.hash_password('secret')
+    assert hashing.stats()['timeouts'] == timeouts + 1
+    # Процесс еще считает: место в очереди занято
+    with pytest.raises(HashingBusy):
+        hashing.hash_password('secret')
+
+    future, function, args = executor.futures[0]
+    future.set_result(function(*args))
+    assert hashing.stats()['in_flight'] == 0
+    # Место в очереди освободилось
+    assert hashing._slots.acquire(blocking=False)
+    hashing._slots.release()
+
+
+def test_process_pool_hashes_and_verifies(pool_mode, monkeypatch):
+    monkeypatch.setattr(hashing, '_executor', None)
+    try:
+        pwhash = hashing.hash_password('secret')
+        assert pwhash.startswith(hashing.PASSWORD_HASH_METHOD + '$')
+        assert hashing.verify_password_hash(pwhash, 'secret') == (True, None)
+        assert hashing.verify_password_hash(pwhash, 'wrong') == (False, None)
+    finally:
+        if hashing._executor is not None:
+            hashing._executor.shutdown()
+    assert hashing.stats()['in_flight'] == 0
+
+
+def test_verify_rehashes_old_parameters():
+    old_hash = generate_password_hash('secret', method='pbkdf2:sha256:1000')
+    ok, new_hash = hashing.verify_password_hash(old_hash, 'secret')
+    assert ok and new_hash.startswith(hashing.PASSWORD_HASH_METHOD + '$')
+    assert check_password_hash(new_hash, 'secret')
+    assert hashing.verify_password_hash(old_hash, 'wrong') == (False, None)
+
+
+def raise_busy(*args):
+    raise HashingBusy('busy')
+
+
+def test_login_returns_503_when_hashing_is_busy(app, user, monkeypatch):
+    monkeypatch.setattr(hashing, '_run', raise_busy)
+    response = app.test_client().post('/login', data={'username': user[1], 'password': user[2]})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(hashing.HASH_RETRY_AFTER)
+
+
+def test_register_returns_503_when_hashing_is_busy(app, monkeypatch):
+    monkeypatch.setattr(hashing, '_run', raise_busy)
+    response = app.test_client().post('/register', data={
+        'username': 'busy-user', 'email': 'busy@example.com', 'password': 'p', 'confirm_password': 'p',
+    })
+    assert response.status_code == 503
+    with app.app_context():
+        assert database.get_user_by_username('busy-user') is None
+
+
+def test_login_rehashes_old_password_hash(app, db, user):
+    db.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+               (generate_password_hash(user[2], method='pbkdf2:sha256:1000'), user[0]))
+    db.commit()
+    rehashed = hashing.stats()['rehashed']
+
+    login(app.test_client(), user[1], user[2])
+    stored = db.execute('SELECT password_hash FROM users WHERE id = ?', (user[0],)).fetchone()[0]
+    assert stored.startswith(hashing.PASSWORD_HASH_METHOD + '$')
+    assert hashing.stats()['rehashed'] == rehashed + 1
+    assert database.user_cache.get(user[0]) is None
+
+    # Второй вход хеш уже не меняет
+    login(app.test_client(), user[1], user[2])
+    assert db.execute('SELECT password_hash FROM users WHERE id = ?', (user[0],)).fetchone()[0] == stored
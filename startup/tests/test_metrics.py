@@ -0,0 +1,56 @@
+from flask import Flask, g
+
+import metrics
+from database import ConnectionPool, PooledConnection
+
+
+def test_trigger_firing_write_is_counted_once(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'metrics.db'), 1)
+    conn = PooledConnection(pool.acquire(), pool)
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.execute('CREATE TABLE item_log (item_id INTEGER)')
+    conn.execute('''
+        CREATE TRIGGER trg_items_log AFTER INSERT ON items
+        BEGIN
+            INSERT INTO item_log (item_id) VALUES (NEW.id);
+            UPDATE item_log SET item_id = item_id WHERE item_id = NEW.id;
+        END
+    ''')
+
+    app = Flask(__name__)
+    with app.test_request_context():
+        metrics._start_request()
+        conn.execute('INSERT INTO items (name) VALUES (?)', ('one',))
+        stats = g._sql_stats
+        assert stats.queries == 1
+        assert list(stats.shapes.values()) == [1]
+
+        conn.executemany('INSERT INTO items (name) VALUES (?)', [(str(i),) for i in range(57)])
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM item_log')
+        assert cursor.fetchone()[0] == 58
+        assert stats.queries == 3
+        assert max(stats.shapes.values()) == 1
+    conn.close()
+
+
+def test_render_exports_counters_with_total_suffix():
+    text = metrics.render(gauges=[('x_idle', 'Idle', 3)], counters=[('x_misses_total', 'Misses', 5)])
+    assert '# TYPE x_idle gauge\nx_idle 3\n' in text
+    assert '# TYPE x_misses_total counter\nx_misses_total 5\n' in text
+
+
+def test_metrics_endpoint_types(app):
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    types = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+    for name in ('gepard_db_pool_misses_total', 'gepard_user_cache_hits_total', 'gepard_user_cache_misses_total',
+                 'gepard_log_records_dropped_total', 'gepard_log_records_sampled_out_total',
+                 'gepard_password_hash_rejected_total'):
+        assert types[name] == 'counter'
+    assert types['gepard_db_pool_idle'] == 'gauge'
+    assert all(name.endswith('_total') for name, kind in types.items() if kind == 'counter'), types
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+import database
+from migrations import HOT_QUERIES, MIGRATIONS, check_query_plans, get_schema_version, run_migrations
+
+
+@pytest.fixture
+def migrated_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'app.db')
+    monkeypatch.setattr(database, 'DATABASE', path)
+    database.init_db()
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    run_migrations(conn)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_all_migrations_applied(migrated_db):
+    assert get_schema_version(migrated_db) == MIGRATIONS[-1][0]
+
+
+def test_hot_queries_have_no_full_scan(migrated_db):
+    assert check_query_plans(migrated_db) == []
+
+
+@pytest.mark.parametrize('name, table, sql', HOT_QUERIES, ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_query_uses_index(migrated_db, name, table, sql):
+    details = [row[3] for row in migrated_db.execute('EXPLAIN QUERY PLAN ' + sql)]
+    on_table = [detail for detail in details if detail.split(' ')[1:2] == [table]]
+    assert on_table, details
+    for detail in on_table:
+        assert detail.startswith('SEARCH ') and ' USING ' in detail, detail
+
+
+def summary(conn, project_id):
+    return dict(conn.execute('SELECT * FROM project_summary WHERE project_id = ?', (project_id,)).fetchone())
+
+
+def add_task(conn, project_id, status, start_date, end_date, duration):
+    return conn.execute('''
+        INSERT INTO tasks (project_id, title, status, start_date, end_date, duration)
+        VALUES (?, 't', ?, ?, ?, ?)
+    ''', (project_id, status, start_date, end_date, duration)).lastrowid
+
+
+def test_project_summary_has_no_overdue_columns(migrated_db):
+    columns = {row[1] for row in migrated_db.execute('PRAGMA table_info(project_summary)')}
+    assert not columns & {'overdue', 'overdue_as_of'}
+
+
+def test_summary_triggers_follow_task_changes(migrated_db):
+    conn = migrated_db
+    project_id = conn.execute("INSERT INTO projects (name, user_id) VALUES ('Сводка', 1)").lastrowid
+    assert summary(conn, project_id)['task_count'] == 0
+
+    first = add_task(conn, project_id, 'planned', '2025-03-03', '2025-03-05', 3)
+    second = add_task(conn, project_id, 'in_progress', '2025-03-01', '2025-03-10', 8)
+    state = summary(conn, project_id)
+    assert (state['planned'], state['in_progress'], state['task_count'], state['total_duration']) == (1, 1, 2, 11)
+    assert (state['min_start'], state['max_end']) == ('2025-03-01', '2025-03-10')
+
+    conn.execute("UPDATE tasks SET status = 'completed', duration = 5, end_date = '2025-03-12' WHERE id = ?",
+                 (first,))
+    state = summary(conn, project_id)
+    assert (state['planned'], state['completed'], state['total_duration']) == (0, 1, 13)
+    assert state['max_end'] == '2025-03-12'
+
+    conn.execute('DELETE FROM tasks WHERE id = ?', (second,))
+    state = summary(conn, project_id)
+    assert (state['in_progress'], state['task_count'], state['total_duration']) == (0, 1, 5)
+    assert (state['min_start'], state['max_end']) == ('2025-03-03', '2025-03-12')
+
+    conn.execute('UPDATE projects SET revision = revision + 1 WHERE id = ?', (project_id,))
+    assert summary(conn, project_id)['revision'] == 1
+    conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+    assert conn.execute('SELECT COUNT(*) FROM project_summary WHERE project_id = ?',
+                        (project_id,)).fetchone()[0] == 0
+
+
+def test_summary_backfill_counts_existing_tasks(migrated_db):
+    # Тестовые задачи init_db созданы до миграции 9 и попали в сводку начальным заполнением
+    expected = migrated_db.execute('SELECT COUNT(*), SUM(duration) FROM tasks WHERE project_id = 1').fetchone()
+    state = summary(migrated_db, 1)
+    assert (state['task_count'], state['total_duration']) == tuple(expected)
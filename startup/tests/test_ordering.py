@@ -0,0 +1,120 @@
+import sqlite3
+
+import pytest
+
+import database
+from ordering import POSITION_GAP, column_end_position, move_item
+
+
+def make_column_db(positions, status='planned'):
+    """Колонка проекта 1: задачи 1..n с заданными позициями"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE tasks (id INTEGER PRIMARY KEY, project_id INTEGER, status TEXT, position INTEGER)')
+    conn.executemany('INSERT INTO tasks (id, project_id, status, position) VALUES (?, 1, ?, ?)',
+                     [(index + 1, status, position) for index, position in enumerate(positions)])
+    return conn
+
+
+def column(conn, status='planned'):
+    return [row[0] for row in conn.execute(
+        'SELECT id FROM tasks WHERE project_id = 1 AND status = ? ORDER BY position, id', (status,))]
+
+
+def positions(conn):
+    return dict(conn.execute('SELECT id, position FROM tasks'))
+
+
+def test_move_between_neighbours_takes_midpoint():
+    conn = make_column_db([1024, 2048, 3072])
+    assert move_item(conn, 'tasks', 1, 3, 'planned', before_id=2) == 1536
+    assert column(conn) == [1, 3, 2]
+    # Меняется только перемещенная карточка
+    assert positions(conn) == {1: 1024, 2: 2048, 3: 1536}
+
+    assert move_item(conn, 'tasks', 1, 1, 'planned', after_id=3) == 1792
+    assert column(conn) == [3, 1, 2]
+
+
+def test_move_to_column_edges():
+    conn = make_column_db([1024, 2048])
+    assert move_item(conn, 'tasks', 1, 2, 'planned', before_id=1) == 1024 - POSITION_GAP
+    assert move_item(conn, 'tasks', 1, 2, 'planned', after_id=1) == 1024 + POSITION_GAP
+    assert move_item(conn, 'tasks', 1, 1, 'planned') == 2048 + POSITION_GAP
+    assert column(conn) == [2, 1]
+
+
+def test_move_to_other_column_end():
+    conn = make_column_db([1024, 2048])
+    conn.execute("INSERT INTO tasks (id, project_id, status, position) VALUES (3, 1, 'completed', 5000)")
+    assert move_item(conn, 'tasks', 1, 1, 'completed') == 5000 + POSITION_GAP
+    assert column(conn, 'completed') == [3, 1]
+    assert column_end_position(conn, 'tasks', 1, 'planned') == 2048 + POSITION_GAP
+
+
+def test_rebalances_when_neighbours_are_adjacent():
+    conn = make_column_db([10, 11, 12])
+    position = move_item(conn, 'tasks', 1, 3, 'planned', after_id=1)
+    assert column(conn) == [1, 3, 2]
+    # Колонка перенумерована с шагом POSITION_GAP, карточка встала посередине
+    stored = positions(conn)
+    assert stored[1] == POSITION_GAP and stored[2] == 2 * POSITION_GAP
+    assert stored[3] == position and stored[1] < position < stored[2]
+
+
+def test_repeated_inserts_keep_order():
+    conn = make_column_db([1024, 2048])
+    # Каждый раз вставляем новую карточку сразу после первой: место между соседями кончается
+    for item_id in range(3, 30):
+        conn.execute("INSERT INTO tasks (id, project_id, status, position) VALUES (?, 1, 'planned', ?)",
+                     (item_id, column_end_position(conn, 'tasks', 1, 'planned')))
+        move_item(conn, 'tasks', 1, item_id, 'planned', after_id=1)
+    assert column(conn) == [1] + list(range(29, 2, -1)) + [2]
+    assert len(set(positions(conn).values())) == 29
+
+
+def test_anchor_in_other_column_is_rejected():
+    conn = make_column_db([1024, 2048])
+    conn.execute("INSERT INTO tasks (id, project_id, status, position) VALUES (3, 1, 'completed', 1024)")
+    with pytest.raises(LookupError):
+        move_item(conn, 'tasks', 1, 1, 'planned', before_id=3)
+
+
+def test_unknown_table_is_rejected():
+    conn = make_column_db([])
+    with pytest.raises(ValueError):
+        move_item(conn, 'users', 1, 1, 'planned')
+
+
+def create_task(client, project_id, title):
+    response = client.post(f'/api/project/{project_id}/tasks:batch',
+                           json={'operations': [{'op': 'create', 'title': title}]})
+    return response.get_json()['created'][0]
+
+
+@pytest.mark.parametrize('body', [{}, {'status': 'done'}, {'status': None}])
+def test_status_route_rejects_invalid_status(app, client, project_id, body):
+    task_id = create_task(client, project_id, 'A')
+    response = client.post(f'/api/task/{task_id}/status', json=body)
+    assert response.status_code == 400
+
+
+def test_status_route_rejects_position(app, client, project_id):
+    task_id = create_task(client, project_id, 'A')
+    response = client.post(f'/api/task/{task_id}/status', json={'status': 'completed', 'position': 0})
+    assert response.status_code == 400
+    assert '/move' in response.get_json()['error']
+
+
+def test_status_route_moves_card_to_column_end(app, client, project_id):
+    first = create_task(client, project_id, 'A')
+    second = create_task(client, project_id, 'B')
+    for task_id in (second, first):
+        response = client.post(f'/api/task/{task_id}/status', json={'status': 'in_progress'})
+        assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        conn = database.get_db_connection()
+        order = [row['id'] for row in conn.execute(
+            "SELECT id FROM tasks WHERE project_id = ? AND status = 'in_progress' ORDER BY position",
+            (project_id,))]
+        conn.close()
+    assert order == [second, first]
@@ -0,0 +1,273 @@
+import sqlite3
+from datetime import date
+
+from scheduler import (
+    ProjectGraph, _cpm, cascade_reschedule, constrained_start, critical_path, format_date, level_resources,
+    propagate_status, propagate_statuses, reschedule, set_task_predecessors, sync_legacy_dependencies,
+)
+
+
+def make_graph(tasks, edges=()):
+    graph = ProjectGraph(1)
+    for task_id, start, duration, status in tasks:
+        graph.add_task(task_id, start, start + duration - 1, duration, status=status, priority='medium')
+    for predecessor_id, task_id, dependency_type, lag in edges:
+        graph.add_edge(predecessor_id, task_id, dependency_type, lag)
+    return graph
+
+
+def test_leveling_keeps_link_to_started_successor():
+    # C (дни 1-5) и D (дни 6-10) - критическая цепочка, C занимает исполнителя A.
+    # Резерв A по CPM позволил бы сдвинуть ее на дни 6-7, но B уже начата в день 3.
+    graph = make_graph(
+        [('A', 1, 2, 'planned'), ('B', 3, 1, 'in_progress'),
+         ('C', 1, 5, 'planned'), ('D', 6, 5, 'planned')],
+        [('A', 'B', 'FS', 0), ('C', 'D', 'FS', 0)],
+    )
+    result = level_resources(graph, {'A': [7], 'C': [7]})
+
+    assert 'A' not in result['changes']
+    assert result['unresolved'] == ['A']
+
+
+def test_leveling_cap_follows_movable_chain_and_link_types():
+    # A -> E (подвижная, SS) -> B (начата, FF): сдвиг A ограничен через E
+    graph = make_graph(
+        [('A', 1, 2, 'planned'), ('E', 1, 3, 'planned'), ('B', 5, 2, 'in_progress'),
+         ('C', 1, 3, 'planned'), ('D', 4, 10, 'planned')],
+        [('A', 'E', 'SS', 1), ('E', 'B', 'FF', 0), ('C', 'D', 'FS', 0)],
+    )
+    result = level_resources(graph, {'A': [7], 'C': [7]})
+
+    dates = {task_id: (task['start'], task['end']) for task_id, task in graph.tasks.items()}
+    dates.update(result['changes'])
+    for task_id in graph.tasks:
+        constraint = constrained_start(graph, task_id, dates)
+        assert constraint is None or dates[task_id][0] >= constraint, task_id
+
+
+def make_dependency_db():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('CREATE TABLE tasks (id INTEGER PRIMARY KEY, project_id INTEGER, dependencies TEXT)')
+    conn.execute('''
+        CREATE TABLE task_dependencies (
+            id INTEGER PRIMARY KEY, task_id INTEGER, predecessor_id INTEGER,
+            dependency_type TEXT DEFAULT 'FS', lag INTEGER DEFAULT 0,
+            UNIQUE (task_id, predecessor_id)
+        )
+    ''')
+    conn.executemany('INSERT INTO tasks (id, project_id) VALUES (?, 1)', [(i,) for i in range(1, 6)])
+    conn.executemany('INSERT INTO task_dependencies (task_id, predecessor_id, dependency_type, lag) '
+                     'VALUES (5, ?, ?, ?)', [(1, 'FS', 0), (2, 'SS', 0), (3, 'FS', 2)])
+    return conn
+
+
+def test_legacy_field_mirrors_only_plain_fs_links():
+    conn = make_dependency_db()
+    sync_legacy_dependencies(conn, [5])
+    assert conn.execute('SELECT dependencies FROM tasks WHERE id = 5').fetchone()[0] == '1'
+
+    # Старый клиент пишет обратно то, что видит: невидимые ему связи остаются
+    added, removed = set_task_predecessors(conn, 5, [4])
+    assert (added, removed) == ([4], [1])
+    links = conn.execute('SELECT predecessor_id, dependency_type, lag FROM task_dependencies '
+                         'WHERE task_id = 5 ORDER BY predecessor_id').fetchall()
+    assert [tuple(link) for link in links] == [(2, 'SS', 0), (3, 'FS', 2), (4, 'FS', 0)]
+    assert conn.execute('SELECT dependencies FROM tasks WHERE id = 5').fetchone()[0] == '4'
+
+
+def test_reschedule_applies_each_link_type_with_lag():
+    cases = [
+        # тип, lag, ожидаемые (start, end) последователя длительностью 2 после A (дни 10-12)
+        ('FS', 0, (13, 14)),
+        ('FS', 2, (15, 16)),
+        ('FS', -1, (12, 13)),
+        ('SS', 1, (11, 12)),
+        ('FF', 0, (11, 12)),
+        ('FF', 3, (14, 15)),
+        ('SF', 0, (9, 10)),
+        ('SF', -2, (7, 8)),
+    ]
+    for dependency_type, lag, expected in cases:
+        graph = make_graph([('A', 10, 3, 'planned'), ('B', 1, 2, 'planned')],
+                           [('A', 'B', dependency_type, lag)])
+        assert reschedule(graph, ['A']) == {'B': expected}, (dependency_type, lag)
+
+
+def test_reschedule_visits_diamond_once_and_skips_cycles():
+    graph = make_graph(
+        [('A', 1, 2, 'planned'), ('B', 1, 1, 'planned'), ('C', 1, 4, 'planned'),
+         ('D', 1, 1, 'planned'), ('X', 1, 1, 'planned'), ('Y', 1, 1, 'planned')],
+        [('A', 'B', 'FS', 0), ('A', 'C', 'FS', 0), ('B', 'D', 'FS', 0), ('C', 'D', 'FS', 0),
+         # X <-> Y - цикл, его даты не трогаются
+         ('A', 'X', 'FS', 0), ('X', 'Y', 'FS', 0), ('Y', 'X', 'FS', 0)],
+    )
+    changes = reschedule(graph, ['A'])
+
+    assert changes == {'B': (3, 3), 'C': (3, 6), 'D': (7, 7)}
+    # Сама измененная задача пересчитывается только по запросу
+    assert 'A' not in reschedule(graph, ['A'], include_changed=True)
+
+
+def test_reschedule_leaves_other_components_alone():
+    graph = make_graph(
+        [('A', 1, 2, 'planned'), ('B', 1, 1, 'planned'),
+         ('P', 1, 2, 'planned'), ('Q', 1, 1, 'planned')],
+        [('A', 'B', 'FS', 0), ('P', 'Q', 'FS', 0)],
+    )
+    assert reschedule(graph, ['A']) == {'B': (3, 3)}
+
+
+def make_schedule_db():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY, project_id INTEGER, title TEXT, start_date DATE, end_date DATE,
+            duration INTEGER, status TEXT, priority TEXT, dependencies TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE task_dependencies (
+            id INTEGER PRIMARY KEY, task_id INTEGER, predecessor_id INTEGER,
+            dependency_type TEXT DEFAULT 'FS', lag INTEGER DEFAULT 0
+        )
+    ''')
+    return conn
+
+
+def test_cascade_reschedule_writes_dates_without_committing():
+    conn = make_schedule_db()
+    conn.executemany('''
+        INSERT INTO tasks (id, project_id, title, start_date, end_date, duration, status)
+        VALUES (?, 1, ?, ?, ?, ?, 'planned')
+    ''', [(1, 'A', '2025-03-03', '2025-03-05', 3), (2, 'B', '2025-03-01', '2025-03-02', 2),
+          (3, 'C', '2025-03-01', '2025-03-01', 1)])
+    conn.executemany('INSERT INTO task_dependencies (task_id, predecessor_id, dependency_type, lag) '
+                     'VALUES (?, ?, ?, ?)', [(2, 1, 'FS', 0), (3, 2, 'SS', 1)])
+    conn.commit()
+
+    changes = cascade_reschedule(conn, 1)
+
+    assert changes == {2: ('2025-03-06', '2025-03-07'), 3: ('2025-03-07', '2025-03-07')}
+    assert conn.in_transaction
+    row = conn.execute('SELECT start_date, end_date FROM tasks WHERE id = 3').fetchone()
+    assert tuple(row) == ('2025-03-07', '2025-03-07')
+    assert cascade_reschedule(conn, 999) == {}
+
+
+DAY = date(2025, 1, 6).toordinal()
+
+
+def float_by_task(result):
+    return {task['id']: task['total_float'] for task in result['tasks']}
+
+
+def test_critical_path_chain_and_float():
+    graph = make_graph([('A', DAY, 3, 'planned'), ('B', DAY, 2, 'planned'), ('C', DAY, 1, 'planned')],
+                       [('A', 'B', 'FS', 0)])
+    result = critical_path(graph)
+
+    assert result['project_start'] == format_date(DAY)
+    assert result['project_finish'] == format_date(DAY + 4)
+    assert result['critical_path'] == ['A', 'B']
+    assert float_by_task(result) == {'A': 0, 'B': 0, 'C': 4}
+    tasks = {task['id']: task for task in result['tasks']}
+    assert (tasks['B']['early_start'], tasks['B']['late_finish']) == (format_date(DAY + 3), format_date(DAY + 4))
+    assert (tasks['C']['late_start'], tasks['C']['late_finish']) == (format_date(DAY + 4), format_date(DAY + 4))
+    assert result['cycles'] == []
+
+
+def test_cpm_link_types_forward_and_backward():
+    cases = [
+        # тип, lag, ES последователя (длительность 2) после A (3 дня с DAY), резерв A, резерв B
+        ('FS', 0, DAY + 3, 0, 0),
+        ('FS', -1, DAY + 2, 0, 0),
+        ('SS', 1, DAY + 1, 0, 0),
+        ('SS', 0, DAY, 0, 1),
+        ('FF', 2, DAY + 3, 0, 0),
+        ('SF', 0, DAY - 1, 0, 2),
+    ]
+    for dependency_type, lag, succ_start, float_a, float_b in cases:
+        graph = make_graph([('A', DAY, 3, 'planned'), ('B', DAY, 2, 'planned')],
+                           [('A', 'B', dependency_type, lag)])
+        order, durations, es, ef, ls, lf = _cpm(graph)
+        index = {task_id: i for i, task_id in enumerate(order)}
+        case = (dependency_type, lag)
+        assert es[index['B']] == succ_start, case
+        assert ls[index['A']] - es[index['A']] == float_a, case
+        assert ls[index['B']] - es[index['B']] == float_b, case
+        # Поздние даты не выходят за окончание проекта
+        assert max(lf) == max(ef), case
+
+
+def test_critical_path_reports_cycles_and_disconnected_parts():
+    graph = make_graph(
+        [('A', DAY, 3, 'planned'), ('B', DAY, 2, 'planned'),
+         ('P', DAY, 1, 'planned'), ('Q', DAY, 1, 'planned'),
+         ('X', DAY, 1, 'planned'), ('Y', DAY, 1, 'planned')],
+        [('A', 'B', 'FS', 0), ('P', 'Q', 'FS', 0), ('X', 'Y', 'FS', 0), ('Y', 'X', 'SS', 0)],
+    )
+    result = critical_path(graph)
+
+    assert result['cycles'] == ['X', 'Y']
+    assert float_by_task(result) == {'A': 0, 'B': 0, 'P': 3, 'Q': 3}
+    assert result['critical_path'] == ['A', 'B']
+
+    only_cycle = make_graph([('X', DAY, 1, 'planned'), ('Y', DAY, 1, 'planned')],
+                            [('X', 'Y', 'FS', 0), ('Y', 'X', 'FS', 0)])
+    assert critical_path(only_cycle) == {'project_start': None, 'project_finish': None, 'tasks': [],
+                                         'critical_path': [], 'cycles': ['X', 'Y']}
+
+
+def make_status_db(statuses, edges, other_project=()):
+    conn = make_schedule_db()
+    conn.executemany('INSERT INTO tasks (id, project_id, title, duration, status) VALUES (?, ?, ?, 1, ?)',
+                     [(task_id, 2 if task_id in other_project else 1, str(task_id), status)
+                      for task_id, status in statuses.items()])
+    conn.executemany('INSERT INTO task_dependencies (predecessor_id, task_id, dependency_type) VALUES (?, ?, ?)',
+                     edges)
+    return conn
+
+
+def stored_statuses(conn):
+    return {row['id']: row['status'] for row in conn.execute('SELECT id, status FROM tasks')}
+
+
+def test_propagate_status_walks_levels_by_link_type():
+    # 1 -FS-> 2 -SS-> 3 -FS-> 4: завершение 1 запускает 2, старт 2 запускает 3, 4 ждет окончания 3
+    conn = make_status_db({1: 'completed', 2: 'planned', 3: 'planned', 4: 'planned'},
+                          [(1, 2, 'FS'), (2, 3, 'SS'), (3, 4, 'FS')])
+    assert propagate_status(conn, 1, 'completed') == {2: 'in_progress', 3: 'in_progress'}
+    assert stored_statuses(conn)[4] == 'planned'
+
+    conn = make_status_db({1: 'completed', 2: 'in_progress'}, [(1, 2, 'FF')])
+    assert propagate_status(conn, 1, 'completed') == {2: 'completed'}
+
+    conn = make_status_db({1: 'in_progress', 2: 'in_progress'}, [(1, 2, 'SF')])
+    assert propagate_status(conn, 1, 'in_progress') == {2: 'completed'}
+
+
+def test_propagate_status_rolls_back_only_unheld_tasks():
+    # SS: 3 остается в работе, пока его держит другой SS-предшественник 2
+    conn = make_status_db({1: 'planned', 2: 'in_progress', 3: 'in_progress'}, [(1, 3, 'SS'), (2, 3, 'SS')])
+    assert propagate_status(conn, 1, 'planned') == {}
+    conn = make_status_db({1: 'planned', 2: 'planned', 3: 'in_progress'}, [(1, 3, 'SS'), (2, 3, 'SS')])
+    assert propagate_status(conn, 1, 'planned') == {3: 'planned'}
+
+    # FF: то же для отката из completed
+    conn = make_status_db({1: 'in_progress', 2: 'completed', 3: 'completed'}, [(1, 3, 'FF'), (2, 3, 'FF')])
+    assert propagate_status(conn, 1, 'in_progress') == {}
+    conn = make_status_db({1: 'in_progress', 2: 'in_progress', 3: 'completed'}, [(1, 3, 'FF'), (2, 3, 'FF')])
+    assert propagate_status(conn, 1, 'in_progress') == {3: 'in_progress'}
+
+
+def test_propagate_statuses_stops_on_cycles_and_project_boundary():
+    conn = make_status_db({1: 'in_progress', 2: 'planned', 3: 'planned', 4: 'planned'},
+                          [(1, 2, 'SS'), (2, 1, 'SS'), (2, 3, 'SS'), (3, 4, 'SS')], other_project={4})
+    changes = propagate_statuses(conn, 1, {1: 'in_progress'})
+
+    assert changes == {2: 'in_progress', 3: 'in_progress'}
+    assert stored_statuses(conn) == {1: 'in_progress', 2: 'in_progress', 3: 'in_progress', 4: 'planned'}
+    assert conn.in_transaction
@@ -0,0 +1,143 @@
+import sqlite3
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from task_queries import (
+    TASKS_PAGE_SIZE, TASKS_PAGE_SIZE_MAX, decode_cursor, encode_cursor, fetch_page, parse_listing,
+)
+
+
+def make_tasks_db(tasks, assignees=()):
+    """tasks: [(id, status, position, priority, start_date, end_date, title)], assignees: [(task_id, user_id)]"""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.executescript('''
+        CREATE TABLE tasks (id INTEGER PRIMARY KEY, project_id INTEGER, title TEXT, description TEXT,
+                            status TEXT, position INTEGER, priority TEXT, start_date DATE, end_date DATE);
+        CREATE TABLE task_assignees (task_id INTEGER, user_id INTEGER);
+    ''')
+    conn.executemany('''
+        INSERT INTO tasks (id, project_id, status, position, priority, start_date, end_date, title, description)
+        VALUES (?, 1, ?, ?, ?, ?, ?, ?, '')
+    ''', tasks)
+    conn.executemany('INSERT INTO task_assignees (task_id, user_id) VALUES (?, ?)', assignees)
+    return conn
+
+
+def all_pages(conn, args, default_sort='start_date', user_id=1):
+    """Идентификаторы задач всех страниц, проходя по next_cursor"""
+    ids, cursor = [], None
+    while True:
+        page_args = MultiDict(args)
+        if cursor:
+            page_args['cursor'] = cursor
+        listing = parse_listing(page_args, default_sort)
+        page = fetch_page(conn, listing, 'FROM tasks t', 't.project_id = ?', [1], 't.id', user_id)
+        ids.extend(row['id'] for row in page['rows'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_no_listing_params_keeps_full_list():
+    assert parse_listing(MultiDict(), 'position') is None
+    assert parse_listing(MultiDict({'other': '1'}), 'position') is None
+
+
+def test_limit_is_clamped_and_defaulted():
+    assert parse_listing(MultiDict({'sort': 'id'}), 'position')['limit'] == TASKS_PAGE_SIZE
+    assert parse_listing(MultiDict({'limit': '0'}), 'position')['limit'] == 1
+    assert parse_listing(MultiDict({'limit': '100000'}), 'position')['limit'] == TASKS_PAGE_SIZE_MAX
+
+
+@pytest.mark.parametrize('args', [
+    {'sort': 'title'},
+    {'status': 'planned,done'},
+    {'priority': 'urgent'},
+    {'assignee': 'someone'},
+    {'from': '01.02.2025'},
+    {'cursor': 'not-a-cursor'},
+    {'sort': 'id', 'cursor': encode_cursor('start_date', ['2025-01-01', 1])},
+])
+def test_invalid_params_raise(args):
+    with pytest.raises(ValueError):
+        parse_listing(MultiDict(args), 'start_date')
+
+
+def test_filters_are_parsed():
+    listing = parse_listing(MultiDict({
+        'status': 'planned, in_progress', 'priority': 'high', 'assignee': 'me',
+        'from': '2025-01-01', 'to': '2025-01-31', 'q': '  отчет ' + 'x' * 300,
+    }), 'position')
+    filters = listing['filters']
+    assert filters['status'] == ['planned', 'in_progress']
+    assert filters['priority'] == ['high']
+    assert filters['assignee'] == 'me'
+    assert (filters['from'], filters['to']) == ('2025-01-01', '2025-01-31')
+    assert filters['q'].startswith('отчет') and len(filters['q']) == 200
+
+
+@pytest.mark.parametrize('sort, values', [
+    ('position', ['planned', 1024, 7]),
+    ('start_date', [None, 3]),
+    ('id', [42]),
+])
+def test_cursor_round_trip(sort, values):
+    assert decode_cursor(encode_cursor(sort, values), sort) == values
+
+
+def test_pages_cover_null_sort_keys_without_gaps():
+    tasks = [
+        (1, 'planned', 1, 'low', None, None, 'a'),
+        (2, 'planned', 2, 'low', '2025-01-03', '2025-01-04', 'b'),
+        (3, 'planned', 3, 'low', None, None, 'c'),
+        (4, 'planned', 4, 'low', '2025-01-01', '2025-01-02', 'd'),
+        (5, 'planned', 5, 'low', '2025-01-03', '2025-01-05', 'e'),
+        (6, 'planned', 6, 'low', None, None, 'f'),
+    ]
+    conn = make_tasks_db(tasks)
+    expected = [row[0] for row in conn.execute('SELECT id FROM tasks ORDER BY start_date, id')]
+    assert expected == [1, 3, 6, 4, 2, 5]
+    for limit in (1, 2, 4):
+        assert all_pages(conn, {'limit': str(limit)}) == expected
+
+
+def test_pages_in_position_order():
+    tasks = [
+        (1, 'planned', 2048, 'low', None, None, 'a'),
+        (2, 'completed', 1024, 'low', None, None, 'b'),
+        (3, 'planned', 1024, 'low', None, None, 'c'),
+        (4, 'in_progress', 1024, 'low', None, None, 'd'),
+    ]
+    conn = make_tasks_db(tasks)
+    assert all_pages(conn, {'limit': '1'}, default_sort='position') == [2, 4, 3, 1]
+
+
+def test_total_only_on_first_page():
+    conn = make_tasks_db([(i, 'planned', i, 'low', None, None, str(i)) for i in range(1, 6)])
+    first = fetch_page(conn, parse_listing(MultiDict({'limit': '2'}), 'id'),
+                       'FROM tasks t', 't.project_id = ?', [1], 't.id', 1)
+    assert first['total'] == 5
+    second = fetch_page(conn, parse_listing(MultiDict({'limit': '2', 'cursor': first['next_cursor']}), 'id'),
+                        'FROM tasks t', 't.project_id = ?', [1], 't.id', 1)
+    assert second['total'] is None
+    assert [row['id'] for row in second['rows']] == [3, 4]
+
+
+def test_filters_restrict_pages():
+    tasks = [
+        (1, 'planned', 1, 'high', '2025-01-01', '2025-01-05', 'Отчет 100%'),
+        (2, 'completed', 2, 'low', '2025-01-10', '2025-01-12', 'Отчет 100 штук'),
+        (3, 'in_progress', 3, 'high', '2025-02-01', '2025-02-03', 'План'),
+        (4, 'planned', 4, 'medium', None, None, 'Отчет без дат'),
+    ]
+    conn = make_tasks_db(tasks, assignees=[(1, 7), (3, 7), (2, 8)])
+    assert all_pages(conn, {'status': 'planned', 'limit': '1'}) == [4, 1]
+    assert all_pages(conn, {'priority': 'high,low'}) == [1, 2, 3]
+    assert all_pages(conn, {'assignee': 'me', 'limit': '1'}, user_id=7) == [1, 3]
+    assert all_pages(conn, {'assignee': '8'}, user_id=7) == [2]
+    # Окно дат: задачи, пересекающиеся с [from, to]; без дат не попадают
+    assert all_pages(conn, {'from': '2025-01-05', 'to': '2025-01-31'}) == [1, 2]
+    # % в поиске - обычный символ, а не шаблон LIKE
+    assert all_pages(conn, {'q': '100%'}) == [1]
@@ -0,0 +1,93 @@
+import pytest
+
+import database
+
+
+def batch(client, project_id, *operations):
+    return client.post(f'/api/project/{project_id}/tasks:batch', json={'operations': list(operations)})
+
+
+def load_tasks(app, *task_ids):
+    with app.app_context():
+        conn = database.get_db_connection()
+        rows = conn.execute(
+            f"SELECT * FROM tasks WHERE id IN ({','.join('?' * len(task_ids))}) ORDER BY id", task_ids
+        ).fetchall()
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def test_create_derives_dates_and_duration(app, client, project_id):
+    response = batch(client, project_id,
+                     {'op': 'create', 'title': 'A', 'start_date': '2025-03-03', 'end_date': '2025-03-07'},
+                     {'op': 'create', 'title': 'B', 'start_date': '2025-03-03', 'duration': 3},
+                     {'op': 'create', 'title': 'C', 'end_date': '2025-03-10', 'duration': 2},
+                     {'op': 'create', 'title': 'D', 'priority': 'high', 'position': 5})
+    assert response.status_code == 200, response.get_json()
+    tasks = load_tasks(app, *response.get_json()['created'])
+    dates = [(task['start_date'], task['end_date'], task['duration']) for task in tasks]
+    assert dates[:3] == [
+        ('2025-03-03', '2025-03-07', 5),
+        ('2025-03-03', '2025-03-05', 3),
+        ('2025-03-09', '2025-03-10', 2),
+    ]
+    assert dates[3][2] == 1 and dates[3][0] == dates[3][1]
+    assert (tasks[3]['priority'], tasks[3]['position']) == ('high', 5)
+    assert tasks[0]['priority'] == 'medium'
+
+
+@pytest.mark.parametrize('operation, message', [
+    ({'op': 'create', 'title': 'A', 'start_date': '2025-03-07', 'end_date': '2025-03-03'}, 'before start_date'),
+    ({'op': 'create', 'title': 'A', 'start_date': '2025-03-03', 'end_date': '2025-03-04', 'duration': 5},
+     'duration does not match'),
+    ({'op': 'create', 'title': 'A', 'priority': 'urgent'}, 'invalid priority'),
+    ({'op': 'create', 'title': 'A', 'position': 'top'}, 'position must be an integer'),
+    ({'op': 'create', 'title': 'A', 'duration': 0}, 'duration must be a positive integer'),
+    ({'op': 'create', 'title': 'A', 'start_date': '03.03.2025'}, 'start_date must be YYYY-MM-DD'),
+    ({'op': 'create', 'title': 'A', 'status': 'done'}, 'invalid status'),
+    ({'op': 'update', 'id': 1, 'priority': 'urgent'}, 'invalid priority'),
+    ({'op': 'move', 'id': 1, 'status': 'planned', 'position': True}, 'position must be an integer'),
+    ({'op': 'rename', 'id': 1}, 'unknown op'),
+])
+def test_invalid_operation_rejects_whole_batch(app, client, project_id, operation, message):
+    response = batch(client, project_id, {'op': 'create', 'title': 'valid'}, operation)
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+    with app.app_context():
+        conn = database.get_db_connection()
+        count = conn.execute('SELECT COUNT(*) FROM tasks WHERE project_id = ?', (project_id,)).fetchone()[0]
+        conn.close()
+    assert count == 0
+
+
+def test_update_move_delete_in_one_transaction(app, client, project_id):
+    created = batch(client, project_id, *[{'op': 'create', 'title': str(i)} for i in range(3)]).get_json()['created']
+    response = batch(client, project_id,
+                     {'op': 'update', 'id': created[0], 'title': 'renamed', 'priority': 'critical'},
+                     {'op': 'move', 'id': created[1], 'status': 'completed'},
+                     {'op': 'delete', 'id': created[2]})
+    assert response.status_code == 200, response.get_json()
+    first, second = load_tasks(app, *created)
+    assert (first['title'], first['priority']) == ('renamed', 'critical')
+    assert second['status'] == 'completed'
+
+
+def test_foreign_task_ids_are_not_found(app, client, project_id, user):
+    with app.app_context():
+        conn = database.get_db_connection()
+        other = conn.execute('INSERT INTO projects (name, description, user_id) VALUES (?, ?, ?)',
+                             ('Другой', '', user[0])).lastrowid
+        conn.commit()
+        conn.close()
+    foreign = batch(client, other, {'op': 'create', 'title': 'x'}).get_json()['created'][0]
+    response = batch(client, project_id, {'op': 'delete', 'id': foreign})
+    assert response.status_code == 404
+    assert response.get_json()['task_ids'] == [foreign]
+
+
+def test_project_without_access_is_not_found(app, make_user, project_id):
+    from conftest import login
+    _, username, password = make_user()
+    outsider = login(app.test_client(), username, password)
+    response = batch(outsider, project_id, {'op': 'create', 'title': 'x'})
+    assert response.status_code == 404
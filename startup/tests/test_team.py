@@ -0,0 +1,64 @@
+import app as app_module
+from app import load_team_overview, team_overview_cache
+
+
+def members_of(overview, project_id):
+    for item in overview:
+        if item['project']['id'] == project_id:
+            return {member['user_id']: member['role'] for member in item['members']}
+    return None
+
+
+def test_overview_is_cached_per_user(db, user, project_id):
+    overview = load_team_overview(db, user[0])
+    assert members_of(overview, project_id) == {}
+    assert team_overview_cache.get(user[0]) is overview
+    assert load_team_overview(db, user[0]) is overview
+
+
+def test_overview_groups_members_by_project(db, client, user, make_user, project_id):
+    other_project = db.execute('INSERT INTO projects (name, description, user_id) VALUES (?, ?, ?)',
+                               ('Второй', '', user[0])).lastrowid
+    db.commit()
+    first, second = make_user(), make_user()
+    client.post(f'/api/project/{project_id}/team', json={'user_id': first[0], 'role': 'admin'})
+    client.post(f'/api/project/{other_project}/team', json={'user_id': second[0]})
+    client.post(f'/api/project/{other_project}/team', json={'user_id': first[0]})
+
+    overview = load_team_overview(db, user[0])
+    assert members_of(overview, project_id) == {first[0]: 'admin'}
+    assert members_of(overview, other_project) == {first[0]: 'member', second[0]: 'member'}
+
+
+def test_membership_changes_invalidate_owner_and_members(db, client, user, make_user, project_id):
+    member = make_user()
+    load_team_overview(db, user[0])
+
+    response = client.post(f'/api/project/{project_id}/team', json={'user_id': member[0]})
+    assert response.status_code == 200
+    assert team_overview_cache.get(user[0]) is None
+    assert members_of(load_team_overview(db, user[0]), project_id) == {member[0]: 'member'}
+    # Новый участник видит проект сразу, без ожидания TEAM_CACHE_TTL
+    assert members_of(load_team_overview(db, member[0]), project_id) == {member[0]: 'member'}
+
+    response = client.put(f'/api/project/{project_id}/team/{member[0]}/role', json={'role': 'admin'})
+    assert response.status_code == 200
+    assert team_overview_cache.get(user[0]) is None
+    assert team_overview_cache.get(member[0]) is None
+    assert members_of(load_team_overview(db, member[0]), project_id) == {member[0]: 'admin'}
+
+    response = client.delete(f'/api/project/{project_id}/team/{member[0]}')
+    assert response.status_code == 200
+    # Удаленный участник уже не в project_members, но его запись тоже сброшена
+    assert members_of(load_team_overview(db, member[0]), project_id) is None
+    assert members_of(load_team_overview(db, user[0]), project_id) == {}
+
+
+def test_team_page_uses_overview(client, user, project_id, monkeypatch):
+    calls = []
+    original = app_module.load_team_overview
+    monkeypatch.setattr(app_module, 'load_team_overview',
+                        lambda conn, user_id: calls.append(user_id) or original(conn, user_id))
+    response = client.get('/team')
+    assert response.status_code == 200
+    assert calls == [user[0]]
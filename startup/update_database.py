@@ -1,94 +1,36 @@
 # update_database.py
-import sqlite3
-import os
+import sys
+from database import get_db_connection, init_db
+from migrations import run_migrations, get_schema_version, check_query_plans
 
 def update_database():
-    """Добавляет поле menu_position в таблицу users и priority в таблицу tasks"""
-    
-    # Путь к базе данных
-    DATABASE = 'instance/app.db'
-    
-    # Проверяем существует ли база данных
-    if not os.path.exists(DATABASE):
-        print("База данных не найдена!")
-        return
-    
+    """Применяет миграции схемы (см. migrations.py) и проверяет планы горячих запросов"""
+    init_db()
+
+    conn = get_db_connection()
     try:
-        # Подключаемся к базе данных
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        # 1. Обновляем таблицу users (ваша существующая логика)
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'menu_position' not in columns:
-            cursor.execute('ALTER TABLE users ADD COLUMN menu_position TEXT DEFAULT "side"')
-            print("✅ База данных успешно обновлена! Добавлено поле menu_position.")
-        else:
-            print("✅ Поле menu_position уже существует в таблице users.")
-        
-        # 2. ДОБАВЛЯЕМ: Обновляем таблицу tasks - добавляем поле priority
-        cursor.execute("PRAGMA table_info(tasks)")
-        task_columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'priority' not in task_columns:
-            cursor.execute('ALTER TABLE tasks ADD COLUMN priority TEXT DEFAULT "medium"')
-            print("✅ Добавлено поле priority в таблицу tasks.")
-            
-            # Обновляем существующие задачи, устанавливая приоритет по умолчанию
-            cursor.execute('UPDATE tasks SET priority = "medium" WHERE priority IS NULL')
-            print("✅ Существующие задачи обновлены с приоритетом 'medium'.")
-        else:
-            print("✅ Поле priority уже существует в таблице tasks.")
-        
-        # 3. ДОБАВЛЯЕМ: Обновляем таблицу personal_tasks - тоже добавляем priority
-        cursor.execute("PRAGMA table_info(personal_tasks)")
-        personal_columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'priority' not in personal_columns:
-            cursor.execute('ALTER TABLE personal_tasks ADD COLUMN priority TEXT DEFAULT "medium"')
-            print("✅ Добавлено поле priority в таблицу personal_tasks.")
-            
-            # Обновляем существующие персональные задачи
-            cursor.execute('UPDATE personal_tasks SET priority = "medium" WHERE priority IS NULL')
-            print("✅ Существующие персональные задачи обновлены с приоритетом 'medium'.")
+        applied = run_migrations(conn)
+        if applied:
+            print(f"✅ Применены миграции: {', '.join(map(str, applied))}")
         else:
-            print("✅ Поле priority уже существует в таблице personal_tasks.")
-        
-        conn.commit()
-        
-        # 4. Проверяем текущие значения (ваша существующая логика)
-        cursor.execute('SELECT id, username, menu_position FROM users')
-        users = cursor.fetchall()
-        print(f"👥 Найдено пользователей: {len(users)}")
-        for user in users:
-            print(f"   Пользователь: {user[1]} (ID: {user[0]}), menu_position: {user[2]}")
-        
-        # 5. ДОБАВЛЯЕМ: Проверяем задачи
-        cursor.execute('SELECT COUNT(*) as task_count FROM tasks')
-        task_count = cursor.fetchone()[0]
-        print(f"📋 Найдено задач в проектах: {task_count}")
-        
-        cursor.execute('SELECT COUNT(*) as personal_count FROM personal_tasks')
-        personal_count = cursor.fetchone()[0]
-        print(f"📝 Найдено персональных задач: {personal_count}")
-        
-        # Показываем пример задач с приоритетами
-        cursor.execute('SELECT id, title, priority FROM tasks LIMIT 5')
-        sample_tasks = cursor.fetchall()
-        if sample_tasks:
-            print("📊 Пример задач:")
-            for task in sample_tasks:
-                print(f"   Задача: {task[1]} (ID: {task[0]}), приоритет: {task[2]}")
-            
+            print("✅ Схема уже актуальна, новых миграций нет.")
+        print(f"📦 Текущая версия схемы: {get_schema_version(conn)}")
+
+        problems = check_query_plans(conn)
+        for name, detail in problems:
+            print(f"❌ Запрос '{name}' выполняется полным сканированием: {detail}")
+        if not problems:
+            print("✅ Все горячие запросы используют индексы.")
+        return not problems
+
     except Exception as e:
         print(f"❌ Ошибка при обновлении базы данных: {e}")
-        conn.rollback()
+        return False
     finally:
         conn.close()
 
 if __name__ == '__main__':
     print("🔄 Запуск обновления базы данных...")
-    update_database()
-    print("✅ Обновление завершено!")
\ No newline at end of file
+    ok = update_database()
+    print("✅ Обновление завершено!" if ok else "❌ Обновление завершено с ошибками!")
+    sys.exit(0 if ok else 1)
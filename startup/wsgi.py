@@ -1,4 +1,10 @@
+import os
+
 from app import app
+from events import WAITRESS_THREADS
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    from waitress import serve
+    # Число потоков то же, из которого events.py считает лимит потоков SSE
+    serve(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)),
+          threads=WAITRESS_THREADS)
\ No newline at end of file